@@ -0,0 +1,76 @@
+from typing import List, Optional, Tuple
+
+
+class _QueryState:
+    __slots__ = ("priority", "next_page", "last_page", "in_flight", "dispatched", "retries")
+
+    def __init__(self, priority: int, max_pages: int):
+        self.priority = priority
+        self.next_page = 1
+        self.last_page = max_pages
+        self.in_flight = 0
+        self.dispatched = 0
+        # Страницы с ошибкой: выдаются раньше новых страниц запроса
+        self.retries: List[int] = []
+
+    @property
+    def has_pages(self) -> bool:
+        return bool(self.retries) or self.next_page <= self.last_page
+
+
+class BatchScheduler:
+    """Очередь страниц нескольких поисковых запросов для общего пула воркеров.
+    Следующей берется страница запроса с наибольшим приоритетом, при равном приоритете -
+    запроса, у которого загружено меньше всего страниц: запросы продвигаются вровень
+    и один длинный запрос не задерживает остальные"""
+
+    def __init__(self, priorities: List[int], max_pages: int, max_in_flight_per_query: int = 1,
+                 last_pages: Optional[List[int]] = None):
+        self.queries = [_QueryState(priority, max_pages) for priority in priorities]
+        for state, last_page in zip(self.queries, last_pages or ()):
+            # Конец выдачи уже известен (например, с прошлого запуска задачи)
+            state.last_page = min(state.last_page, last_page)
+        self.max_in_flight_per_query = max(1, max_in_flight_per_query)
+
+    def next_task(self) -> Optional[Tuple[int, int]]:
+        """(номер запроса, страница) для загрузки или None, если сейчас выдавать нечего"""
+        best = None
+        for index, state in enumerate(self.queries):
+            if not state.has_pages or state.in_flight >= self.max_in_flight_per_query:
+                continue
+            if best is None or (-state.priority, state.dispatched) < (-self.queries[best].priority,
+                                                                       self.queries[best].dispatched):
+                best = index
+        if best is None:
+            return None
+
+        state = self.queries[best]
+        if state.retries:
+            page = state.retries.pop(0)
+        else:
+            page = state.next_page
+            state.next_page += 1
+        state.in_flight += 1
+        state.dispatched += 1
+        return best, page
+
+    def complete(self, index: int, page: int, empty: bool):
+        state = self.queries[index]
+        state.in_flight -= 1
+        if empty and page <= state.last_page:
+            # Пустая страница - у запроса дальше результатов нет, следующие страницы не выдаем
+            state.last_page = page - 1
+
+    def retry(self, index: int, page: int):
+        """Вернуть страницу с ошибкой в очередь запроса"""
+        state = self.queries[index]
+        state.in_flight -= 1
+        state.retries.append(page)
+
+    def is_current(self, index: int, page: int) -> bool:
+        """Страница не дальше конца выдачи запроса (результаты опережающих загрузок отбрасываются)"""
+        return page <= self.queries[index].last_page
+
+    @property
+    def done(self) -> bool:
+        return all(not state.has_pages and not state.in_flight for state in self.queries)
@@ -0,0 +1,76 @@
+import os
+from typing import List, Sequence
+
+# full - обычный Chrome со всеми ресурсами страницы; lean - без картинок, шрифтов, медиа
+# и сторонних скриптов, с загрузкой до DOMContentLoaded и маленьким окном
+PARSER_BROWSER_MODE = os.getenv("PARSER_BROWSER_MODE", "full")
+# Хосты аналитики и рекламы, запросы к которым в режиме lean блокируются (через запятую)
+PARSER_BLOCKED_HOSTS = os.getenv(
+    "PARSER_BLOCKED_HOSTS",
+    "mc.yandex.ru,yandex.ru/ads,an.yandex.ru,google-analytics.com,googletagmanager.com,doubleclick.net,"
+    "top-fwz1.mail.ru,vk.com/rtrg,facebook.net,criteo.com,mytarget.ru,ad.mail.ru"
+)
+PARSER_LEAN_WINDOW_SIZE = os.getenv("PARSER_LEAN_WINDOW_SIZE", "1024,768")
+
+BROWSER_MODES = ("full", "lean")
+
+# Нам нужен только текст карточек: картинки, шрифты и медиа в режиме lean не загружаются
+BLOCKED_RESOURCE_PATTERNS = (
+    "*.webp", "*.jpg", "*.jpeg", "*.png", "*.gif", "*.avif", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.m3u8",
+)
+
+LEAN_ARGUMENTS = (
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--mute-audio",
+    "--no-first-run",
+    "--blink-settings=imagesEnabled=false",
+)
+
+
+def check_mode(mode: str):
+    if mode not in BROWSER_MODES:
+        raise ValueError(f"Неизвестный режим браузера: {mode}")
+
+
+def window_size(mode: str) -> str:
+    return PARSER_LEAN_WINDOW_SIZE if mode == "lean" else "1920,1080"
+
+
+def apply_lean_options(options):
+    """Настройки запуска Chrome для режима lean"""
+    # driver.get() возвращается после DOMContentLoaded, не дожидаясь картинок и сторонних скриптов
+    options.page_load_strategy = "eager"
+    for argument in LEAN_ARGUMENTS:
+        options.add_argument(argument)
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values.notifications": 2,
+    })
+
+
+def blocked_url_patterns(hosts: Sequence[str]) -> List[str]:
+    """Шаблоны Network.setBlockedURLs: типы ресурсов и все адреса на хостах из списка и их поддоменах"""
+    patterns = list(BLOCKED_RESOURCE_PATTERNS)
+    for host in hosts:
+        host = host.strip()
+        if not host:
+            continue
+        patterns += [f"*://{host}*", f"*://*.{host}*"]
+    return patterns
+
+
+def block_requests(driver, hosts: Sequence[str]):
+    """Блокирует запросы браузера по шаблонам через DevTools; действует до закрытия браузера"""
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_url_patterns(hosts)})
+
+
+def blocked_hosts() -> List[str]:
+    return [host.strip() for host in PARSER_BLOCKED_HOSTS.split(",") if host.strip()]
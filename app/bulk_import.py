@@ -0,0 +1,167 @@
+import codecs
+import csv
+import json
+import os
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.crud as crud
+import app.crud_async as crud_async
+from app.metrics import DB_ROWS
+from app.models import Product
+from app.schemas import ProductCreate
+
+# Сколько строк проверяется и загружается в промежуточную таблицу за раз
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "10000"))
+# Сколько ошибок по отклоненным строкам возвращать в ответе
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+IMPORT_FIELDS = tuple(ProductCreate.model_fields)
+
+# Ограничения длины строковых колонок: строка длиннее сорвала бы всю загрузку на этапе слияния
+_MAX_LENGTHS = {
+    field: Product.__table__.c[field].type.length
+    for field in IMPORT_FIELDS
+    if getattr(Product.__table__.c[field].type, "length", None)
+}
+
+
+async def read_records(body: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, Optional[dict], str]]:
+    """Записи из тела запроса по мере поступления: (номер строки, поля или None, текст ошибки).
+    CSV - с заголовком, лишние колонки (например, id из выгрузки) пропускаются"""
+    header = None
+    async for line_number, text in _records_text(body, quoted=fmt == "csv"):
+        if not text.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                record = json.loads(text)
+            except ValueError as e:
+                yield line_number, None, f"Некорректный JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, "Ожидался JSON-объект"
+                continue
+            yield line_number, record, ""
+            continue
+
+        values = next(csv.reader([text]))
+        if header is None:
+            header = values
+            continue
+        if len(values) != len(header):
+            yield line_number, None, f"Ожидалось {len(header)} колонок, получено {len(values)}"
+            continue
+        yield line_number, {
+            column: value for column, value in zip(header, values) if column in IMPORT_FIELDS and value != ""
+        }, ""
+
+
+async def _records_text(body: AsyncIterator[bytes], quoted: bool) -> AsyncIterator[Tuple[int, str]]:
+    """Текст записей с номером первой строки. Для CSV строки склеиваются, пока число кавычек
+    нечетное - так перевод строки внутри значения в кавычках не разрывает запись"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    line_number = 0
+    record: List[str] = []
+    record_start = 1
+    quotes = 0
+    async for data in body:
+        lines = (tail + decoder.decode(data)).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            line_number += 1
+            if not record:
+                record_start = line_number
+            record.append(line)
+            if quoted:
+                quotes += line.count('"')
+                if quotes % 2:
+                    continue
+            yield record_start, "\n".join(record).rstrip("\r")
+            record, quotes = [], 0
+    tail += decoder.decode(b"", final=True)
+    if tail or record:
+        record.append(tail)
+        yield record_start if len(record) > 1 else line_number + 1, "\n".join(record).rstrip("\r")
+
+
+def validate(record: dict) -> ProductCreate:
+    product = ProductCreate.model_validate(record)
+    for field, length in _MAX_LENGTHS.items():
+        value = getattr(product, field)
+        if value is not None and len(value) > length:
+            raise ValueError(f"{field}: длиннее {length} символов")
+    return product
+
+
+async def import_products(
+        db: AsyncSession,
+        records: AsyncIterator[Tuple[int, Optional[dict], str]],
+        chunk_size: int = IMPORT_CHUNK_SIZE
+) -> Dict:
+    """Проверяет записи пачками и загружает годные. В PostgreSQL пачки идут через COPY во временную
+    таблицу, а в конце одним запросом сливаются с products - вся загрузка в одной транзакции.
+    В других СУБД каждая пачка записывается через upsert_products. Индекс почти-дубликатов
+    при загрузке не обновляется, его догоняет python -m app.cli dedup"""
+    summary = {"received": 0, "inserted": 0, "updated": 0, "duplicates": 0, "price_changes": 0,
+               "rejected": 0, "errors": []}
+    use_copy = db.bind.dialect.name == "postgresql"
+    if use_copy:
+        await crud_async.create_import_staging(db)
+
+    chunk: List[Tuple[int, ProductCreate]] = []
+
+    async def flush():
+        if use_copy:
+            await crud_async.copy_import_rows(db, [
+                (line, crud.product_natural_key(product), crud.product_hash_key(product.name, product.brand),
+                 *(getattr(product, field) for field in IMPORT_FIELDS))
+                for line, product in chunk
+            ])
+        else:
+            counts = await db.run_sync(
+                lambda session: crud.upsert_products(session, [p for _, p in chunk], index=False)
+            )
+            for key in ("inserted", "updated", "duplicates", "price_changes"):
+                summary[key] += counts[key]
+        chunk.clear()
+
+    try:
+        async for line, record, error in records:
+            summary["received"] += 1
+            if record is not None:
+                try:
+                    chunk.append((line, validate(record)))
+                except (ValidationError, ValueError) as e:
+                    error = _error_text(e)
+            if error:
+                summary["rejected"] += 1
+                if len(summary["errors"]) < IMPORT_MAX_ERRORS:
+                    summary["errors"].append({"line": line, "error": error})
+            if len(chunk) >= chunk_size:
+                await flush()
+        if chunk:
+            await flush()
+
+        if use_copy:
+            counts = await crud_async.merge_import_staging(db)
+            summary.update(counts)
+            await db.commit()
+            DB_ROWS.labels(result="inserted").inc(counts["inserted"])
+            DB_ROWS.labels(result="updated").inc(counts["updated"])
+    except Exception:
+        await db.rollback()
+        raise
+
+    return summary
+
+
+def _error_text(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+        )
+    return str(error)
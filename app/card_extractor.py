@@ -0,0 +1,113 @@
+import re
+from typing import Dict, List, Optional
+from lxml import etree
+from lxml import html as lxml_html
+from app.schemas import ProductCreate
+
+NON_DIGITS_RE = re.compile(r'[^\d]')
+NON_FLOAT_RE = re.compile(r'[^\d.]')
+DIGITS_RE = re.compile(r'\d+')
+
+# Все карточки страницы одним скомпилированным XPath
+CARDS_XPATH = etree.XPath(
+    "//article[contains(concat(' ', normalize-space(@class), ' '), ' product-card ')]"
+)
+
+# (тег, css-класс) -> поле карточки; <del> без класса - старая цена
+FIELD_SELECTORS = {
+    ('ins', 'price__lower-price'): 'current_price',
+    ('span', 'percentage-sale'): 'discount',
+    ('span', 'product-card__brand'): 'brand',
+    ('span', 'product-card__name'): 'name',
+    ('span', 'address-rate-mini'): 'rating',
+    ('span', 'product-card__count'): 'reviews',
+    ('span', 'product-card__tip--quantity'): 'stock',
+}
+FIELD_TAGS = ('ins', 'del', 'span')
+CARD_FIELDS = frozenset(FIELD_SELECTORS.values()) | {'old_price'}
+
+
+def price_to_float(price_text: str) -> float:
+    try:
+        cleaned = NON_DIGITS_RE.sub('', price_text)
+        return float(cleaned) if cleaned else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def text_to_float(text: str) -> Optional[float]:
+    try:
+        cleaned = NON_FLOAT_RE.sub('', text.replace(',', '.'))
+        return float(cleaned) if cleaned else None
+    except (ValueError, TypeError):
+        return None
+
+
+def text_to_int(text: str) -> Optional[int]:
+    try:
+        cleaned = NON_DIGITS_RE.sub('', text)
+        return int(cleaned) if cleaned else None
+    except (ValueError, TypeError):
+        return None
+
+
+def element_text(element) -> str:
+    """Текст элемента как у BeautifulSoup get_text(strip=True)"""
+    return ''.join(part.strip() for part in element.itertext())
+
+
+class CardExtractor:
+    """Извлекает поля всех карточек товаров за один проход по HTML"""
+
+    def find_cards(self, page_source: str) -> List:
+        """Разбирает HTML один раз и возвращает элементы карточек"""
+        if not page_source:
+            return []
+        root = lxml_html.fromstring(page_source)
+        return CARDS_XPATH(root)
+
+    def extract_fields(self, card) -> Dict[str, str]:
+        """Сырые тексты полей карточки за один обход ее поддерева"""
+        fields = {}
+        for element in card.iter(*FIELD_TAGS):
+            if element.tag == 'del':
+                if 'old_price' not in fields:
+                    fields['old_price'] = element_text(element)
+                continue
+
+            for css_class in (element.get('class') or '').split():
+                field = FIELD_SELECTORS.get((element.tag, css_class))
+                if field and field not in fields:
+                    fields[field] = element_text(element)
+
+            if len(fields) == len(CARD_FIELDS):
+                break
+        return fields
+
+    def extract_product(self, card) -> ProductCreate:
+        """Преобразует карточку в ProductCreate"""
+        fields = self.extract_fields(card)
+
+        old_price_text = fields.get('old_price')
+        discount_match = DIGITS_RE.search(fields.get('discount', ''))
+
+        name = fields.get('name', '').lstrip('/').strip()
+
+        rating_text = fields.get('rating')
+        reviews_text = fields.get('reviews', '')
+        stock_text = fields.get('stock', '')
+
+        article = card.get('data-nm-id')
+
+        return ProductCreate(
+            article=int(article) if article and article.isdigit() else None,
+            current_price=price_to_float(fields.get('current_price', '')),
+            old_price=price_to_float(old_price_text) if old_price_text is not None else None,
+            discount=int(discount_match.group()) if discount_match else None,
+            brand=fields.get('brand') or None,
+            name=name or "Название не найдено",
+            rating=text_to_float(rating_text) if rating_text is not None else None,
+            reviews_count=text_to_int(reviews_text.split(" ")[0]),
+            stock=stock_text.split(" ")[0] if stock_text else "Остатки не указаны",
+            currency="RUB"
+        )
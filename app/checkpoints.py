@@ -0,0 +1,88 @@
+import os
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+# Сколько раз всего (с учетом перезапусков задачи) пробовать загрузить страницу, прежде чем пропустить ее
+PARSER_PAGE_ATTEMPTS = int(os.getenv("PARSER_PAGE_ATTEMPTS", "3"))
+
+
+class CrawlCheckpoint:
+    """Состояние обхода задачи, которое сохраняется в parse_jobs.checkpoint и переживает перезапуск:
+    записанные в БД страницы, найденный конец выдачи, страницы с ошибками и число попыток,
+    промежуточные итоги. Страницы учитываются по номеру запроса (0 - для задачи с одним запросом)"""
+
+    def __init__(self, data: Optional[dict] = None, max_attempts: int = PARSER_PAGE_ATTEMPTS):
+        data = data or {}
+        self.max_attempts = max(1, max_attempts)
+        self.results: Optional[Dict] = data.get("results")
+        self._completed: Dict[int, Set[int]] = {
+            int(query): set(pages) for query, pages in data.get("completed", {}).items()
+        }
+        self._last_page: Dict[int, int] = {int(query): page for query, page in data.get("last_page", {}).items()}
+        self._failed: Dict[Tuple[int, int], dict] = {}
+        for key, failure in data.get("failed", {}).items():
+            query, _, page = key.partition(":")
+            self._failed[int(query), int(page)] = failure
+        self._lock = threading.Lock()
+
+    @property
+    def resumed(self) -> bool:
+        return any(self._completed.values())
+
+    def completed_pages(self, query: int = 0) -> int:
+        with self._lock:
+            return len(self._completed.get(query, ()))
+
+    def last_page(self, max_pages: int, query: int = 0) -> int:
+        """Последняя страница для загрузки: max_pages или конец выдачи, найденный до перезапуска"""
+        with self._lock:
+            return min(max_pages, self._last_page.get(query, max_pages))
+
+    def should_fetch(self, page: int, query: int = 0) -> bool:
+        """Страница еще не записана и попытки ее загрузить не исчерпаны"""
+        with self._lock:
+            if page in self._completed.get(query, ()):
+                return False
+            failure = self._failed.get((query, page))
+            return failure is None or failure["attempts"] < self.max_attempts
+
+    def page_done(self, page: int, query: int = 0):
+        with self._lock:
+            self._completed.setdefault(query, set()).add(page)
+            self._failed.pop((query, page), None)
+
+    def page_failed(self, page: int, error: str, query: int = 0) -> bool:
+        """Учитывает неудачную попытку; True - страницу можно загрузить еще раз"""
+        with self._lock:
+            failure = self._failed.setdefault((query, page), {"attempts": 0, "error": ""})
+            failure["attempts"] += 1
+            failure["error"] = error[:500]
+            return failure["attempts"] < self.max_attempts
+
+    def end_of_results(self, last_page: int, query: int = 0):
+        with self._lock:
+            self._last_page[query] = min(last_page, self._last_page.get(query, last_page))
+
+    @property
+    def failed_pages(self) -> List[Tuple[int, int]]:
+        """(запрос, страница), которые пропущены после всех попыток"""
+        with self._lock:
+            return sorted(key for key, failure in self._failed.items() if failure["attempts"] >= self.max_attempts)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "completed": {str(query): sorted(pages) for query, pages in self._completed.items()},
+                # Первая незаписанная страница каждого запроса
+                "cursor": {str(query): _first_missing(pages) for query, pages in self._completed.items()},
+                "last_page": {str(query): page for query, page in self._last_page.items()},
+                "failed": {f"{query}:{page}": dict(failure) for (query, page), failure in self._failed.items()},
+                "results": self.results,
+            }
+
+
+def _first_missing(pages: Set[int]) -> int:
+    page = 1
+    while page in pages:
+        page += 1
+    return page
@@ -0,0 +1,136 @@
+import argparse
+import sys
+from typing import List, Tuple
+
+
+def read_queries_file(path: str) -> List[Tuple[str, int]]:
+    """Запросы из файла: по одному в строке, через табуляцию можно указать приоритет.
+    Пустые строки и строки с # пропускаются"""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            query, _, priority = line.partition("\t")
+            queries.append((query.strip(), int(priority) if priority.strip() else 0))
+    return queries
+
+
+def run_batch(args) -> int:
+    from app import crud
+    from app.database import SessionLocal
+    from app.parser_service import ParserService
+
+    queries = [(query, args.priority) for query in args.query]
+    for path in args.file:
+        queries += read_queries_file(path)
+    queries = crud.unique_queries(queries)
+    if not queries:
+        print("Не задано ни одного запроса", file=sys.stderr)
+        return 2
+
+    db = SessionLocal()
+    try:
+        results = ParserService(db).parse_and_save_batch(queries, args.pages, workers=args.workers)
+    finally:
+        db.close()
+
+    for query, count in results["by_query"].items():
+        print(f"{count:6d}  {query}")
+    return 0
+
+
+def run_worker(args) -> int:
+    import signal
+    import threading
+    from app.jobs import job_runner
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    job_runner.start()
+    try:
+        while not stopped.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        job_runner.stop()
+    return 0
+
+
+def run_dedup(args) -> int:
+    from sqlalchemy import func, select
+    from app import crud
+    from app.database import SessionLocal
+    from app.models import ProductMinHash
+
+    db = SessionLocal()
+    indexed = matched = 0
+    try:
+        for indexed, matched in crud.backfill_near_duplicates(db, args.batch_size, rebuild=args.rebuild):
+            print(f"\rПроверено товаров: {indexed}", end="", file=sys.stderr)
+
+        clusters = db.scalar(
+            select(func.count()).select_from(
+                select(ProductMinHash.cluster_id).group_by(ProductMinHash.cluster_id)
+                .having(func.count() > 1).subquery()
+            )
+        )
+    finally:
+        db.close()
+
+    print(file=sys.stderr)
+    print(f"Товаров: {indexed}, обновлено с найденными дублями: {matched}, кластеров дублей: {clusters}")
+    return 0
+
+
+def fold_spans_file(args) -> int:
+    import json
+    from app.metrics import fold_spans
+
+    with open(args.path, encoding="utf-8") as f:
+        folded = fold_spans(json.loads(line) for line in f if line.strip())
+    for path, microseconds in sorted(folded.items()):
+        print(f"{path} {microseconds}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Парсер Wildberries")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="Спарсить несколько запросов общим пулом воркеров")
+    batch.add_argument("-q", "--query", action="append", default=[], help="Поисковый запрос, можно несколько раз")
+    batch.add_argument("-f", "--file", action="append", default=[],
+                       help="Файл с запросами: по одному в строке, приоритет - через табуляцию")
+    batch.add_argument("--priority", type=int, default=0, help="Приоритет запросов из --query")
+    batch.add_argument("--pages", type=int, default=1, help="Сколько страниц парсить по каждому запросу")
+    batch.add_argument("--workers", type=int, default=None, help="Сколько страниц загружать параллельно")
+    batch.set_defaults(handler=run_batch)
+
+    worker = commands.add_parser(
+        "worker", help="Выполнять задачи из очереди parse_jobs без API (процессы API - с PARSE_WORKER_ENABLED=0)"
+    )
+    worker.set_defaults(handler=run_worker)
+
+    dedup = commands.add_parser(
+        "dedup", help="Добавить в индекс почти-дубликатов товары, которых в нем нет или у которых изменилось название"
+    )
+    dedup.add_argument("--rebuild", action="store_true",
+                       help="Построить индекс заново (после смены NEAR_DUP_* или для пересборки кластеров)")
+    dedup.add_argument("--batch-size", type=int, default=1000, help="Товаров в одной транзакции")
+    dedup.set_defaults(handler=run_dedup)
+
+    spans = commands.add_parser(
+        "spans", help="Свернуть интервалы этапов из METRICS_SPANS_FILE в стеки для flamegraph.pl/speedscope"
+    )
+    spans.add_argument("path", help="Файл интервалов")
+    spans.set_defaults(handler=fold_spans_file)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
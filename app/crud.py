@@ -1,34 +1,108 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from app.models import Product
+from sqlalchemy import or_, select, func, update, insert, delete, case, text
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import (
+    Product, PriceSnapshot, PageFingerprint, ParseJob, TableVersion, ProductMinHash, ProductLshBucket,
+    JOB_QUEUED, JOB_RUNNING, PRICE_HISTORY_FIELDS, PRODUCTS_VERSION
+)
 from app.schemas import ProductCreate, ProductUpdate
-from typing import List, Optional
+from app.pagination import keyset_page
+from app.metrics import DB_BATCH_SECONDS, DB_ROWS, span
+from app.logger import logger
+from app import near_duplicates
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+import hashlib
+import os
+import time
 
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "500"))
+# Ключ advisory-блокировки PostgreSQL, под которой воркеры забирают задачи из очереди
+JOBS_CLAIM_LOCK_KEY = 7_210_001
+# Сколько корзин LSH искать одним запросом (ограничение числа параметров запроса)
+NEAR_DUP_LOOKUP_CHUNK = 5000
 
+# Поля, которые обновляются у уже существующего товара при повторном парсинге
+UPSERT_UPDATE_COLUMNS = (
+    "article", "current_price", "old_price", "discount", "brand", "name",
+    "rating", "reviews_count", "stock", "currency",
+)
+
+
+def product_natural_key(product) -> str:
+    """Естественный ключ товара: артикул WB, а без него - хэш названия и бренда"""
+    if product.article:
+        return f"wb:{product.article}"
+    return product_hash_key(product.name, product.brand)
+
+
+def product_hash_key(name: Optional[str], brand: Optional[str]) -> str:
+    """Ключ товара без артикула. Так же он посчитан в миграции 39926cae7dfc для старых записей"""
+    normalized = f"{(name or '').strip().lower()}|{(brand or '').strip().lower()}"
+    return "h:" + hashlib.md5(normalized.encode("utf-8")).hexdigest()
 
 
 def get_products(
         db: Session,
         skip: int = 0,
         limit: int = 100,
-        search: Optional[str] = None
+        search: Optional[str] = None,
+        sort: Optional[str] = None,
+        cursor: Optional[str] = None
 ):
-    query = db.query(Product)
+    dialect = db.get_bind().dialect.name
+    query = products_query(search, dialect)
+
+    if sort or cursor:
+        # Курсорная пагинация: глубокие страницы так же быстры, как первая
+        return keyset_page(db, query, sort, cursor, limit)
+
+    return db.scalars(offset_page(query, search, dialect, skip, limit)).all()
 
+
+def products_query(search: Optional[str], dialect: str):
+    query = select(Product)
     if search:
         # Поиск по названию или бренду
-        query = query.filter(
-            or_(
-                Product.name.ilike(f"%{search}%"),
-                Product.brand.ilike(f"%{search}%")
-            )
+        query = query.where(search_filter(search, dialect))
+    return query
+
+
+def offset_page(query, search: Optional[str], dialect: str, skip: int, limit: int):
+    if search and dialect == "postgresql":
+        # Самые похожие на запрос товары - первыми
+        query = query.order_by(search_rank(search).desc())
+    return query.order_by(Product.id).offset(skip).limit(limit)
+
+
+def search_filter(search: str, dialect: str = "postgresql"):
+    """Подстрочный поиск по названию или бренду; в PostgreSQL его обслуживают GIN-индексы pg_trgm"""
+    pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    if dialect == "sqlite":
+        # Запасной вариант для тестов на SQLite: регистронезависимо и для кириллицы
+        pattern = pattern.lower()
+        return or_(
+            func.unicode_lower(Product.name).like(pattern, escape="\\"),
+            func.unicode_lower(Product.brand).like(pattern, escape="\\")
         )
+    return or_(
+        Product.name.ilike(pattern, escape="\\"),
+        Product.brand.ilike(pattern, escape="\\")
+    )
+
 
-    return query.offset(skip).limit(limit).all()
+def search_rank(search: str):
+    """Релевантность товара запросу: триграммное сходство названия или бренда"""
+    return func.greatest(
+        func.similarity(Product.name, search),
+        func.similarity(func.coalesce(Product.brand, ""), search)
+    )
 
 
 def create_product(db: Session, product: ProductCreate):
     db_product = Product(
+        article=product.article,
+        natural_key=product_natural_key(product),
         current_price=product.current_price,
         old_price=product.old_price,
         discount=product.discount,
@@ -40,7 +114,12 @@ def create_product(db: Session, product: ProductCreate):
         currency=product.currency
     )
     db.add(db_product)
+    db.flush()
+    db.add(price_snapshot(db_product))
+    item = (db_product.id, db_product.name, db_product.brand)
+    db.execute(table_version_bump())
     db.commit()
+    index_committed(db, [item])
     db.refresh(db_product)
     return db_product
 
@@ -50,6 +129,8 @@ def create_product_bulk(db: Session, products: List[ProductCreate]):
     db_products = []
     for product_data in products:
         db_product = Product(
+            article=product_data.article,
+            natural_key=product_natural_key(product_data),
             current_price=product_data.current_price,
             old_price=product_data.old_price,
             discount=product_data.discount,
@@ -63,19 +144,305 @@ def create_product_bulk(db: Session, products: List[ProductCreate]):
         db.add(db_product)
         db_products.append(db_product)
 
+    db.flush()
+    db.add_all([price_snapshot(product) for product in db_products])
+    product_ids = [product.id for product in db_products]
+    items = [(product.id, product.name, product.brand) for product in db_products]
+    db.execute(table_version_bump())
     db.commit()
-    for product in db_products:
-        db.refresh(product)
+    index_committed(db, items)
+    # Одним запросом вместо refresh на каждый товар: SELECT заново заполняет объекты в сессии
+    for ids in _batched(product_ids, UPSERT_BATCH_SIZE):
+        db.scalars(select(Product).where(Product.id.in_(ids))).all()
     return db_products
 
 
+def upsert_products(
+        db: Session,
+        products: Iterable[ProductCreate],
+        batch_size: int = UPSERT_BATCH_SIZE,
+        index: bool = True
+) -> Dict[str, int]:
+    """Пакетно добавляет новые товары и обновляет существующие по естественному ключу.
+    Каждая пачка - один INSERT ... ON CONFLICT и одна транзакция; в той же транзакции
+    в историю цен дописываются товары, у которых изменились цена, скидка или наличие.
+    Индекс почти-дубликатов обновляется после коммита пачки отдельной транзакцией;
+    index=False - не обновлять его (догнать потом: python -m app.cli dedup)"""
+    # near_duplicates - товары пачки, у которых нашлись почти-дубликаты с другим ключом
+    counts = {"inserted": 0, "updated": 0, "duplicates": 0, "price_changes": 0, "near_duplicates": 0}
+
+    for batch in _batched(products, batch_size):
+        rows = {}
+        for product in batch:
+            row = product.model_dump()
+            row["natural_key"] = product_natural_key(product)
+            rows[row["natural_key"]] = row
+        counts["duplicates"] += len(batch) - len(rows)
+
+        try:
+            started = time.perf_counter()
+            _rekey_by_article(db, rows)
+            # Последнее известное состояние товаров пачки - с ним сравниваются новые цены
+            existing = {
+                row.natural_key: tuple(row[1:])
+                for row in db.execute(
+                    select(Product.natural_key, *(getattr(Product, field) for field in PRICE_HISTORY_FIELDS))
+                    .where(Product.natural_key.in_(list(rows)))
+                )
+            }
+
+            stmt = _dialect_insert(db)(Product).values(list(rows.values()))
+            update_columns = {column: stmt.excluded[column] for column in UPSERT_UPDATE_COLUMNS}
+            update_columns["updated_at"] = func.now()
+            product_ids = dict(db.execute(
+                stmt.on_conflict_do_update(index_elements=["natural_key"], set_=update_columns)
+                .returning(Product.natural_key, Product.id)
+            ).all())
+
+            snapshots = _price_changes(rows, existing, product_ids, utc_now())
+            if snapshots:
+                db.execute(insert(PriceSnapshot), snapshots)
+            db.execute(table_version_bump())
+            db.commit()
+            DB_BATCH_SECONDS.observe(time.perf_counter() - started)
+        except Exception:
+            db.rollback()
+            raise
+
+        DB_ROWS.labels(result="inserted").inc(len(rows) - len(existing))
+        DB_ROWS.labels(result="updated").inc(len(existing))
+
+        counts["updated"] += len(existing)
+        counts["inserted"] += len(rows) - len(existing)
+        counts["price_changes"] += len(snapshots)
+        if index:
+            counts["near_duplicates"] += index_committed(
+                db, [(product_ids[key], row["name"], row["brand"]) for key, row in rows.items()]
+            )
+
+    return counts
+
+
+def _rekey_by_article(db: Session, rows: Dict[str, dict]):
+    """Товар, записанный без артикула (в том числе до появления артикулов), хранится под ключом
+    по названию и бренду. Когда он приходит с артикулом, запись переводится на ключ артикула,
+    а не добавляется второй раз"""
+    candidates = {}
+    for key, row in rows.items():
+        if key.startswith("wb:"):
+            candidates.setdefault(product_hash_key(row["name"], row["brand"]), key)
+    if not candidates:
+        return
+    present = set(db.scalars(
+        select(Product.natural_key).where(Product.natural_key.in_([*candidates, *candidates.values()]))
+    ))
+    rekey = {old: new for old, new in candidates.items() if old in present and new not in present}
+    if rekey:
+        db.execute(
+            update(Product).where(Product.natural_key.in_(list(rekey)))
+            .values(natural_key=case(rekey, value=Product.natural_key),
+                    article=case({old: rows[new]["article"] for old, new in rekey.items()},
+                                 value=Product.natural_key))
+        )
+
+
+def table_version_bump(name: str = PRODUCTS_VERSION):
+    """Увеличение версии таблицы - выполняется в той же транзакции, что и запись в нее"""
+    return update(TableVersion).where(TableVersion.name == name).values(version=TableVersion.version + 1)
+
+
+def index_committed(db: Session, products: List[Tuple[int, Optional[str], Optional[str]]]) -> int:
+    """Обновляет индекс почти-дубликатов для уже записанных товаров отдельной транзакцией:
+    расчет сигнатур не удлиняет транзакцию записи, а ошибка индекса не отменяет записанные
+    товары - она пишется в лог, и индекс догоняет python -m app.cli dedup"""
+    if not near_duplicates.NEAR_DUP_INDEX or not products:
+        return 0
+    try:
+        with span("near_dup_index", products=len(products)):
+            matched = index_near_duplicates(db, products)
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Индекс почти-дубликатов не обновлен для {len(products)} товаров: {e}")
+        return 0
+    return matched
+
+
+def backfill_near_duplicates(db: Session, batch_size: int = 1000, rebuild: bool = False) -> Iterator[Tuple[int, int]]:
+    """Догоняет индекс почти-дубликатов по всей таблице товаров пачками по id, каждая пачка - своя
+    транзакция. Товары с неизменившимися названием и брендом пропускаются по хэшу текста;
+    rebuild - построить индекс заново. После каждой пачки отдает (проверено товаров, из них с дублями)"""
+    if rebuild:
+        db.execute(delete(ProductLshBucket))
+        db.execute(delete(ProductMinHash))
+        db.commit()
+
+    checked = matched = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Product.id, Product.name, Product.brand)
+            .where(Product.id > last_id).order_by(Product.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        matched += index_near_duplicates(db, [tuple(row) for row in rows], force=True)
+        db.commit()
+        checked += len(rows)
+        last_id = rows[-1].id
+        yield checked, matched
+
+
+def index_near_duplicates(
+        db: Session,
+        products: Iterable[Tuple[int, Optional[str], Optional[str]]],
+        force: bool = False
+) -> int:
+    """Обновляет индекс почти-дубликатов для записанных товаров (id, название, бренд) в текущей
+    транзакции. Сигнатура пересчитывается, только если изменились название или бренд; товар
+    сравнивается лишь с товарами из своих корзин LSH, и его кластер объединяется с кластерами
+    найденных дублей. force - обновить и при NEAR_DUP_INDEX=0. Возвращает число товаров, у которых нашлись дубли"""
+    if not (near_duplicates.NEAR_DUP_INDEX or force):
+        return 0
+    texts = {product_id: (near_duplicates.text_hash(name, brand), name, brand) for product_id, name, brand in products}
+    if not texts:
+        return 0
+    known = {
+        row.product_id: row
+        for row in db.execute(
+            select(ProductMinHash.product_id, ProductMinHash.text_hash, ProductMinHash.cluster_id)
+            .where(ProductMinHash.product_id.in_(list(texts)))
+        )
+    }
+    changed = [
+        product_id for product_id, (hash_, _, _) in texts.items()
+        if product_id not in known or known[product_id].text_hash != hash_
+    ]
+    if not changed:
+        return 0
+
+    db.execute(delete(ProductLshBucket).where(ProductLshBucket.product_id.in_(changed)))
+    db.execute(delete(ProductMinHash).where(ProductMinHash.product_id.in_(changed)))
+    # Товар с новым текстом выходит из своего кластера; если кластер был помечен его id,
+    # метка переходит к наименьшему id из оставшихся
+    for label in {known[product_id].cluster_id for product_id in changed if product_id in known} & set(changed):
+        remaining = db.scalar(select(func.min(ProductMinHash.product_id)).where(ProductMinHash.cluster_id == label))
+        if remaining is not None:
+            db.execute(update(ProductMinHash).where(ProductMinHash.cluster_id == label).values(cluster_id=remaining))
+
+    signatures, keys, rows, buckets = {}, {}, [], []
+    for product_id in changed:
+        hash_, name, brand = texts[product_id]
+        signature = near_duplicates.signature(name, brand)
+        if signature is None:
+            continue
+        text_ = near_duplicates.normalize_text(name, brand)
+        signatures[product_id] = (signature, text_)
+        keys[product_id] = set(near_duplicates.band_keys(signature, text_))
+        rows.append({"product_id": product_id, "text_hash": hash_,
+                     "signature": near_duplicates.pack_signature(signature), "cluster_id": product_id})
+        buckets += [{"bucket": key, "product_id": product_id} for key in keys[product_id]]
+    if not rows:
+        return 0
+    # Через таблицу, а не ORM-модель: на товар приходится NEAR_DUP_BANDS строк корзин, и разбор
+    # каждой строки ORM-вставкой занимал больше времени, чем сам запрос
+    db.execute(insert(ProductMinHash.__table__), rows)
+    db.execute(insert(ProductLshBucket.__table__), buckets)
+
+    # Все товары из корзин пачки (включая саму пачку) - одним запросом на каждые NEAR_DUP_LOOKUP_CHUNK корзин
+    members: Dict[int, set] = {}
+    candidates: Dict[int, tuple] = {}
+    for chunk in _batched({bucket["bucket"] for bucket in buckets}, NEAR_DUP_LOOKUP_CHUNK):
+        for bucket, product_id, signature, cluster_id, name, brand in db.execute(
+            select(ProductLshBucket.bucket, ProductMinHash.product_id, ProductMinHash.signature,
+                   ProductMinHash.cluster_id, Product.name, Product.brand)
+            .join(ProductMinHash, ProductMinHash.product_id == ProductLshBucket.product_id)
+            .join(Product, Product.id == ProductLshBucket.product_id)
+            .where(ProductLshBucket.bucket.in_(chunk))
+        ):
+            members.setdefault(bucket, set()).add(product_id)
+            if product_id not in candidates:
+                other_signature, other_text = signatures.get(product_id) or (
+                    near_duplicates.unpack_signature(signature), near_duplicates.normalize_text(name, brand)
+                )
+                candidates[product_id] = (other_signature, other_text, cluster_id)
+
+    pairs = []
+    for product_id, (signature, text_) in signatures.items():
+        for other in set().union(*(members.get(key, ()) for key in keys[product_id])) - {product_id}:
+            other_signature, other_text, _ = candidates[other]
+            score = near_duplicates.duplicate_score(signature, text_, other_signature, other_text)
+            if score >= near_duplicates.NEAR_DUP_THRESHOLD:
+                pairs.append((product_id, other))
+
+    # Объединяются метки кластеров, а не отдельные товары: так два дубля одного кластера,
+    # найденные разными товарами пачки, не переписывают метки друг друга
+    relabel = {
+        label: min(labels)
+        for labels in near_duplicates.connected_groups((candidates[a][2], candidates[b][2]) for a, b in pairs)
+        for label in labels if label != min(labels)
+    }
+    if relabel:
+        db.execute(
+            update(ProductMinHash).where(ProductMinHash.cluster_id.in_(list(relabel)))
+            .values(cluster_id=case(relabel, value=ProductMinHash.cluster_id))
+        )
+    return len({product_id for product_id, _ in pairs})
+
+
+def price_snapshot(product: Product, captured_at: Optional[datetime] = None) -> PriceSnapshot:
+    """Снимок текущей цены товара для истории"""
+    return PriceSnapshot(
+        product_id=product.id,
+        captured_at=captured_at or utc_now(),
+        **{field: getattr(product, field) for field in PRICE_HISTORY_FIELDS}
+    )
+
+
+def _price_changes(rows: Dict[str, dict], existing: Dict[str, tuple], product_ids: Dict[str, int],
+                   captured_at: datetime) -> List[dict]:
+    """Строки истории для новых товаров и товаров, у которых изменилось что-то из PRICE_HISTORY_FIELDS"""
+    snapshots = []
+    for key, row in rows.items():
+        state = tuple(row[field] for field in PRICE_HISTORY_FIELDS)
+        if existing.get(key) != state:
+            snapshots.append({"product_id": product_ids[key], "captured_at": captured_at,
+                              **dict(zip(PRICE_HISTORY_FIELDS, state))})
+    return snapshots
+
+
+def _dialect_insert(db: Session):
+    """insert() с поддержкой ON CONFLICT для текущей СУБД"""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+def _batched(items: Iterable, batch_size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 def update_product(db: Session, product_id: int, product: ProductUpdate):
     db_product = db.query(Product).filter(Product.id == product_id).first()
     if db_product:
         update_data = product.model_dump(exclude_unset=True)
+        previous = tuple(getattr(db_product, field) for field in PRICE_HISTORY_FIELDS)
         for field, value in update_data.items():
             setattr(db_product, field, value)
+        db_product.natural_key = product_natural_key(db_product)
+        if tuple(getattr(db_product, field) for field in PRICE_HISTORY_FIELDS) != previous:
+            db.add(price_snapshot(db_product))
+        item = (db_product.id, db_product.name, db_product.brand)
+        db.execute(table_version_bump())
         db.commit()
+        index_committed(db, [item])
         db.refresh(db_product)
     return db_product
 
@@ -84,5 +451,118 @@ def delete_product(db: Session, product_id: int):
     db_product = db.query(Product).filter(Product.id == product_id).first()
     if db_product:
         db.delete(db_product)
+        db.execute(table_version_bump())
         db.commit()
-    return db_product
\ No newline at end of file
+    return db_product
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def unique_queries(queries: Iterable[Tuple[str, int]]) -> List[Tuple[str, int]]:
+    """Убирает повторы запросов пакета (без учета регистра и пробелов), оставляя наибольший приоритет"""
+    unique = {}
+    for query, priority in queries:
+        key = normalize_query(query)
+        if key and (key not in unique or priority > unique[key][1]):
+            unique[key] = (query.strip(), priority)
+    return list(unique.values())
+
+
+def batch_label(queries: List[Tuple[str, int]]) -> str:
+    """Краткое описание пакета для колонки query задачи"""
+    label = queries[0][0]
+    if len(queries) > 1:
+        label += f" и еще {len(queries) - 1}"
+    return label[:500]
+
+
+def get_page_fingerprints(db: Session, query: str) -> Dict[int, Tuple[str, List[str]]]:
+    """Отпечатки страниц выдачи запроса с прошлого обхода: страница -> (хэш, хэши карточек)"""
+    rows = db.execute(
+        select(PageFingerprint.page, PageFingerprint.fingerprint, PageFingerprint.card_hashes)
+        .where(PageFingerprint.query == normalize_query(query))
+    )
+    return {row.page: (row.fingerprint, row.card_hashes) for row in rows}
+
+
+def save_page_fingerprint(db: Session, query: str, page: int, fingerprint: str, card_hashes: List[str]):
+    stmt = _dialect_insert(db)(PageFingerprint).values(
+        query=normalize_query(query), page=page, fingerprint=fingerprint, card_hashes=card_hashes
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["query", "page"],
+        set_={"fingerprint": stmt.excluded.fingerprint, "card_hashes": stmt.excluded.card_hashes,
+              "updated_at": func.now()}
+    ))
+    db.commit()
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def claim_next_job(db: Session, worker_id: str, max_running: int) -> Optional[ParseJob]:
+    """Забирает самую старую задачу из очереди, если общее число запущенных задач меньше лимита.
+    В PostgreSQL проверка лимита и захват идут под advisory-блокировкой, поэтому лимит
+    соблюдается для всех процессов uvicorn сразу"""
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": JOBS_CLAIM_LOCK_KEY})
+
+        running = db.scalar(select(func.count()).select_from(ParseJob).where(ParseJob.status == JOB_RUNNING))
+        if running >= max_running:
+            db.rollback()
+            return None
+
+        job = db.scalars(
+            select(ParseJob)
+            .where(ParseJob.status == JOB_QUEUED)
+            .order_by(ParseJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).first()
+        if job is None:
+            db.rollback()
+            return None
+
+        now = utc_now()
+        job.status = JOB_RUNNING
+        job.worker_id = worker_id
+        job.started_at = job.started_at or now
+        job.heartbeat_at = now
+        job.progress = "Начинаем парсинг..."
+        db.commit()
+        return job
+    except Exception:
+        db.rollback()
+        raise
+
+
+def requeue_stale_jobs(db: Session, stale_after: float) -> int:
+    """Возвращает в очередь задачи, воркер которых перестал отмечаться (упал или был перезапущен)"""
+    result = db.execute(
+        update(ParseJob)
+        .where(ParseJob.status == JOB_RUNNING, ParseJob.heartbeat_at < utc_now() - timedelta(seconds=stale_after))
+        .values(status=JOB_QUEUED, worker_id=None, progress="Воркер не отвечает, задача возвращена в очередь")
+    )
+    db.commit()
+    return result.rowcount
+
+
+def touch_jobs(db: Session, job_ids: Iterable[int]):
+    """Обновляет heartbeat задач, которые выполняет текущий процесс"""
+    job_ids = list(job_ids)
+    if job_ids:
+        db.execute(update(ParseJob).where(ParseJob.id.in_(job_ids)).values(heartbeat_at=utc_now()))
+        db.commit()
+
+
+def update_job(db: Session, job_id: int, **fields) -> bool:
+    """Обновляет поля задачи и возвращает флаг запрошенной отмены"""
+    fields["heartbeat_at"] = utc_now()
+    db.execute(update(ParseJob).where(ParseJob.id == job_id).values(**fields))
+    db.commit()
+    return bool(db.scalar(select(ParseJob.cancel_requested).where(ParseJob.id == job_id)))
+
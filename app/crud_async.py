@@ -0,0 +1,372 @@
+from sqlalchemy import Integer, cast, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.crud import (
+    UPSERT_UPDATE_COLUMNS, index_committed, offset_page, price_snapshot, product_natural_key,
+    products_query, search_filter, table_version_bump, utc_now
+)
+from app.models import (
+    Product, PriceSnapshot, ParseJob, TableVersion, ProductMinHash, ProductLshBucket,
+    JOB_QUEUED, JOB_RUNNING, JOB_CANCELLED, PRICE_HISTORY_FIELDS, PRODUCTS_VERSION
+)
+from app.pagination import keyset_page_async
+from app import near_duplicates
+from app.schemas import ProductCreate
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import os
+
+# Сколько точек истории цен отдавать без прореживания
+PRICE_HISTORY_MAX_POINTS = int(os.getenv("PRICE_HISTORY_MAX_POINTS", "500"))
+
+# Колонки выгрузки товаров, в этом порядке
+EXPORT_COLUMNS = (
+    "id", "article", "name", "brand", "current_price", "old_price", "discount",
+    "rating", "reviews_count", "stock", "currency", "created_at", "updated_at",
+)
+
+
+async def get_products(
+        db: AsyncSession,
+        skip: int = 0,
+        limit: int = 100,
+        search: Optional[str] = None,
+        sort: Optional[str] = None,
+        cursor: Optional[str] = None
+):
+    dialect = db.bind.dialect.name
+    query = products_query(search, dialect)
+
+    if sort or cursor:
+        return await keyset_page_async(db, query, sort, cursor, limit)
+
+    return (await db.scalars(offset_page(query, search, dialect, skip, limit))).all()
+
+
+async def stream_products(
+        db: AsyncSession,
+        chunk_size: int,
+        search: Optional[str] = None,
+        brand: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+) -> AsyncIterator[List[tuple]]:
+    """Товары пачками по chunk_size строк в порядке id. Читаются кортежи колонок, без ORM-объектов;
+    в PostgreSQL строки идут через серверный курсор, поэтому память не зависит от размера выгрузки"""
+    query = select(*(getattr(Product, column) for column in EXPORT_COLUMNS))
+    if search:
+        query = query.where(search_filter(search, db.bind.dialect.name))
+    if brand:
+        query = query.where(Product.brand == brand)
+    if min_price is not None:
+        query = query.where(Product.current_price >= min_price)
+    if max_price is not None:
+        query = query.where(Product.current_price <= max_price)
+
+    result = await db.stream(query.order_by(Product.id).execution_options(yield_per=chunk_size))
+    async for rows in result.partitions():
+        yield [tuple(row) for row in rows]
+
+
+# Временная таблица загрузки (PostgreSQL): живет до конца транзакции
+IMPORT_STAGING_TABLE = "products_import"
+IMPORT_STAGING_COLUMNS = (
+    # hash_key - ключ по названию и бренду, под которым товар мог быть записан без артикула
+    ("line", "integer"), ("natural_key", "text"), ("hash_key", "text"), ("article", "bigint"),
+    ("current_price", "double precision"),
+    ("old_price", "double precision"), ("discount", "integer"), ("brand", "text"), ("name", "text"),
+    ("rating", "double precision"), ("reviews_count", "integer"), ("stock", "text"), ("currency", "text"),
+)
+
+
+async def create_import_staging(db: AsyncSession):
+    columns = ", ".join(f"{name} {type_}" for name, type_ in IMPORT_STAGING_COLUMNS)
+    await db.execute(text(f"CREATE TEMP TABLE {IMPORT_STAGING_TABLE} ({columns}) ON COMMIT DROP"))
+
+
+async def copy_import_rows(db: AsyncSession, rows: List[tuple]):
+    """Пачка строк в промежуточную таблицу через COPY (asyncpg), в текущей транзакции сессии"""
+    connection = await (await db.connection()).get_raw_connection()
+    await connection.driver_connection.copy_records_to_table(
+        IMPORT_STAGING_TABLE, records=rows, columns=[name for name, _ in IMPORT_STAGING_COLUMNS]
+    )
+
+
+async def merge_import_staging(db: AsyncSession) -> Dict[str, int]:
+    """Слияние промежуточной таблицы с products одним запросом: для повторяющегося ключа берется
+    последняя строка файла, новые товары и товары с изменившейся ценой попадают в историю цен.
+    Товары, записанные раньше без артикула, сначала переводятся на ключ артикула (как в upsert_products)"""
+    fields = [name for name, _ in IMPORT_STAGING_COLUMNS[3:]]
+    history = ", ".join(PRICE_HISTORY_FIELDS)
+    await db.execute(text(f"""
+        UPDATE products p SET natural_key = s.natural_key, article = s.article
+        FROM (
+            SELECT DISTINCT ON (hash_key) hash_key, natural_key, article
+            FROM (
+                SELECT DISTINCT ON (natural_key) natural_key, hash_key, article, line
+                FROM {IMPORT_STAGING_TABLE}
+                WHERE natural_key LIKE 'wb:%'
+                ORDER BY natural_key, line DESC
+            ) latest
+            ORDER BY hash_key, line DESC
+        ) s
+        WHERE p.natural_key = s.hash_key
+          AND NOT EXISTS (SELECT 1 FROM products q WHERE q.natural_key = s.natural_key)
+    """))
+    row = (await db.execute(text(f"""
+        WITH source AS (
+            SELECT DISTINCT ON (natural_key) natural_key, {", ".join(fields)}
+            FROM {IMPORT_STAGING_TABLE}
+            ORDER BY natural_key, line DESC
+        ),
+        previous AS (
+            SELECT p.natural_key, {", ".join(f"p.{field}" for field in PRICE_HISTORY_FIELDS)}
+            FROM products p JOIN source USING (natural_key)
+        ),
+        merged AS (
+            INSERT INTO products (natural_key, {", ".join(fields)})
+            SELECT natural_key, {", ".join(fields)} FROM source
+            ON CONFLICT (natural_key) DO UPDATE SET
+                {", ".join(f"{column} = EXCLUDED.{column}" for column in UPSERT_UPDATE_COLUMNS)},
+                updated_at = now()
+            RETURNING id, natural_key, {history}, (xmax = 0) AS inserted
+        ),
+        snapshots AS (
+            INSERT INTO price_snapshots (product_id, captured_at, {history})
+            SELECT merged.id, now(), {", ".join(f"merged.{field}" for field in PRICE_HISTORY_FIELDS)}
+            FROM merged LEFT JOIN previous USING (natural_key)
+            WHERE previous.natural_key IS NULL
+               OR ({", ".join(f"previous.{field}" for field in PRICE_HISTORY_FIELDS)})
+                  IS DISTINCT FROM ({", ".join(f"merged.{field}" for field in PRICE_HISTORY_FIELDS)})
+            RETURNING 1
+        )
+        SELECT
+            (SELECT count(*) FROM merged WHERE inserted) AS inserted,
+            (SELECT count(*) FROM merged WHERE NOT inserted) AS updated,
+            (SELECT count(*) FROM {IMPORT_STAGING_TABLE}) - (SELECT count(*) FROM source) AS duplicates,
+            (SELECT count(*) FROM snapshots) AS price_changes
+    """))).one()
+    await db.execute(table_version_bump())
+    return dict(row._mapping)
+
+
+async def get_table_version(db: AsyncSession, name: str = PRODUCTS_VERSION) -> Optional[int]:
+    return await db.scalar(select(TableVersion.version).where(TableVersion.name == name))
+
+
+async def get_product(db: AsyncSession, product_id: int) -> Optional[Product]:
+    return await db.get(Product, product_id)
+
+
+async def create_product(db: AsyncSession, product: ProductCreate):
+    db_product = Product(natural_key=product_natural_key(product), **product.model_dump())
+    db.add(db_product)
+    await db.flush()
+    db.add(price_snapshot(db_product))
+    item = (db_product.id, db_product.name, db_product.brand)
+    await db.execute(table_version_bump())
+    await db.commit()
+    await db.run_sync(lambda session: index_committed(session, [item]))
+    await db.refresh(db_product)
+    return db_product
+
+
+async def delete_product(db: AsyncSession, product_id: int):
+    db_product = await db.get(Product, product_id)
+    if db_product:
+        await db.delete(db_product)
+        await db.execute(table_version_bump())
+        await db.commit()
+    return db_product
+
+
+async def get_price_history(
+        db: AsyncSession,
+        product_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        points: int = PRICE_HISTORY_MAX_POINTS
+) -> Tuple[List[dict], bool]:
+    """История цены товара за период и признак прореживания.
+    Если изменений больше points, период делится на points интервалов и из каждого берется
+    последнее состояние плюс минимальная и максимальная цена внутри интервала"""
+    conditions = [PriceSnapshot.product_id == product_id]
+    if since:
+        conditions.append(PriceSnapshot.captured_at >= since)
+    if until:
+        conditions.append(PriceSnapshot.captured_at <= until)
+
+    total, first, last = (await db.execute(
+        select(func.count(), func.min(PriceSnapshot.captured_at), func.max(PriceSnapshot.captured_at))
+        .where(*conditions)
+    )).one()
+
+    columns = (PriceSnapshot.captured_at, PriceSnapshot.current_price, PriceSnapshot.discount, PriceSnapshot.stock)
+    if total <= points:
+        rows = await db.execute(select(*columns).where(*conditions).order_by(PriceSnapshot.captured_at))
+        return [
+            {**row._asdict(), "min_price": row.current_price, "max_price": row.current_price}
+            for row in rows
+        ], False
+
+    start = _as_utc(since or first)
+    # Конец периода попадает в последний, points-й интервал
+    width = max((_as_utc(until or last) - start).total_seconds() / max(points - 1, 1), 0.001)
+    bucket = _time_bucket(db.bind.dialect.name, PriceSnapshot.captured_at, start, width)
+    ranked = (
+        select(
+            *columns,
+            func.row_number().over(partition_by=bucket, order_by=PriceSnapshot.captured_at.desc()).label("rank"),
+            func.min(PriceSnapshot.current_price).over(partition_by=bucket).label("min_price"),
+            func.max(PriceSnapshot.current_price).over(partition_by=bucket).label("max_price"),
+        )
+        .where(*conditions)
+        .subquery()
+    )
+    rows = await db.execute(
+        select(ranked.c.captured_at, ranked.c.current_price, ranked.c.discount, ranked.c.stock,
+               ranked.c.min_price, ranked.c.max_price)
+        .where(ranked.c.rank == 1)
+        .order_by(ranked.c.captured_at)
+    )
+    return [row._asdict() for row in rows], True
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite возвращает время без часового пояса, в базу оно пишется в UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _time_bucket(dialect: str, column, start: datetime, width: float):
+    """Номер интервала длиной width секунд, в который попадает время column"""
+    if dialect == "sqlite":
+        # Время не раньше start, поэтому отбрасывание дробной части совпадает с floor
+        epoch = (func.julianday(column) - 2440587.5) * 86400
+        return cast((epoch - start.timestamp()) / width, Integer)
+    return func.floor((func.extract("epoch", column) - start.timestamp()) / width)
+
+
+async def create_job(
+        db: AsyncSession,
+        query: str,
+        pages: int,
+        workers: Optional[int] = None,
+        incremental: bool = False,
+        queries: Optional[List[dict]] = None
+) -> ParseJob:
+    job = ParseJob(
+        query=query,
+        queries=queries,
+        pages=pages,
+        workers=workers,
+        incremental=incremental,
+        status=JOB_QUEUED,
+        progress="В очереди",
+        pages_done=0,
+        products_parsed=0,
+        products_saved=0,
+        products_updated=0,
+        cancel_requested=False
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+async def get_job(db: AsyncSession, job_id: int) -> Optional[ParseJob]:
+    return await db.get(ParseJob, job_id)
+
+
+async def get_jobs(db: AsyncSession, limit: int = 20) -> List[ParseJob]:
+    return (await db.scalars(select(ParseJob).order_by(ParseJob.id.desc()).limit(limit))).all()
+
+
+async def count_jobs_by_status(db: AsyncSession) -> Dict[str, int]:
+    rows = await db.execute(select(ParseJob.status, func.count()).group_by(ParseJob.status))
+    return dict(rows.all())
+
+
+async def cancel_job(db: AsyncSession, job_id: int) -> Optional[ParseJob]:
+    """Задача из очереди отменяется сразу, запущенная - воркером после текущей страницы"""
+    job = await db.get(ParseJob, job_id)
+    if job is None:
+        return None
+
+    if job.status == JOB_QUEUED:
+        job.status = JOB_CANCELLED
+        job.progress = "Отменено"
+        job.finished_at = utc_now()
+    elif job.status == JOB_RUNNING:
+        job.cancel_requested = True
+        job.progress = "Отмена запрошена"
+
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+async def get_near_duplicates(db: AsyncSession, product_id: int) -> List[Tuple[Product, float]]:
+    """Почти-дубликаты товара по его корзинам LSH, от самых похожих"""
+    own = (await db.execute(
+        select(ProductMinHash.signature, Product.name, Product.brand)
+        .join(Product, Product.id == ProductMinHash.product_id)
+        .where(ProductMinHash.product_id == product_id)
+    )).first()
+    if own is None:
+        return []
+    signature = near_duplicates.unpack_signature(own.signature)
+    text_ = near_duplicates.normalize_text(own.name, own.brand)
+
+    candidates = await db.execute(
+        select(ProductMinHash.product_id, ProductMinHash.signature, Product.name, Product.brand)
+        .join(Product, Product.id == ProductMinHash.product_id)
+        .where(ProductMinHash.product_id.in_(
+            select(ProductLshBucket.product_id)
+            .where(ProductLshBucket.bucket.in_(near_duplicates.band_keys(signature, text_)))
+        ))
+        .where(ProductMinHash.product_id != product_id)
+    )
+    scores = {}
+    for other_id, other_signature, name, brand in candidates:
+        score = near_duplicates.duplicate_score(
+            signature, text_, near_duplicates.unpack_signature(other_signature),
+            near_duplicates.normalize_text(name, brand)
+        )
+        if score >= near_duplicates.NEAR_DUP_THRESHOLD:
+            scores[other_id] = score
+    if not scores:
+        return []
+
+    products = (await db.scalars(select(Product).where(Product.id.in_(list(scores))))).all()
+    return sorted(((product, scores[product.id]) for product in products), key=lambda item: (-item[1], item[0].id))
+
+
+async def get_duplicate_clusters(
+        db: AsyncSession,
+        min_size: int = 2,
+        skip: int = 0,
+        limit: int = 20
+) -> List[Tuple[int, List[Product]]]:
+    """Кластеры почти-дубликатов от самых больших: (метка кластера, товары кластера)"""
+    size = func.count().label("size")
+    clusters = (await db.execute(
+        select(ProductMinHash.cluster_id, size)
+        .join(Product, Product.id == ProductMinHash.product_id)
+        .group_by(ProductMinHash.cluster_id)
+        .having(size >= min_size)
+        .order_by(size.desc(), ProductMinHash.cluster_id)
+        .offset(skip).limit(limit)
+    )).all()
+    if not clusters:
+        return []
+
+    members: Dict[int, List[Product]] = {cluster_id: [] for cluster_id, _ in clusters}
+    rows = await db.execute(
+        select(ProductMinHash.cluster_id, Product)
+        .join(Product, Product.id == ProductMinHash.product_id)
+        .where(ProductMinHash.cluster_id.in_(list(members)))
+        .order_by(Product.id)
+    )
+    for cluster_id, product in rows:
+        members[cluster_id].append(product)
+    return list(members.items())
@@ -0,0 +1,168 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from app.logger import logger
+from app.metrics import DRIVER_STARTS, span
+
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "2"))
+DRIVER_MAX_PAGES = int(os.getenv("DRIVER_MAX_PAGES", "50"))
+DRIVER_CHECKOUT_TIMEOUT = float(os.getenv("DRIVER_CHECKOUT_TIMEOUT", "300"))
+
+
+class DriverPoolClosed(RuntimeError):
+    pass
+
+
+class PooledDriver:
+    """Браузер из пула и количество обработанных им страниц"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages_served = 0
+
+
+class DriverPool:
+    """Ограниченный пул прогретых headless-браузеров"""
+
+    def __init__(
+            self,
+            factory: Callable,
+            size: int = DRIVER_POOL_SIZE,
+            max_pages: int = DRIVER_MAX_PAGES,
+            checkout_timeout: float = DRIVER_CHECKOUT_TIMEOUT
+    ):
+        self.logger = logger
+        self._factory = factory
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.checkout_timeout = checkout_timeout
+        # LIFO: первым выдаем самый "теплый" браузер
+        self._idle: List[PooledDriver] = []
+        self._created = 0
+        # Свободные браузеры и счетчик запущенных меняются под одним условием: ожидающий поток
+        # просыпается и при возврате браузера, и когда закрытый браузер освобождает место для нового
+        self._condition = threading.Condition()
+        self._closed = False
+
+    @contextmanager
+    def driver(self):
+        """Выдает браузер из пула и возвращает его обратно после использования"""
+        pooled = self._acquire()
+        broken = False
+        try:
+            yield pooled.driver
+        except Exception:
+            # Упавший браузер пересоздаем, живой возвращаем в пул
+            broken = not self._is_healthy(pooled)
+            raise
+        finally:
+            pooled.pages_served += 1
+            self._release(pooled, broken)
+
+    def close(self):
+        """Закрывает все свободные браузеры, занятые закроются при возврате"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def _acquire(self) -> PooledDriver:
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise DriverPoolClosed("Пул браузеров закрыт")
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._created < self.size:
+                        self._created += 1
+                        pooled = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("Не удалось получить браузер из пула")
+                    self._condition.wait(remaining)
+
+            if pooled is None:
+                return self._start_driver()
+            if self._is_healthy(pooled):
+                return pooled
+
+            self.logger.warning("Браузер из пула не отвечает, пересоздаем")
+            self._discard(pooled)
+
+    def _start_driver(self) -> PooledDriver:
+        """Запускает браузер на место, уже занятое в счетчике _created"""
+        started = time.monotonic()
+        try:
+            with span("driver_start"):
+                driver = self._factory()
+            DRIVER_STARTS.inc()
+        except Exception:
+            self._free_slot()
+            raise
+
+        self.logger.info(f"Запущен новый браузер за {time.monotonic() - started:.2f} с")
+        return PooledDriver(driver)
+
+    def _release(self, pooled: PooledDriver, broken: bool):
+        with self._condition:
+            if not (self._closed or broken or pooled.pages_served >= self.max_pages):
+                self._idle.append(pooled)
+                self._condition.notify()
+                return
+        self._discard(pooled)
+
+    def _discard(self, pooled: PooledDriver):
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            self.logger.warning(f"Ошибка при закрытии браузера: {e}")
+        finally:
+            self._free_slot()
+
+    def _free_slot(self):
+        # Место закрытого браузера может занять поток, который ждет в _acquire
+        with self._condition:
+            self._created -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _is_healthy(pooled: PooledDriver) -> bool:
+        try:
+            return pooled.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+
+# Общие пулы процесса по ключу (режиму браузера): браузеры с разными профилями не смешиваются
+_shared_pools: Dict[str, DriverPool] = {}
+_shared_pool_lock = threading.Lock()
+
+
+def get_driver_pool(factory: Callable, key: str = "default") -> DriverPool:
+    """Общий пул браузеров процесса для ключа key, переживает отдельные задачи парсинга.
+    factory используется только при создании пула"""
+    with _shared_pool_lock:
+        pool = _shared_pools.get(key)
+        if pool is None or pool._closed:
+            pool = _shared_pools[key] = DriverPool(factory)
+        return pool
+
+
+def _close_shared_pools():
+    # Пулы могли быть пересозданы после закрытия, закрываем те, что общие сейчас
+    with _shared_pool_lock:
+        pools = list(_shared_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(_close_shared_pools)
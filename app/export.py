@@ -0,0 +1,132 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import AsyncIterator, List, Sequence
+
+from app.crud_async import EXPORT_COLUMNS
+
+# Сколько строк читается из курсора БД и сериализуется за один раз
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class ExportFormatUnavailable(Exception):
+    """Для формата не установлена нужная библиотека"""
+
+
+def check_format(fmt: str):
+    if fmt in ("parquet", "arrow"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportFormatUnavailable(f"Для формата {fmt} нужен пакет pyarrow (pip install pyarrow)")
+
+
+def serialize(fmt: str, chunks: AsyncIterator[List[Sequence]]) -> AsyncIterator[bytes]:
+    """Пачки строк из БД в байты выбранного формата; в памяти держится не больше одной пачки"""
+    if fmt == "csv":
+        return _csv_chunks(chunks)
+    if fmt == "ndjson":
+        return _ndjson_chunks(chunks)
+    return _arrow_chunks(chunks, parquet=fmt == "parquet")
+
+
+async def _csv_chunks(chunks: AsyncIterator[List[Sequence]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for rows in chunks:
+        writer.writerows(rows)
+        yield _take(buffer)
+    if buffer.tell():
+        yield _take(buffer)
+
+
+async def _ndjson_chunks(chunks: AsyncIterator[List[Sequence]]) -> AsyncIterator[bytes]:
+    async for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, map(_json_value, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+
+async def _arrow_chunks(chunks: AsyncIterator[List[Sequence]], parquet: bool) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+
+    types = {
+        "id": pa.int64(), "article": pa.int64(), "discount": pa.int32(), "reviews_count": pa.int32(),
+        "current_price": pa.float64(), "old_price": pa.float64(), "rating": pa.float64(),
+        "created_at": pa.timestamp("us", tz="UTC"), "updated_at": pa.timestamp("us", tz="UTC"),
+    }
+    schema = pa.schema([(column, types.get(column, pa.string())) for column in EXPORT_COLUMNS])
+    sink = _ChunkSink()
+    if parquet:
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema)
+        write = writer.write_table
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+
+    async for rows in chunks:
+        columns = list(zip(*rows))
+        batch = pa.record_batch([pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                                schema=schema)
+        # В Parquet каждая пачка становится отдельной группой строк
+        write(pa.Table.from_batches([batch]) if parquet else batch)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+class _ChunkSink:
+    """Файлоподобный приемник для pyarrow: накопленные байты забираются после каждой пачки"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _take(buffer: io.StringIO) -> bytes:
+    data = buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_filename(fmt: str) -> str:
+    suffix = {"ndjson": "ndjson", "csv": "csv", "parquet": "parquet", "arrow": "arrows"}[fmt]
+    return f"products_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{suffix}"
@@ -0,0 +1,154 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+import httpx
+from app.schemas import ProductCreate
+from app.logger import logger
+
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "selenium")
+WB_SEARCH_API_URL = os.getenv("WB_SEARCH_API_URL", "https://search.wb.ru/exactmatch/ru/common/v4/search")
+WB_DEST = os.getenv("WB_DEST", "-1257786")
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "10"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+
+
+class FetchBackend(ABC):
+    """Источник товаров для одной страницы поисковой выдачи"""
+
+    name = "base"
+
+    def fetch_page(self, search_url: str, page: int) -> List[ProductCreate]:
+        """Возвращает товары со страницы, пустой список - выдача закончилась"""
+        return self.parse_raw(self.fetch_raw(search_url, page))
+
+    def request_url(self, search_url: str, page: int) -> str:
+        """Адрес, который бэкенд запрашивает для страницы: по его хосту считается лимит запросов"""
+        return search_url
+
+    @abstractmethod
+    def fetch_raw(self, search_url: str, page: int) -> bytes:
+        """Загружает ответ для страницы как есть - в таком виде он попадает в кэш страниц"""
+
+    @abstractmethod
+    def parse_raw(self, content: bytes) -> List[ProductCreate]:
+        """Разбирает сохраненный ответ в товары"""
+
+    def close(self):
+        pass
+
+
+class HttpFetchBackend(FetchBackend):
+    """Получает выдачу из JSON API поиска без запуска браузера"""
+
+    name = "http"
+
+    def __init__(
+            self,
+            api_url: str = WB_SEARCH_API_URL,
+            max_connections: int = HTTP_MAX_CONNECTIONS,
+            timeout: float = HTTP_TIMEOUT
+    ):
+        self.logger = logger
+        self.api_url = api_url
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections
+        )
+        # Один клиент на бэкенд: keep-alive соединения переиспользуются между страницами
+        self.client = httpx.Client(
+            limits=self.limits,
+            timeout=timeout,
+            headers=self._headers()
+        )
+
+    def request_url(self, search_url: str, page: int) -> str:
+        return str(httpx.URL(self.api_url, params=self._params(search_url, page)))
+
+    def fetch_raw(self, search_url: str, page: int) -> bytes:
+        response = self.client.get(self.api_url, params=self._params(search_url, page))
+        response.raise_for_status()
+        return response.content
+
+    def parse_raw(self, content: bytes) -> List[ProductCreate]:
+        return self._parse_response(json.loads(content))
+
+    def close(self):
+        self.client.close()
+
+    @staticmethod
+    def _headers() -> Dict[str, str]:
+        return {
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                          "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        }
+
+    @staticmethod
+    def _params(search_url: str, page: int) -> Dict[str, str]:
+        query = parse_qs(urlparse(search_url).query).get("search", [""])[0]
+        return {
+            "appType": "1",
+            "curr": "rub",
+            "dest": WB_DEST,
+            "query": query,
+            "page": str(page),
+            "resultset": "catalog",
+            "sort": "popular",
+            "spp": "30",
+        }
+
+    def _parse_response(self, payload: Dict) -> List[ProductCreate]:
+        products = (payload.get("data") or {}).get("products") or []
+        parsed_products = []
+        for item in products:
+            try:
+                parsed_products.append(self._parse_item(item))
+            except Exception as e:
+                self.logger.warning(f"Ошибка при разборе товара {item.get('id')}: {e}")
+        return parsed_products
+
+    @staticmethod
+    def _parse_item(item: Dict) -> ProductCreate:
+        # Цены в API указаны в копейках, в новых версиях - внутри sizes[].price
+        price_info = {}
+        for size in item.get("sizes") or []:
+            if size.get("price"):
+                price_info = size["price"]
+                break
+
+        current_price = item.get("salePriceU") or price_info.get("product") or price_info.get("total")
+        old_price = item.get("priceU") or price_info.get("basic")
+        current_price = current_price / 100 if current_price else 0.0
+        old_price = old_price / 100 if old_price else None
+
+        discount = item.get("sale")
+        if not discount and old_price and current_price and old_price > current_price:
+            discount = round((1 - current_price / old_price) * 100)
+
+        quantity = item.get("totalQuantity")
+
+        return ProductCreate(
+            article=item.get("id"),
+            current_price=current_price,
+            old_price=old_price,
+            discount=discount or None,
+            brand=item.get("brand") or None,
+            name=item.get("name") or "Название не найдено",
+            rating=item.get("reviewRating") or item.get("rating") or None,
+            reviews_count=item.get("feedbacks"),
+            stock=str(quantity) if quantity is not None else "Остатки не указаны",
+            currency="RUB"
+        )
+
+
+def create_fetch_backend(name: str = PARSER_BACKEND) -> Optional[FetchBackend]:
+    """Создает бэкенд по имени; для selenium возвращает None - парсер работает через браузер"""
+    if name == "selenium":
+        return None
+    if name == "http":
+        return HttpFetchBackend()
+    raise ValueError(f"Неизвестный бэкенд парсера: {name}")
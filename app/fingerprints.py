@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Tuple
+from app.schemas import ProductCreate
+
+# После скольких подряд неизменившихся страниц инкрементальный обход останавливается (0 - не останавливаться)
+INCREMENTAL_STOP_AFTER = int(os.getenv("INCREMENTAL_STOP_AFTER", "2"))
+
+
+def product_fingerprint(product: ProductCreate) -> str:
+    """Хэш содержимого карточки: всех извлеченных полей товара"""
+    payload = json.dumps(product.model_dump(), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+def page_fingerprint(card_hashes: List[str]) -> str:
+    """Хэш страницы выдачи: хэши карточек в порядке показа"""
+    return hashlib.md5("\n".join(card_hashes).encode("ascii")).hexdigest()
+
+
+class CrawlFingerprints:
+    """Отпечатки страниц и карточек одного поискового запроса.
+    known - сохраненные с прошлого обхода, current - посчитанные в текущем.
+    В инкрементальном режиме карточки с известным хэшем отбрасываются сразу после разбора,
+    а обход прекращается после stop_after неизменившихся страниц подряд"""
+
+    def __init__(
+            self,
+            known: Dict[int, Tuple[str, List[str]]] = None,
+            incremental: bool = False,
+            stop_after: int = INCREMENTAL_STOP_AFTER
+    ):
+        known = known if incremental and known else {}
+        self.incremental = incremental
+        self.stop_after = stop_after
+        self.known_pages = {page: fingerprint for page, (fingerprint, _) in known.items()}
+        self.known_cards = {card for _, cards in known.values() for card in cards}
+        self.current: Dict[int, Tuple[str, List[str]]] = {}
+        self.unchanged_run = 0
+        self.unchanged_cards = 0
+
+    def filter_page(self, page: int, products: List[ProductCreate]) -> List[ProductCreate]:
+        """Запоминает отпечатки страницы и возвращает только новые или изменившиеся товары"""
+        card_hashes = [product_fingerprint(product) for product in products]
+        fingerprint = page_fingerprint(card_hashes)
+        self.current[page] = (fingerprint, card_hashes)
+
+        if self.known_pages.get(page) == fingerprint:
+            self.unchanged_run += 1
+        else:
+            self.unchanged_run = 0
+
+        changed = [
+            product for product, card_hash in zip(products, card_hashes)
+            if card_hash not in self.known_cards
+        ]
+        self.unchanged_cards += len(products) - len(changed)
+        return changed
+
+    def page_unchanged(self, page: int) -> bool:
+        current = self.current.get(page)
+        return current is not None and self.known_pages.get(page) == current[0]
+
+    @property
+    def should_stop(self) -> bool:
+        return self.incremental and self.stop_after > 0 and self.unchanged_run >= self.stop_after
@@ -0,0 +1,179 @@
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Set
+from app import crud
+from app.checkpoints import CrawlCheckpoint
+from app.database import SessionLocal
+from app.logger import logger, setup_logger
+from app.models import ParseJob, JOB_QUEUED, JOB_DONE, JOB_FAILED, JOB_CANCELLED
+
+# Сколько задач парсинга может выполняться одновременно во всех процессах
+PARSE_MAX_CONCURRENT_JOBS = int(os.getenv("PARSE_MAX_CONCURRENT_JOBS", "4"))
+# Сколько задач берет на себя один процесс
+PARSE_JOB_THREADS = int(os.getenv("PARSE_JOB_THREADS", str(PARSE_MAX_CONCURRENT_JOBS)))
+PARSE_JOB_POLL_INTERVAL = float(os.getenv("PARSE_JOB_POLL_INTERVAL", "2"))
+# Через сколько секунд без heartbeat задача считается брошенной и возвращается в очередь
+PARSE_JOB_STALE_AFTER = float(os.getenv("PARSE_JOB_STALE_AFTER", "300"))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobInterrupted(Exception):
+    """Процесс останавливается - задачу нужно вернуть в очередь"""
+
+
+class JobRunner:
+    """Забирает задачи из таблицы parse_jobs и выполняет их в пуле потоков"""
+
+    def __init__(
+            self,
+            threads: int = PARSE_JOB_THREADS,
+            max_running: int = PARSE_MAX_CONCURRENT_JOBS,
+            poll_interval: float = PARSE_JOB_POLL_INTERVAL,
+            stale_after: float = PARSE_JOB_STALE_AFTER
+    ):
+        self.logger = logger
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.threads = threads
+        self.max_running = max_running
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._executor = None
+        self._thread = None
+        self._active: Set[int] = set()
+        self._active_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        setup_logger()
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="parse-job")
+        self._thread = threading.Thread(target=self._loop, name="parse-job-poller", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Воркер задач парсинга {self.worker_id} запущен, потоков: {self.threads}")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join()
+        # Запущенные задачи сами вернутся в очередь после текущей страницы
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._thread = None
+
+    def notify(self):
+        """Будит опрос очереди, чтобы новая задача стартовала без ожидания интервала"""
+        self._wakeup.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self._poll()
+            except Exception as e:
+                self.logger.error(f"Ошибка при опросе очереди задач: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _poll(self):
+        db = SessionLocal()
+        try:
+            with self._active_lock:
+                active = set(self._active)
+            crud.touch_jobs(db, active)
+
+            requeued = crud.requeue_stale_jobs(db, self.stale_after)
+            if requeued:
+                self.logger.warning(f"Возвращено в очередь зависших задач: {requeued}")
+
+            while len(active) < self.threads and not self._stop.is_set():
+                job = crud.claim_next_job(db, self.worker_id, self.max_running)
+                if job is None:
+                    break
+                active.add(job.id)
+                with self._active_lock:
+                    self._active.add(job.id)
+                self._executor.submit(self._run, job.id)
+        finally:
+            db.close()
+
+    def _run(self, job_id: int):
+        # Selenium и весь стек парсера загружаются только в процессе, который выполняет задачи
+        from app.parser_service import ParserService
+
+        db = SessionLocal()
+        try:
+            job = db.get(ParseJob, job_id)
+            self.logger.info(f"Задача #{job_id}: парсинг '{job.query}', страниц: {job.pages}")
+            total_pages = job.pages * len(job.queries) if job.queries else job.pages
+            # После перезапуска воркера задача продолжается с первой незаписанной страницы
+            checkpoint = CrawlCheckpoint(job.checkpoint)
+            if checkpoint.resumed:
+                self.logger.info(f"Задача #{job_id}: продолжаем с сохраненной точки")
+
+            def on_progress(page: int, results: Dict):
+                cancel_requested = crud.update_job(
+                    db, job_id,
+                    pages_done=results['pages'],
+                    products_parsed=results['parsed'],
+                    products_saved=results['saved'],
+                    products_updated=results['updated'],
+                    progress=f"Обработано страниц: {results['pages']} из {total_pages}",
+                    checkpoint=checkpoint.to_dict()
+                )
+                if cancel_requested:
+                    raise JobCancelled()
+                if self._stop.is_set():
+                    raise JobInterrupted()
+
+            service = ParserService(db)
+            if job.queries:
+                results = service.parse_and_save_batch(
+                    [(item["query"], item.get("priority", 0)) for item in job.queries],
+                    job.pages, workers=job.workers, progress_callback=on_progress, checkpoint=checkpoint
+                )
+            else:
+                results = service.parse_and_save_search(
+                    job.query, job.pages, workers=job.workers, incremental=job.incremental,
+                    progress_callback=on_progress, checkpoint=checkpoint
+                )
+            failed = len(results['failed_pages'])
+            crud.update_job(
+                db, job_id,
+                status=JOB_DONE,
+                progress=f"Завершено, пропущено страниц с ошибками: {failed}" if failed else "Завершено",
+                checkpoint=checkpoint.to_dict(),
+                products_parsed=results['parsed'],
+                products_saved=results['saved'],
+                products_updated=results['updated'],
+                finished_at=crud.utc_now()
+            )
+        except JobCancelled:
+            crud.update_job(db, job_id, status=JOB_CANCELLED, progress="Отменено", finished_at=crud.utc_now())
+        except JobInterrupted:
+            crud.update_job(db, job_id, status=JOB_QUEUED, worker_id=None, progress="Воркер остановлен, задача в очереди")
+        except Exception as e:
+            self.logger.error(f"Задача #{job_id} завершилась ошибкой: {e}")
+            db.rollback()
+            crud.update_job(
+                db, job_id,
+                status=JOB_FAILED,
+                progress=f"Ошибка: {str(e)}",
+                error=str(e),
+                finished_at=crud.utc_now()
+            )
+        finally:
+            db.close()
+            with self._active_lock:
+                self._active.discard(job_id)
+            self._wakeup.set()
+
+
+job_runner = JobRunner()
@@ -1,36 +1,125 @@
+import atexit
+import json
 import logging
-import sys
-from datetime import datetime
 import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+LOGGER_NAME = "wildberries_parser"
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# text - как раньше, json - одна JSON-запись на строку
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_CONSOLE = os.getenv("LOG_CONSOLE", "1") == "1"
+# Доля товаров, подробности которых пишутся на уровне DEBUG (1 - все, 0 - ни одного)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Атрибуты, которые есть у любой записи; все остальное пришло через extra и попадает в JSON
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+
 
+class JsonFormatter(logging.Formatter):
+    """Запись в одну строку JSON; поля из extra добавляются как есть"""
 
-def setup_logger():
-    """Настройка логгера с записью в файл и выводом в консоль"""
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
 
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
 
-    log_filename = f"logs/parser_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+class _LazyQueueHandler(QueueHandler):
+    """Кладет запись в очередь как есть: сообщение форматируется в потоке QueueListener,
+    а не в потоке парсера"""
 
-    logger = logging.getLogger('wildberries_parser')
-    logger.setLevel(logging.INFO)
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
 
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
 
-    file_handler = logging.FileHandler(log_filename, encoding='utf-8')
-    file_handler.setLevel(logging.INFO)
-    file_handler.setFormatter(formatter)
+def setup_logger(
+        level: str = LOG_LEVEL,
+        fmt: str = LOG_FORMAT,
+        log_dir: Optional[str] = LOG_DIR,
+        console: bool = LOG_CONSOLE,
+        force: bool = False
+) -> logging.Logger:
+    """Настройка логгера: запись в очередь, а в файл с ротацией и в консоль - из отдельного потока.
+    Повторный вызов возвращает уже настроенный логгер; force=True настраивает заново"""
+    global _listener
 
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
+    logger = logging.getLogger(LOGGER_NAME)
+    if _listener is not None and not force:
+        return logger
+    shutdown_logger()
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    formatter = JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+    handlers = []
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+        extension = "jsonl" if fmt == "json" else "log"
+        file_handler = RotatingFileHandler(
+            os.path.join(log_dir, f"parser.{extension}"),
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT,
+            encoding="utf-8"
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
 
+    records = queue.SimpleQueue()
+    logger.handlers.clear()
+    logger.addHandler(_LazyQueueHandler(records))
+    logger.setLevel(level)
+    logger.propagate = False
+
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
     return logger
 
-logger = setup_logger()
\ No newline at end of file
+
+def shutdown_logger():
+    """Дописывает записи из очереди и закрывает файлы"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def sampled(rate: Optional[float] = None) -> bool:
+    """Попадает ли очередная запись в выборку для подробного лога"""
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+atexit.register(shutdown_logger)
+
+# Обработчики и файл лога создаются не при импорте, а в setup_logger() - его вызывают парсер и воркер
+# задач. Процессы, которые только отдают API, логгер не настраивают и файлов не создают
+logger = logging.getLogger(LOGGER_NAME)
@@ -1,14 +1,39 @@
-from fastapi import FastAPI, Depends, Query, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import FastAPI, Depends, Query, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Tuple
+from pydantic import TypeAdapter
+from datetime import datetime
+import os
 import app.crud as crud
+import app.crud_async as crud_async
 import app.schemas as schemas
-from app.database import get_db
-from app.parser_service import ParserService
+from app.bulk_import import IMPORT_CHUNK_SIZE, import_products, read_records
+from app.database import AsyncSessionLocal, get_async_db
+from app.export import EXPORT_CHUNK_SIZE, EXPORT_MEDIA_TYPES, ExportFormatUnavailable, check_format, export_filename, serialize
+from app.pagination import SORT_PATTERN, InvalidCursor, encode_cursor, resolve_sort
+from app.jobs import job_runner
+from app.metrics import REGISTRY, PARSE_JOBS
+from app.query_cache import query_cache
 
 app = FastAPI(title="Wildberries Parser API", version="1.0.0")
 
-parsing_status = {"is_parsing": False, "progress": "Готов"}
+PRODUCT_LIST = TypeAdapter(List[schemas.Product])
+
+# Процессы только для чтения API можно запускать с PARSE_WORKER_ENABLED=0
+PARSE_WORKER_ENABLED = os.getenv("PARSE_WORKER_ENABLED", "1") == "1"
+
+
+@app.on_event("startup")
+def start_job_runner():
+    if PARSE_WORKER_ENABLED:
+        job_runner.start()
+
+
+@app.on_event("shutdown")
+def stop_job_runner():
+    job_runner.stop()
 
 
 @app.get("/")
@@ -17,85 +42,244 @@ def read_root():
 
 
 @app.get("/products/", response_model=List[schemas.Product])
-def read_products(
+async def read_products(
+        request: Request,
         skip: int = 0,
-        limit: int = 100,
+        limit: int = Query(100, ge=1),
         search: Optional[str] = Query(None, description="Поиск по названию или бренду"),
-        db: Session = Depends(get_db)
+        sort: Optional[str] = Query(
+            None, pattern=SORT_PATTERN,
+            description="Курсорная пагинация с сортировкой: id, price, discount, rating, '-' - по убыванию"
+        ),
+        cursor: Optional[str] = Query(None, description="Токен следующей страницы из заголовка X-Next-Cursor"),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Получить все товары с возможностью поиска"""
-    return crud.get_products(db, skip=skip, limit=limit, search=search)
+    if search is not None:
+        # Поиск регистронезависимый, так одинаковые по смыслу запросы попадают в один ключ кэша
+        search = search.lower() or None
+    if sort or cursor:
+        skip = 0
+
+    version = await crud_async.get_table_version(db) if query_cache.enabled else None
+    if version is None:
+        body, next_cursor = await _products_page(db, skip, limit, search, sort, cursor)
+        return _json_page(body, next_cursor)
+
+    key = query_cache.key(version, skip=skip, limit=limit, search=search, sort=sort, cursor=cursor)
+    etag = query_cache.etag(key)
+    if query_cache.etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    cached = await query_cache.get(key)
+    if cached is None:
+        body, next_cursor = await _products_page(db, skip, limit, search, sort, cursor)
+        await query_cache.set(key, body, next_cursor)
+    else:
+        body, next_cursor = cached
+    response = _json_page(body, next_cursor)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Cache"] = "HIT" if cached else "MISS"
+    return response
+
+
+async def _products_page(db: AsyncSession, skip: int, limit: int, search: Optional[str],
+                         sort: Optional[str], cursor: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """Страница товаров, сразу сериализованная в JSON, и курсор следующей страницы"""
+    try:
+        products = await crud_async.get_products(
+            db, skip=skip, limit=limit, search=search, sort=sort, cursor=cursor
+        )
+        next_cursor = None
+        if (sort or cursor) and len(products) == limit:
+            next_cursor = encode_cursor(resolve_sort(sort, cursor), products[-1])
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return PRODUCT_LIST.dump_json(PRODUCT_LIST.validate_python(products, from_attributes=True)), next_cursor
+
+
+def _json_page(body: bytes, next_cursor: Optional[str]) -> Response:
+    response = Response(content=body, media_type="application/json")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+@app.get("/products/export")
+async def export_products(
+        format: str = Query("ndjson", pattern="^(csv|ndjson|parquet|arrow)$", description="csv, ndjson, parquet или arrow"),
+        search: Optional[str] = Query(None, description="Поиск по названию или бренду"),
+        brand: Optional[str] = Query(None, description="Точное название бренда"),
+        min_price: Optional[float] = Query(None, ge=0),
+        max_price: Optional[float] = Query(None, ge=0),
+        chunk_size: int = Query(EXPORT_CHUNK_SIZE, ge=100, le=100_000, description="Строк в одной пачке")
+):
+    """Выгрузить товары целиком потоком, без постраничных запросов"""
+    try:
+        check_format(format)
+    except ExportFormatUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    async def chunks():
+        # Сессия живет столько же, сколько ответ, а не запрос
+        async with AsyncSessionLocal() as db:
+            async for rows in crud_async.stream_products(
+                db, chunk_size, search=search, brand=brand, min_price=min_price, max_price=max_price
+            ):
+                yield rows
+
+    return StreamingResponse(
+        serialize(format, chunks()),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format)}"'}
+    )
 
 
 @app.post("/products/", response_model=schemas.Product)
-def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
+async def create_product(product: schemas.ProductCreate, db: AsyncSession = Depends(get_async_db)):
     """Добавить товар вручную"""
-    return crud.create_product(db=db, product=product)
+    try:
+        return await crud_async.create_product(db=db, product=product)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Такой товар уже есть")
+
+
+@app.post("/products/import", response_model=schemas.ImportSummary)
+async def import_products_file(
+        request: Request,
+        format: str = Query("ndjson", pattern="^(csv|ndjson)$", description="ndjson или csv с заголовком"),
+        chunk_size: int = Query(IMPORT_CHUNK_SIZE, ge=100, le=100_000, description="Строк в одной пачке"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """Массовая загрузка товаров из тела запроса: новые добавляются, существующие обновляются
+    по естественному ключу, строки с ошибками пропускаются и перечисляются в ответе"""
+    return await import_products(db, read_records(request.stream(), format), chunk_size)
+
+
+@app.get("/products/duplicates", response_model=List[schemas.DuplicateCluster])
+async def read_duplicate_clusters(
+        min_size: int = Query(2, ge=2, description="Минимальный размер кластера"),
+        skip: int = Query(0, ge=0),
+        limit: int = Query(20, ge=1, le=100),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """Кластеры почти-дубликатов (переформулированные карточки одного товара), от самых больших"""
+    clusters = await crud_async.get_duplicate_clusters(db, min_size, skip, limit)
+    return [
+        {"cluster_id": cluster_id, "size": len(products), "products": products}
+        for cluster_id, products in clusters
+    ]
+
+
+@app.get("/products/{product_id}/duplicates", response_model=List[schemas.NearDuplicate])
+async def read_near_duplicates(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Почти-дубликаты товара: кандидаты из его корзин LSH со сходством от NEAR_DUP_THRESHOLD"""
+    if await crud_async.get_product(db, product_id) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    duplicates = await crud_async.get_near_duplicates(db, product_id)
+    return [{"product": product, "similarity": round(score, 3)} for product, score in duplicates]
+
+
+@app.get("/products/{product_id}/history", response_model=schemas.PriceHistory)
+async def read_price_history(
+        product_id: int,
+        since: Optional[datetime] = Query(None, description="Начало периода"),
+        until: Optional[datetime] = Query(None, description="Конец периода"),
+        points: int = Query(
+            crud_async.PRICE_HISTORY_MAX_POINTS, ge=2, le=5000,
+            description="Сколько точек вернуть максимум; длинные периоды прореживаются на сервере"
+        ),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """История изменений цены, скидки и наличия товара"""
+    if await crud_async.get_product(db, product_id) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    history, downsampled = await crud_async.get_price_history(db, product_id, since, until, points)
+    return {"product_id": product_id, "downsampled": downsampled, "points": history}
 
 
-@app.post("/parse/")
-def parse_products(
+@app.post("/parse/", status_code=202, response_model=schemas.ParseJob)
+async def parse_products(
         query: str,
         pages: int = Query(1, ge=1, le=100, description="Количество страниц для парсинга"),
-        background_tasks: BackgroundTasks = None,
-        db: Session = Depends(get_db)
+        workers: Optional[int] = Query(None, ge=1, le=16, description="Сколько страниц парсить параллельно"),
+        incremental: bool = Query(
+            False, description="Пропускать товары и страницы, которые не изменились с прошлого парсинга"
+        ),
+        db: AsyncSession = Depends(get_async_db)
 ):
-    """Запустить парсинг товаров с Wildberries"""
-    global parsing_status
-
-    if parsing_status["is_parsing"]:
-        raise HTTPException(status_code=400, detail="Парсинг уже выполняется")
-
-    parsing_status["is_parsing"] = True
-    parsing_status["progress"] = "Начинаем парсинг..."
-
-    def run_parsing():
-        try:
-            service = ParserService(db)
-            results = service.parse_and_save_search(query, pages)
-            parsing_status.update({
-                "is_parsing": False,
-                "progress": "Завершено",
-                "last_results": results
-            })
-        except Exception as e:
-            parsing_status.update({
-                "is_parsing": False,
-                "progress": f"Ошибка: {str(e)}"
-            })
-
-    if background_tasks:
-        background_tasks.add_task(run_parsing)
-        return {
-            "message": f"Парсинг запущен в фоне для запроса: '{query}'",
-            "pages": pages,
-            "status": "processing"
-        }
-    else:
-        service = ParserService(db)
-        results = service.parse_and_save_search(query, pages)
-        parsing_status["is_parsing"] = False
+    """Поставить парсинг товаров с Wildberries в очередь"""
+    job = await crud_async.create_job(db, query=query, pages=pages, workers=workers, incremental=incremental)
+    job_runner.notify()
+    return job
 
-        return {
-            "message": f"Парсинг завершен для запроса: '{query}'",
-            "results": results
-        }
+
+@app.post("/parse/batch", status_code=202, response_model=schemas.ParseJob)
+async def parse_products_batch(request: schemas.BatchParseRequest, db: AsyncSession = Depends(get_async_db)):
+    """Поставить в очередь парсинг нескольких запросов одной задачей с общим пулом воркеров"""
+    queries = crud.unique_queries((item.query, item.priority) for item in request.queries)
+    job = await crud_async.create_job(
+        db,
+        query=crud.batch_label(queries),
+        pages=request.pages,
+        workers=request.workers,
+        queries=[{"query": query, "priority": priority} for query, priority in queries]
+    )
+    job_runner.notify()
+    return job
 
 
 @app.get("/parse/status")
-def get_parsing_status():
-    """Получить статус парсинга"""
-    return parsing_status
+async def get_parsing_status(db: AsyncSession = Depends(get_async_db)):
+    """Получить статус очереди парсинга и последние задачи"""
+    jobs = await crud_async.get_jobs(db)
+    return {
+        "jobs_by_status": await crud_async.count_jobs_by_status(db),
+        "last_jobs": [schemas.ParseJob.model_validate(job) for job in jobs]
+    }
+
+
+@app.get("/parse/{job_id}", response_model=schemas.ParseJob)
+async def get_parse_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Получить статус и прогресс задачи парсинга"""
+    job = await crud_async.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/parse/{job_id}/cancel", response_model=schemas.ParseJob)
+async def cancel_parse_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Отменить задачу парсинга"""
+    job = await crud_async.cancel_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 
 @app.delete("/products/{product_id}")
-def delete_product(product_id: int, db: Session = Depends(get_db)):
+async def delete_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
     """Удалить товар"""
-    db_product = crud.delete_product(db, product_id=product_id)
+    db_product = await crud_async.delete_product(db, product_id=product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     return {"message": "Product deleted successfully"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(db: AsyncSession = Depends(get_async_db)):
+    """Метрики процесса в текстовом формате Prometheus"""
+    # Очередь задач общая для всех процессов, поэтому ее состояние берется из БД
+    for status, count in (await crud_async.count_jobs_by_status(db)).items():
+        PARSE_JOBS.labels(status=status).set(count)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,262 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Файл, в который пишутся интервалы этапов (JSON на строку); пусто - не писать
+METRICS_SPANS_FILE = os.getenv("METRICS_SPANS_FILE", "")
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Registry:
+    """Набор метрик процесса, отдается в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def labels(self, **labels) -> "_Child":
+        return _Child(self, tuple(str(labels[name]) for name in self.labelnames))
+
+    def _labels_text(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._labels_text(key)} {_number(value)}" for key, value in items]
+
+
+class _Child:
+    """Метрика с зафиксированными значениями меток"""
+
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric: _Metric, key: Tuple[str, ...]):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1):
+        self._metric.inc(amount, _key=self._key)
+
+    def dec(self, amount: float = 1):
+        self._metric.dec(amount, _key=self._key)
+
+    def set(self, value: float):
+        self._metric.set(value, _key=self._key)
+
+    def observe(self, value: float):
+        self._metric.observe(value, _key=self._key)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, _key: Tuple[str, ...] = ()):
+        with self._lock:
+            self._values[_key] = self._values.get(_key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, _key: Tuple[str, ...] = ()):
+        with self._lock:
+            self._values[_key] = value
+
+    def inc(self, amount: float = 1, _key: Tuple[str, ...] = ()):
+        with self._lock:
+            self._values[_key] = self._values.get(_key, 0) + amount
+
+    def dec(self, amount: float = 1, _key: Tuple[str, ...] = ()):
+        self.inc(-amount, _key=_key)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, _key: Tuple[str, ...] = ()):
+        with self._lock:
+            state = self._values.get(_key)
+            if state is None:
+                # Счетчики по корзинам (не накопительные), сумма и количество
+                state = self._values[_key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            index = 0
+            while index < len(self.buckets) and value > self.buckets[index]:
+                index += 1
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == math.inf else _number(bound)
+                lines.append(f"{self.name}_bucket{self._labels_text(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels_text(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._labels_text(key)} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# Метрики парсера
+PAGES = Counter("wb_pages_total", "Загруженные страницы выдачи", ["source", "status"])
+CARDS = Counter("wb_cards_total", "Найденные карточки товаров")
+PRODUCTS = Counter("wb_products_parsed_total", "Успешно разобранные товары")
+CARD_ERRORS = Counter("wb_card_errors_total", "Карточки, которые не удалось разобрать")
+FIELD_MISSING = Counter("wb_field_missing_total", "Разобранные товары без значения поля", ["field"])
+DRIVER_STARTS = Counter("wb_driver_starts_total", "Запуски браузера")
+STAGE_SECONDS = Histogram("wb_stage_seconds", "Длительность этапов парсинга", ["stage"])
+
+# Метрики записи в БД
+DB_BATCH_SECONDS = Histogram("wb_db_batch_seconds", "Длительность записи одной пачки товаров")
+DB_ROWS = Counter("wb_db_rows_total", "Записанные товары", ["result"])
+
+PIPELINE_QUEUE_DEPTH = Gauge("wb_pipeline_queue_depth", "Страницы, ожидающие записи в БД")
+PARSE_JOBS = Gauge("wb_parse_jobs", "Задачи парсинга по статусам", ["status"])
+
+
+class SpanExporter:
+    """Пишет завершенные интервалы этапов в файл, по JSON-объекту на строку"""
+
+    def __init__(self, path: str = METRICS_SPANS_FILE):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+span_exporter = SpanExporter()
+atexit.register(span_exporter.close)
+
+_local = threading.local()
+
+
+@contextmanager
+def span(stage: str, **attributes):
+    """Замеряет этап: длительность попадает в wb_stage_seconds, а при заданном
+    METRICS_SPANS_FILE - в файл вместе с путем вложенных этапов текущего потока"""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(stage)
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        path = ";".join(stack)
+        stack.pop()
+        STAGE_SECONDS.labels(stage=stage).observe(duration)
+        if span_exporter.enabled:
+            record = {
+                "stage": stage,
+                "path": path,
+                "start": round(started_at, 6),
+                "duration": round(duration, 6),
+                "thread": threading.current_thread().name,
+            }
+            if attributes:
+                record["attributes"] = attributes
+            span_exporter.write(record)
+
+
+def fold_spans(records: Iterable[dict]) -> Dict[str, int]:
+    """Собственное время (без вложенных этапов) каждого пути в микросекундах -
+    формат свернутых стеков для flamegraph.pl и speedscope"""
+    totals: Dict[str, float] = {}
+    for record in records:
+        totals[record["path"]] = totals.get(record["path"], 0.0) + record["duration"]
+
+    own = dict(totals)
+    for path, total in totals.items():
+        parent, _, _ = path.rpartition(";")
+        if parent in own:
+            own[parent] -= total
+    return {path: max(0, int(seconds * 1_000_000)) for path, seconds in own.items()}
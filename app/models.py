@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime
+from sqlalchemy import DDL, event
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Float, DateTime, Boolean, Index, ForeignKey, JSON, LargeBinary, UniqueConstraint
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -6,6 +7,9 @@ class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
+    article = Column(BigInteger, index=True)  # артикул Wildberries (nm_id)
+    # Естественный ключ для upsert: "wb:<артикул>" или "h:<md5 названия и бренда>"
+    natural_key = Column(String(64), nullable=False, unique=True, index=True)
     current_price = Column(Float)
     old_price = Column(Float)
     discount = Column(Integer)
@@ -16,4 +20,134 @@ class Product(Base):
     stock = Column(String(100))
     currency = Column(String(10), default="RUB")  # RUB, USD, EUR, etc.
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # Триграммные индексы для поиска ILIKE '%...%' по названию и бренду (PostgreSQL, pg_trgm)
+        Index(
+            "ix_products_name_trgm", "name",
+            postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_products_brand_trgm", "brand",
+            postgresql_using="gin", postgresql_ops={"brand": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        # Индексы под курсорную пагинацию с сортировкой (значение, id)
+        Index("ix_products_price_id", "current_price", "id"),
+        Index("ix_products_discount_id", "discount", "id"),
+        Index("ix_products_rating_id", "rating", "id"),
+    )
+
+
+# Поля товара, изменения которых попадают в историю цен
+PRICE_HISTORY_FIELDS = ("current_price", "discount", "stock")
+
+
+class PriceSnapshot(Base):
+    """История цены товара: строка пишется, только когда цена, скидка или наличие изменились"""
+    __tablename__ = "price_snapshots"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    captured_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    current_price = Column(Float)
+    discount = Column(Integer)
+    stock = Column(String(100))
+
+    __table_args__ = (
+        # История одного товара за период
+        Index("ix_price_snapshots_product_captured", "product_id", "captured_at"),
+        # Строки добавляются в порядке времени, поэтому BRIN по времени занимает считанные страницы
+        Index(
+            "ix_price_snapshots_captured_brin", "captured_at", postgresql_using="brin"
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+class PageFingerprint(Base):
+    """Отпечаток страницы выдачи с последнего обхода: хэш страницы и хэши ее карточек"""
+    __tablename__ = "page_fingerprints"
+
+    id = Column(Integer, primary_key=True)
+    query = Column(String(500), nullable=False)
+    page = Column(Integer, nullable=False)
+    fingerprint = Column(String(32), nullable=False)
+    card_hashes = Column(JSON, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("query", "page", name="uq_page_fingerprints_query_page"),
+    )
+
+
+class ProductMinHash(Base):
+    """MinHash-сигнатура названия и бренда товара и кластер почти-дубликатов, в который он входит"""
+    __tablename__ = "product_minhash"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    # Хэш нормализованного текста: пока он тот же, сигнатура не пересчитывается
+    text_hash = Column(String(32), nullable=False)
+    signature = Column(LargeBinary, nullable=False)
+    # Метка кластера - id товара, с которого он начался; товар без дублей - кластер из одного себя
+    cluster_id = Column(Integer, nullable=False, index=True)
+
+
+class ProductLshBucket(Base):
+    """Корзины LSH: по одной на полосу сигнатуры товара. Кандидаты в дубли нового товара -
+    товары из его корзин, поэтому поиск не зависит от размера таблицы"""
+    __tablename__ = "product_lsh_buckets"
+
+    bucket = Column(BigInteger, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+
+# Версия данных таблицы: растет при каждой записи, по ней сбрасывается кэш ответов API
+PRODUCTS_VERSION = "products"
+
+
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+event.listen(
+    TableVersion.__table__, "after_create",
+    DDL(f"INSERT INTO table_versions (name, version) VALUES ('{PRODUCTS_VERSION}', 0)")
+)
+
+
+# Статусы задач парсинга
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+
+class ParseJob(Base):
+    __tablename__ = "parse_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    query = Column(String(500), nullable=False)
+    # Пакетная задача: [{"query": ..., "priority": ...}, ...], в query - краткое описание пакета
+    queries = Column(JSON)
+    pages = Column(Integer, nullable=False, default=1)
+    workers = Column(Integer)
+    incremental = Column(Boolean, nullable=False, default=False)
+    status = Column(String(20), nullable=False, default=JOB_QUEUED, index=True)
+    progress = Column(String(255))
+    pages_done = Column(Integer, nullable=False, default=0)
+    products_parsed = Column(Integer, nullable=False, default=0)
+    products_saved = Column(Integer, nullable=False, default=0)
+    products_updated = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    # Точка продолжения обхода: записанные страницы, страницы с ошибками, промежуточные итоги
+    checkpoint = Column(JSON)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    worker_id = Column(String(100))  # хост:pid процесса, который выполняет задачу
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))
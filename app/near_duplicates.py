@@ -0,0 +1,141 @@
+import hashlib
+import os
+import random
+import re
+import struct
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Сигнатура делится на NEAR_DUP_BANDS полос по NEAR_DUP_ROWS значений (LSH): кандидатами в дубли
+# становятся товары, у которых совпала хотя бы одна полоса. При 25x5 кандидатом почти всегда
+# становится товар со сходством 0.7 и выше, в половине случаев - 0.5 и редко - 0.3 и ниже
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "25"))
+NEAR_DUP_ROWS = int(os.getenv("NEAR_DUP_ROWS", "5"))
+# С какой оценки сходства Жаккара (доля совпавших значений сигнатуры) кандидат считается дублем
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.5"))
+# 0 - не обновлять индекс при записи товаров (догнать потом: python -m app.cli dedup)
+NEAR_DUP_INDEX = os.getenv("NEAR_DUP_INDEX", "1") == "1"
+
+SIGNATURE_SIZE = NEAR_DUP_BANDS * NEAR_DUP_ROWS
+SHINGLE_SIZE = 3
+
+# Простое Мерсенна 2^31 - 1: произведения помещаются в 64 бита, значения сигнатуры - в 4 байта
+_PRIME = (1 << 31) - 1
+# Коэффициенты хэш-функций фиксированы: сигнатуры в БД должны совпадать между процессами и запусками
+_random = random.Random(0x5EED)
+_COEFFICIENTS = [(_random.randrange(1, _PRIME), _random.randrange(_PRIME)) for _ in range(SIGNATURE_SIZE)]
+if numpy is not None:
+    # Столбцы коэффициентов для расчета всех хэш-функций сразу; a * x + b < 2^63 помещается в uint64
+    _A = numpy.array([[a] for a, _ in _COEFFICIENTS], dtype=numpy.uint64)
+    _B = numpy.array([[b] for _, b in _COEFFICIENTS], dtype=numpy.uint64)
+
+_HYPHEN = re.compile(r"(?<=\w)-(?=\w)")
+# Граница букв и цифр: "MX4" и "4г" - это "mx 4" и "4 г"
+_LETTER_DIGIT = re.compile(r"(?<=\d)(?=[^\W\d])|(?<=[^\W\d])(?=\d)")
+_WORD = re.compile(r"\w+")
+
+
+def normalize_text(name: Optional[str], brand: Optional[str]) -> str:
+    """Слова названия и бренда без учета регистра, порядка и повторов: "MX-4 термопаста Arctic"
+    и "Термопаста ARCTIC MX4" дают одно и то же"""
+    text = _HYPHEN.sub("", f"{name or ''} {brand or ''}".lower().replace("ё", "е"))
+    text = _LETTER_DIGIT.sub(" ", text)
+    return " ".join(sorted(set(_WORD.findall(text))))
+
+
+def text_hash(name: Optional[str], brand: Optional[str]) -> str:
+    """Хэш нормализованного текста и параметров сигнатуры: если он не изменился, сигнатуру
+    не нужно пересчитывать, а после смены NEAR_DUP_BANDS/NEAR_DUP_ROWS пересчитываются все"""
+    payload = f"{NEAR_DUP_BANDS}x{NEAR_DUP_ROWS}:{normalize_text(name, brand)}"
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+def shingles(text: str) -> Set[int]:
+    """Символьные триграммы каждого слова (с границами слова): переформулировки и другие
+    словоформы сохраняют большую часть триграмм"""
+    result = set()
+    for word in text.split():
+        padded = f" {word} "
+        for start in range(len(padded) - SHINGLE_SIZE + 1):
+            result.add(zlib.crc32(padded[start:start + SHINGLE_SIZE].encode("utf-8")))
+    return result
+
+
+def signature(name: Optional[str], brand: Optional[str]) -> Optional[Tuple[int, ...]]:
+    """MinHash-сигнатура: минимум каждой из SIGNATURE_SIZE хэш-функций по всем триграммам.
+    None - в названии и бренде нет ни одного слова"""
+    values = shingles(normalize_text(name, brand))
+    if not values:
+        return None
+    if numpy is not None:
+        # Та же сигнатура, что и без numpy, но матрицей хэш-функций на триграммы
+        shingle_row = numpy.fromiter((v % _PRIME for v in values), dtype=numpy.uint64, count=len(values))
+        return tuple(((_A * shingle_row + _B) % _PRIME).min(axis=1).tolist())
+    hashes = [[(a * value + b) % _PRIME for a, b in _COEFFICIENTS] for value in (v % _PRIME for v in values)]
+    return tuple(map(min, zip(*hashes)))
+
+
+def pack_signature(values: Tuple[int, ...]) -> bytes:
+    return struct.pack(f"<{len(values)}I", *values)
+
+
+def unpack_signature(data: bytes) -> Tuple[int, ...]:
+    return struct.unpack(f"<{len(data) // 4}I", data)
+
+
+def band_keys(values: Tuple[int, ...], text: str) -> List[int]:
+    """Корзины LSH: хэш каждой полосы вместе с ее номером и числами текста, как знаковое 64-битное
+    число для BIGINT. Товары с разными числами дублями не бывают (см. duplicate_score), поэтому
+    и в общие корзины не попадают: иначе все модели одного бренда и типа были бы кандидатами друг для друга"""
+    suffix = " ".join(sorted(numbers(text))).encode("utf-8")
+    keys = []
+    for band in range(NEAR_DUP_BANDS):
+        rows = values[band * NEAR_DUP_ROWS:(band + 1) * NEAR_DUP_ROWS]
+        digest = hashlib.blake2b(struct.pack(f"<H{len(rows)}I", band, *rows) + suffix, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Оценка сходства Жаккара множеств триграмм по доле совпавших значений сигнатур"""
+    if len(first) != len(second) or not first:
+        return 0.0
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+def numbers(text: str) -> Set[str]:
+    """Числа из нормализованного текста: модель, объем, количество в упаковке"""
+    return {word for word in text.split() if word.isdigit()}
+
+
+def duplicate_score(first: Tuple[int, ...], first_text: str, second: Tuple[int, ...], second_text: str) -> float:
+    """Сходство пары для решения о дубле. Тексты "MX-4 4 г" и "MX-6 4 г" отличаются одной триграммой
+    из многих, поэтому товары с разными наборами чисел дублями не считаются"""
+    if numbers(first_text) != numbers(second_text):
+        return 0.0
+    return similarity(first, second)
+
+
+def connected_groups(pairs: Iterable[Tuple[int, int]]) -> List[Set[int]]:
+    """Связные группы из пар дублей (система непересекающихся множеств)"""
+    parent: Dict[int, int] = {}
+
+    def find(item: int) -> int:
+        parent.setdefault(item, item)
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    for first, second in pairs:
+        parent[find(first)] = find(second)
+
+    groups: Dict[int, Set[int]] = {}
+    for item in list(parent):
+        groups.setdefault(find(item), set()).add(item)
+    return list(groups.values())
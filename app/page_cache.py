@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from typing import Optional
+from app.logger import logger
+
+# off - кэш выключен, on - читать и записывать, replay - только читать, без обращений к сайту
+PARSER_CACHE_MODE = os.getenv("PARSER_CACHE_MODE", "off")
+PARSER_CACHE_DIR = os.getenv("PARSER_CACHE_DIR", "cache/pages")
+# Сколько секунд страница считается свежей (0 - без ограничения); в режиме replay не учитывается
+PARSER_CACHE_TTL = float(os.getenv("PARSER_CACHE_TTL", "86400"))
+PARSER_CACHE_MAX_MB = float(os.getenv("PARSER_CACHE_MAX_MB", "500"))
+
+CACHE_MODES = ("off", "on", "replay")
+
+
+class PageCache:
+    """Сжатые страницы выдачи на диске, ключ - источник и URL страницы (с номером страницы).
+    Время записи хранится в заголовке gzip (для TTL), время последнего чтения - в mtime файла
+    (для вытеснения давно не читанных страниц при превышении размера)"""
+
+    def __init__(
+            self,
+            mode: str = PARSER_CACHE_MODE,
+            directory: str = PARSER_CACHE_DIR,
+            ttl: float = PARSER_CACHE_TTL,
+            max_bytes: int = int(PARSER_CACHE_MAX_MB * 1024 * 1024)
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Неизвестный режим кэша страниц: {mode}")
+        self.logger = logger
+        self.mode = mode
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == "replay"
+
+    def get(self, source: str, url: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        path = self._path(source, url)
+        try:
+            with gzip.open(path, "rb") as f:
+                content = f.read()
+                created = f.mtime
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError) as e:
+            self.logger.warning(f"Поврежденная запись кэша {path}: {e}")
+            self._discard(path)
+            return None
+
+        if not self.replay and self.ttl and time.time() - created > self.ttl:
+            self._discard(path)
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Запись успели вытеснить после чтения - содержимое уже прочитано, отдаем его
+            pass
+        return content
+
+    def put(self, source: str, url: str, content: bytes):
+        if self.mode != "on":
+            return
+        path = self._path(source, url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Пишем во временный файл и подменяем: параллельные воркеры не видят недописанных записей
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=int(time.time())) as f:
+            f.write(content)
+        size = os.path.getsize(tmp_path)
+
+        with self._lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += size - previous
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in self._entries():
+                self._remove(path)
+            self._size = 0
+
+    def _path(self, source: str, url: str) -> str:
+        digest = hashlib.sha256(f"{source}\n{url}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + ".gz")
+
+    def _entries(self):
+        """(путь, время последнего чтения, размер) всех записей"""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".gz"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, stat.st_mtime, stat.st_size
+
+    def _scan_size(self) -> int:
+        return sum(size for _, _, size in self._entries())
+
+    def _evict(self):
+        """Удаляет давно не читанные страницы, пока кэш не станет меньше 90% лимита"""
+        target = self.max_bytes * 0.9
+        removed = 0
+        for path, _, size in sorted(self._entries(), key=lambda entry: entry[1]):
+            if self._size <= target:
+                break
+            self._remove(path)
+            self._size -= size
+            removed += 1
+        self.logger.info(f"Кэш страниц превысил {self.max_bytes // (1024 * 1024)} МБ, удалено записей: {removed}")
+
+    def _discard(self, path: str):
+        """Удаляет запись при чтении и вычитает ее размер из учтенного размера кэша"""
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                return
+            if self._size is not None:
+                self._size -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+shared_page_cache = PageCache()
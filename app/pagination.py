@@ -0,0 +1,128 @@
+import base64
+import json
+from typing import List, Optional
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Product
+
+# Поля сортировки для курсорной пагинации; "-" перед именем - по убыванию
+SORT_COLUMNS = {
+    "id": Product.id,
+    "price": Product.current_price,
+    "discount": Product.discount,
+    "rating": Product.rating,
+}
+SORT_PATTERN = "^-?(" + "|".join(SORT_COLUMNS) + ")$"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def parse_sort(sort: str):
+    """Возвращает колонку и признак сортировки по убыванию"""
+    descending = sort.startswith("-")
+    name = sort.lstrip("-")
+    if name not in SORT_COLUMNS:
+        raise InvalidCursor(f"Неизвестное поле сортировки: {name}")
+    return SORT_COLUMNS[name], descending
+
+
+def encode_cursor(sort: str, product: Product) -> str:
+    """Непрозрачный токен следующей страницы: значение сортировки и id последнего товара"""
+    column, _ = parse_sort(sort)
+    value = getattr(product, column.key)
+    payload = {"s": sort, "v": value, "i": product.id, "n": value is None}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def resolve_sort(sort: Optional[str], cursor: Optional[str]) -> str:
+    """Сортировка запроса: явная, из курсора или по id"""
+    if sort:
+        return sort
+    if cursor:
+        return decode_cursor(cursor)["s"]
+    return "id"
+
+
+def decode_cursor(token: str, sort: Optional[str] = None) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        payload["i"] = int(payload["i"])
+        payload["n"] = bool(payload.get("n"))
+        parse_sort(payload["s"])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor("Некорректный курсор")
+
+    if sort and payload["s"] != sort:
+        raise InvalidCursor("Курсор выдан для другой сортировки")
+    return payload
+
+
+class KeysetPlan:
+    """Запросы одной страницы по ключу (значение сортировки, id) без OFFSET.
+    Товары с пустым значением сортировки идут в конце, отдельным запросом по id"""
+
+    def __init__(self, query, sort: Optional[str], cursor: Optional[str]):
+        sort = resolve_sort(sort, cursor)
+        self.query = query
+        self.column, self.descending = parse_sort(sort)
+        self.position = decode_cursor(cursor, sort) if cursor else None
+        self.in_nulls_phase = self.position is not None and self.position["n"]
+
+    def first_statement(self, limit: int):
+        if self.column is Product.id:
+            query = self.query
+            if self.position:
+                query = query.where(self._after(Product.id, self.position["i"]))
+            return query.order_by(self._ordered(Product.id)).limit(limit)
+
+        if self.in_nulls_phase:
+            return self.nulls_statement(limit)
+
+        query = self.query.where(self.column.isnot(None))
+        if self.position:
+            query = query.where(self._after(
+                tuple_(self.column, Product.id),
+                tuple_(self.position["v"], self.position["i"])
+            ))
+        return query.order_by(self._ordered(self.column), self._ordered(Product.id)).limit(limit)
+
+    def nulls_statement(self, limit: int):
+        query = self.query.where(self.column.is_(None))
+        if self.in_nulls_phase:
+            query = query.where(self._after(Product.id, self.position["i"]))
+        return query.order_by(self._ordered(Product.id)).limit(limit)
+
+    def follow_up_statement(self, fetched: int, limit: int):
+        """Запрос за товарами без значения сортировки, если первый запрос не заполнил страницу"""
+        if self.column is Product.id or self.in_nulls_phase or fetched >= limit:
+            return None
+        return self.nulls_statement(limit - fetched)
+
+    def _ordered(self, expression):
+        return expression.desc() if self.descending else expression.asc()
+
+    def _after(self, left, right):
+        return left < right if self.descending else left > right
+
+
+def keyset_page(db: Session, query, sort: Optional[str], cursor: Optional[str], limit: int) -> List[Product]:
+    plan = KeysetPlan(query, sort, cursor)
+    products = list(db.scalars(plan.first_statement(limit)).all())
+    follow_up = plan.follow_up_statement(len(products), limit)
+    if follow_up is not None:
+        products += db.scalars(follow_up).all()
+    return products
+
+
+async def keyset_page_async(db: AsyncSession, query, sort: Optional[str], cursor: Optional[str], limit: int) -> List[Product]:
+    plan = KeysetPlan(query, sort, cursor)
+    products = list((await db.scalars(plan.first_statement(limit))).all())
+    follow_up = plan.follow_up_statement(len(products), limit)
+    if follow_up is not None:
+        products += (await db.scalars(follow_up)).all()
+    return products
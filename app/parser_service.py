@@ -1,43 +1,175 @@
 from sqlalchemy.orm import Session
-from typing import List, Dict
+from typing import Callable, List, Dict, Tuple
 from app.wildberries_parser import WildberriesSeleniumParser
+from app.pipeline import Pipeline
+from app.fingerprints import CrawlFingerprints
+from app.checkpoints import CrawlCheckpoint
 from app import crud, schemas
+from app.logger import logger
+from app.metrics import span
 
 
 class ParserService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, batch_size: int = crud.UPSERT_BATCH_SIZE):
         self.db = db
+        self.logger = logger
+        self.batch_size = batch_size
         self.parser = WildberriesSeleniumParser()
+        self.pipeline = Pipeline()
 
-    def parse_and_save_search(self, search_query: str, max_pages: int = 1) -> Dict:
-        """Парсит товары по поисковому запросу и сохраняет в БД"""
-        print(f"Начинаем парсинг по запросу: '{search_query}'")
+    def parse_and_save_search(
+            self,
+            search_query: str,
+            max_pages: int = 1,
+            workers: int = None,
+            incremental: bool = False,
+            progress_callback: Callable[[int, Dict], None] = None,
+            checkpoint: CrawlCheckpoint = None
+    ) -> Dict:
+        """Парсит товары по поисковому запросу и сохраняет в БД постранично, по мере загрузки.
+        В инкрементальном режиме товары, не изменившиеся с прошлого обхода, не записываются,
+        а обход останавливается на неизменившихся страницах.
+        progress_callback(страница, текущие итоги) вызывается после записи каждой страницы;
+        исключение из него останавливает парсинг. checkpoint отмечает записанные страницы,
+        и обход с тем же checkpoint после перезапуска продолжается с незаписанных"""
+        self.logger.info("Начинаем парсинг по запросу: '%s'", search_query)
 
-        # Формируем URL для поиска
-        search_url = f"https://www.wildberries.ru/catalog/0/search.aspx?search={search_query}"
+        search_url = self._search_url(search_query)
+        checkpoint = checkpoint or CrawlCheckpoint()
+        if checkpoint.results is None:
+            checkpoint.results = self._empty_results()
+        results = checkpoint.results
+        # В итогах задач, начатых до появления индекса дублей, этого ключа нет
+        results.setdefault('near_duplicates', 0)
+        # Отпечатки считаются всегда, чтобы следующему инкрементальному обходу было с чем сравнивать
+        fingerprints = CrawlFingerprints(
+            crud.get_page_fingerprints(self.db, search_query) if incremental else None,
+            incremental=incremental
+        )
 
-        # Парсим товары
-        products_data = self.parser.parse_search_page(search_url, max_pages)
+        def save_page(item: Tuple[int, List[schemas.ProductCreate]]):
+            page, products = item
+            counts = self._save_page(products, results)
+            checkpoint.page_done(page)
+            results['unchanged'] = fingerprints.unchanged_cards
+            if not fingerprints.page_unchanged(page):
+                crud.save_page_fingerprint(self.db, search_query, page, *fingerprints.current[page])
+            self.logger.info("Страница %d: сохранено новых %d, обновлено %d", page, counts['inserted'], counts['updated'],
+                             extra={"event": "page_saved", "query": search_query, "page": page, **counts})
 
-        results = {
-            'parsed': len(products_data),
+            if progress_callback:
+                progress_callback(page, results)
+
+        with span("crawl", query=search_query):
+            self.pipeline.run(
+                self.parser.iter_search_pages(
+                    search_url, max_pages, workers=workers, fingerprints=fingerprints, checkpoint=checkpoint
+                ),
+                save_page
+            )
+        results['unchanged'] = fingerprints.unchanged_cards
+        results['failed_pages'] = [page for _, page in checkpoint.failed_pages]
+
+        self.logger.info(
+            "Сохранено новых: %d, обновлено: %d, без изменений: %d, пропущено повторов: %d, без названия: %d, "
+            "похожих на другие товары: %d",
+            results['saved'], results['updated'], results['unchanged'], results['skipped'], results['invalid'],
+            results['near_duplicates'],
+            extra={"event": "crawl_done", "query": search_query, "results": results}
+        )
+
+        return results
+
+    def parse_and_save_batch(
+            self,
+            queries: List[Tuple[str, int]],
+            max_pages: int = 1,
+            workers: int = None,
+            progress_callback: Callable[[int, Dict], None] = None,
+            checkpoint: CrawlCheckpoint = None
+    ) -> Dict:
+        """Парсит пакет запросов ((запрос, приоритет), ...) общим пулом воркеров и сохраняет
+        страницы по мере загрузки. Товар, найденный по нескольким запросам, сохраняется один раз.
+        Страницы отмечаются в checkpoint по номеру запроса в пакете"""
+        self.logger.info("Начинаем пакетный парсинг: запросов %d", len(queries))
+
+        checkpoint = checkpoint or CrawlCheckpoint()
+        if checkpoint.results is None:
+            checkpoint.results = self._empty_results()
+            checkpoint.results['by_query'] = {query: 0 for query, _ in queries}
+        results = checkpoint.results
+        results.setdefault('near_duplicates', 0)
+
+        def save_page(item: Tuple[int, int, List[schemas.ProductCreate]]):
+            index, page, products = item
+            query = queries[index][0]
+            counts = self._save_page(products, results)
+            checkpoint.page_done(page, index)
+            results['by_query'][query] += len(products)
+            self.logger.info("'%s', страница %d: сохранено новых %d, обновлено %d",
+                             query, page, counts['inserted'], counts['updated'],
+                             extra={"event": "page_saved", "query": query, "page": page, **counts})
+
+            if progress_callback:
+                progress_callback(page, results)
+
+        search_urls = [(self._search_url(query), priority) for query, priority in queries]
+        with span("batch", queries=len(queries)):
+            self.pipeline.run(
+                self.parser.iter_batch_pages(search_urls, max_pages, workers=workers, checkpoint=checkpoint),
+                save_page
+            )
+        results['failed_pages'] = [
+            {"query": queries[index][0], "page": page} for index, page in checkpoint.failed_pages
+        ]
+
+        self.logger.info(
+            "Сохранено новых: %d, обновлено: %d, пропущено повторов: %d, без названия: %d, "
+            "похожих на другие товары: %d",
+            results['saved'], results['updated'], results['skipped'], results['invalid'], results['near_duplicates'],
+            extra={"event": "batch_done", "results": results}
+        )
+
+        return results
+
+    def _save_page(self, products: List[schemas.ProductCreate], results: Dict) -> Dict[str, int]:
+        """Сохраняет товары одной страницы и добавляет счетчики в итоги"""
+        valid_products = [product for product in products if self._is_valid(product)]
+
+        # Одна пачка INSERT ... ON CONFLICT на страницу, коммит сразу после нее
+        with span("db_write", products=len(valid_products)):
+            counts = crud.upsert_products(self.db, valid_products, batch_size=self.batch_size)
+
+        results['pages'] += 1
+        results['parsed'] += len(products)
+        results['invalid'] += len(products) - len(valid_products)
+        results['saved'] += counts['inserted']
+        results['updated'] += counts['updated']
+        results['skipped'] += counts['duplicates']
+        results['near_duplicates'] += counts['near_duplicates']
+        return counts
+
+    @staticmethod
+    def _search_url(search_query: str) -> str:
+        return f"https://www.wildberries.ru/catalog/0/search.aspx?search={search_query}"
+
+    @staticmethod
+    def _empty_results() -> Dict:
+        return {
+            'pages': 0,
+            'parsed': 0,
             'saved': 0,
+            'updated': 0,
             'skipped': 0,
-            'products': []
+            'invalid': 0,
+            'unchanged': 0,
+            'near_duplicates': 0
         }
 
-        for product_data in products_data:
-            existing = crud.get_products(self.db, search=product_data.name)
-            if not existing:
-                product = crud.create_product(self.db, product_data)
-                results['saved'] += 1
-                results['products'].append(product)
-                print(f"Сохранен: {product.name} - {product.current_price}{product.currency}")
-            else:
-                print(f"Уже существует: {product_data.name}")
-                results['skipped'] += 1
-
-        return results
+    @staticmethod
+    def _is_valid(product: schemas.ProductCreate) -> bool:
+        """Карточки, у которых не нашлось названия, не сохраняем"""
+        return bool(product.name) and product.name != "Название не найдено"
 
     def get_parsed_products(self, search: str = None) -> List[schemas.Product]:
         """Получает спарсенные товары из БД"""
@@ -0,0 +1,71 @@
+import os
+import threading
+from queue import Full, Queue
+from typing import Callable, Iterator, TypeVar
+from app.metrics import PIPELINE_QUEUE_DEPTH
+
+# Сколько готовых страниц может ждать записи в БД, прежде чем загрузка встанет на паузу
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+T = TypeVar("T")
+_DONE = object()
+
+
+class Pipeline:
+    """Источник (загрузка и разбор страниц) работает в фоновом потоке, приемник (проверка и запись)
+    - в вызывающем. Между ними ограниченная очередь: если запись отстает, загрузка ждет"""
+
+    def __init__(self, queue_size: int = PIPELINE_QUEUE_SIZE):
+        self.queue_size = max(1, queue_size)
+
+    def run(self, source: Iterator[T], sink: Callable[[T], None]):
+        queue = Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+
+        def produce():
+            try:
+                for item in source:
+                    if not self._put(queue, item, stop):
+                        break
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                # Генератор закрываем в том же потоке, где он выполнялся
+                close = getattr(source, "close", None)
+                if close:
+                    close()
+                queue.put(_DONE)
+
+        producer = threading.Thread(target=produce, name="pipeline-source", daemon=True)
+        producer.start()
+
+        try:
+            while True:
+                item = queue.get()
+                PIPELINE_QUEUE_DEPTH.set(queue.qsize())
+                if item is _DONE:
+                    break
+                sink(item)
+        except BaseException:
+            stop.set()
+            # Разгружаем очередь, чтобы источник смог завершиться
+            while queue.get() is not _DONE:
+                pass
+            raise
+        finally:
+            producer.join()
+
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    def _put(queue: Queue, item, stop: threading.Event) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.5)
+                PIPELINE_QUEUE_DEPTH.set(queue.qsize())
+                return True
+            except Full:
+                continue
+        return False
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from app.logger import logger
+
+# memory - в памяти процесса, redis - общий для всех процессов API, off - без кэша
+QUERY_CACHE_BACKEND = os.getenv("QUERY_CACHE_BACKEND", "memory")
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "300"))
+QUERY_CACHE_MAX_MB = float(os.getenv("QUERY_CACHE_MAX_MB", "64"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+CACHE_BACKENDS = ("off", "memory", "redis")
+
+
+class MemoryCacheBackend:
+    """LRU в памяти процесса с TTL и ограничением суммарного размера значений"""
+
+    def __init__(self, ttl: float = QUERY_CACHE_TTL, max_bytes: int = int(QUERY_CACHE_MAX_MB * 1024 * 1024)):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    async def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: str):
+        _, value = self._entries.pop(key)
+        self._size -= len(value)
+
+
+class RedisCacheBackend:
+    """Кэш в Redis (или совместимом сервере); размер ограничивается maxmemory самого сервера"""
+
+    def __init__(self, url: str = REDIS_URL, ttl: float = QUERY_CACHE_TTL):
+        import redis.asyncio
+
+        self.ttl = ttl
+        self._client = redis.asyncio.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes):
+        await self._client.set(key, value, px=int(self.ttl * 1000))
+
+    async def clear(self):
+        async for key in self._client.scan_iter(match="products:*"):
+            await self._client.delete(key)
+
+
+class QueryCache:
+    """Готовые JSON-ответы списка товаров. Ключ содержит версию таблицы products, которую
+    увеличивает каждая запись в нее, поэтому после записи старые ответы просто перестают читаться"""
+
+    def __init__(self, backend: str = QUERY_CACHE_BACKEND):
+        if backend not in CACHE_BACKENDS:
+            raise ValueError(f"Неизвестный кэш запросов: {backend}")
+        self.logger = logger
+        self._backend = None
+        if backend == "memory":
+            self._backend = MemoryCacheBackend()
+        elif backend == "redis":
+            try:
+                self._backend = RedisCacheBackend()
+            except ImportError:
+                self.logger.warning("Для QUERY_CACHE_BACKEND=redis нужен пакет redis, используется кэш в памяти")
+                self._backend = MemoryCacheBackend()
+
+    @property
+    def enabled(self) -> bool:
+        return self._backend is not None
+
+    @staticmethod
+    def key(version: int, **params) -> str:
+        normalized = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return f"products:{version}:{hashlib.sha1(normalized.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def etag(key: str) -> str:
+        # Ответ однозначно определяется версией таблицы и параметрами, то есть ключом
+        return f'W/"{key.split(":", 1)[1]}"'
+
+    @staticmethod
+    def etag_matches(if_none_match: str, etag: str) -> bool:
+        """Проверка If-None-Match слабым сравнением (RFC 9110): теги через запятую сравниваются
+        целиком без префикса W/, "*" совпадает с любым"""
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in tags:
+            return True
+        opaque = etag.removeprefix("W/")
+        return any(tag.removeprefix("W/") == opaque for tag in tags if tag)
+
+    async def get(self, key: str) -> Optional[Tuple[bytes, Optional[str]]]:
+        """Тело ответа и курсор следующей страницы"""
+        if not self.enabled:
+            return None
+        try:
+            value = await self._backend.get(key)
+        except Exception as e:
+            self.logger.warning(f"Кэш запросов недоступен: {e}")
+            return None
+        if value is None:
+            return None
+        cursor, _, body = value.partition(b"\n")
+        return body, cursor.decode("ascii") or None
+
+    async def set(self, key: str, body: bytes, cursor: Optional[str] = None):
+        if not self.enabled:
+            return
+        try:
+            await self._backend.set(key, (cursor or "").encode("ascii") + b"\n" + body)
+        except Exception as e:
+            self.logger.warning(f"Кэш запросов недоступен: {e}")
+
+    async def clear(self):
+        if self.enabled:
+            await self._backend.clear()
+
+
+query_cache = QueryCache()
@@ -0,0 +1,35 @@
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+# Сколько запросов в секунду разрешено к одному хосту
+PARSER_RATE_LIMIT = float(os.getenv("PARSER_RATE_LIMIT", "1"))
+
+
+class RateLimiter:
+    """Ограничивает частоту запросов к каждому хосту, потокобезопасен"""
+
+    def __init__(self, rate: float = PARSER_RATE_LIMIT):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        """Блокирует поток до ближайшего свободного окна для хоста"""
+        if not self.interval:
+            return
+
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            # Резервируем окно сразу, чтобы параллельные воркеры встали в очередь
+            self._next_slot[host] = slot + self.interval
+
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+shared_rate_limiter = RateLimiter()
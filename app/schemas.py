@@ -1,9 +1,10 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
 class ProductBase(BaseModel):
+    article: Optional[int] = None
     current_price: Optional[float] = None
     old_price: Optional[float] = None
     discount: Optional[int] = None
@@ -29,4 +30,92 @@ class Product(ProductBase):
 
     id: int
     created_at: datetime
-    updated_at: Optional[datetime] = None
\ No newline at end of file
+    updated_at: Optional[datetime] = None
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportSummary(BaseModel):
+    received: int
+    inserted: int
+    updated: int
+    # Строки с тем же товаром, что и более поздняя строка файла
+    duplicates: int
+    price_changes: int
+    rejected: int
+    # Первые IMPORT_MAX_ERRORS отклоненных строк
+    errors: List[ImportRowError]
+
+
+class PricePoint(BaseModel):
+    captured_at: datetime
+    current_price: Optional[float] = None
+    discount: Optional[int] = None
+    stock: Optional[str] = None
+    # При прореживании - диапазон цены внутри интервала
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+
+class PriceHistory(BaseModel):
+    product_id: int
+    downsampled: bool = False
+    points: List[PricePoint]
+
+
+class NearDuplicate(BaseModel):
+    product: Product
+    # Оценка сходства Жаккара триграмм названия и бренда по MinHash-сигнатурам
+    similarity: float
+
+
+class DuplicateCluster(BaseModel):
+    cluster_id: int
+    size: int
+    products: List[Product]
+
+
+class BatchQuery(BaseModel):
+    query: str = Field(min_length=1, max_length=500)
+    # Запросы с большим приоритетом парсятся раньше
+    priority: int = 0
+
+
+class BatchParseRequest(BaseModel):
+    queries: List[BatchQuery] = Field(min_length=1, max_length=1000)
+    pages: int = Field(1, ge=1, le=100)
+    workers: Optional[int] = Field(None, ge=1, le=16)
+
+    @field_validator("queries", mode="before")
+    @classmethod
+    def queries_from_strings(cls, value):
+        # Можно передать просто список строк
+        if isinstance(value, list):
+            return [{"query": item} if isinstance(item, str) else item for item in value]
+        return value
+
+
+class ParseJob(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    query: str
+    queries: Optional[List[BatchQuery]] = None
+    pages: int
+    workers: Optional[int] = None
+    incremental: bool = False
+    status: str
+    progress: Optional[str] = None
+    pages_done: int = 0
+    products_parsed: int = 0
+    products_saved: int = 0
+    products_updated: int = 0
+    error: Optional[str] = None
+    checkpoint: Optional[dict] = None
+    cancel_requested: bool = False
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -5,226 +5,510 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
+from selenium.common.exceptions import TimeoutException
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import logging
+import os
 import time
-import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Tuple
 from app.schemas import ProductCreate
-from app.logger import logger
+from app.logger import sampled, setup_logger
+from app.driver_pool import DriverPool, get_driver_pool
+from app.rate_limiter import RateLimiter, shared_rate_limiter
+from app.fetch_backends import FetchBackend, create_fetch_backend
+from app.card_extractor import CardExtractor
+from app.metrics import PAGES, CARDS, PRODUCTS, CARD_ERRORS, FIELD_MISSING, span
+from app.fingerprints import CrawlFingerprints
+from app.batch_scheduler import BatchScheduler
+from app.checkpoints import CrawlCheckpoint
+from app.browser_profile import (
+    PARSER_BROWSER_MODE, apply_lean_options, block_requests, blocked_hosts, check_mode, window_size
+)
+from app.page_cache import PageCache, shared_page_cache
+
+PARSER_WORKERS = int(os.getenv("PARSER_WORKERS", "1"))
+MAX_PRODUCTS_PER_PAGE = 100
+# Сколько секунд ждать новых карточек после прокрутки, прежде чем считать страницу загруженной
+SCROLL_IDLE_TIMEOUT = float(os.getenv("SCROLL_IDLE_TIMEOUT", "2"))
+# Сколько секунд ждать первых карточек на странице; если их нет, страница считается концом выдачи
+CARDS_WAIT_TIMEOUT = float(os.getenv("CARDS_WAIT_TIMEOUT", "15"))
+# Блок "ничего не найдено", который Wildberries показывает за последней страницей выдачи
+NOT_FOUND_SELECTOR = ".not-found-search"
+
+# Прокручивает к последней карточке и ждет через MutationObserver, пока их станет больше.
+# Возвращает итоговое количество карточек (по таймауту - текущее)
+SCROLL_AND_WAIT_JS = """
+const timeoutMs = arguments[0];
+const done = arguments[arguments.length - 1];
+const cards = document.getElementsByClassName('product-card');
+const before = cards.length;
+let timer = null;
+const observer = new MutationObserver(() => {
+    if (cards.length > before) finish();
+});
+function finish() {
+    observer.disconnect();
+    clearTimeout(timer);
+    done(cards.length);
+}
+observer.observe(document.body, {childList: true, subtree: true});
+timer = setTimeout(finish, timeoutMs);
+if (before) {
+    cards[before - 1].scrollIntoView({block: 'end'});
+}
+window.scrollBy(0, window.innerHeight);
+"""
+
+# Поля, пропуски которых считаются в метрике wb_field_missing_total
+MONITORED_FIELDS = ("name", "current_price", "old_price", "discount", "brand", "rating", "reviews_count")
+
+
+def create_driver(browser_mode: str = PARSER_BROWSER_MODE):
+    """Запускает headless Chrome с профилем режима browser_mode"""
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    options.add_argument(
+        "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    options.add_argument(f"--window-size={window_size(browser_mode)}")
+    if browser_mode == "lean":
+        apply_lean_options(options)
+
+    driver = webdriver.Chrome(options=options)
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    if browser_mode == "lean":
+        block_requests(driver, blocked_hosts())
+
+    return driver
 
 
 class WildberriesSeleniumParser:
-    def __init__(self):
-        self.logger = logger
+    def __init__(
+            self,
+            driver_pool: Optional[DriverPool] = None,
+            rate_limiter: Optional[RateLimiter] = None,
+            backend: Optional[FetchBackend] = None,
+            page_cache: Optional[PageCache] = None,
+            browser_mode: str = PARSER_BROWSER_MODE
+    ):
+        self.logger = setup_logger()
+        check_mode(browser_mode)
+        self.browser_mode = browser_mode
+        # По умолчанию браузеры и лимит запросов общие на весь процесс; пул браузеров - свой для
+        # каждого режима и создает их функцией режима, не держа ссылку на первый парсер
+        self.driver_pool = driver_pool or get_driver_pool(partial(create_driver, browser_mode), browser_mode)
+        self.rate_limiter = rate_limiter or shared_rate_limiter
+        # Без отдельного бэкенда страницы загружаются через Selenium
+        self.backend = backend if backend is not None else create_fetch_backend()
+        self.page_cache = page_cache or shared_page_cache
+        self.extractor = CardExtractor()
+        # Время полной загрузки (до последней подгруженной карточки) по URL страниц
+        self.page_load_times: Dict[str, float] = {}
 
     def _create_driver(self):
-        options = Options()
-        options.add_argument("--headless")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option('useAutomationExtension', False)
-        options.add_argument(
-            "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-        options.add_argument("--window-size=1920,1080")
-
-        driver = webdriver.Chrome(options=options)
-        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-
-        return driver
-
-    def parse_search_page(self, search_url: str, max_pages: int = 1) -> List[ProductCreate]:
+        return create_driver(self.browser_mode)
+
+    def parse_search_page(
+            self,
+            search_url: str,
+            max_pages: int = 1,
+            workers: Optional[int] = None
+    ) -> List[ProductCreate]:
         """Парсит страницу поиска Wildberries"""
-        self.logger.info(f"Начинаем парсинг по URL: {search_url}, страниц: {max_pages}")
-
         all_products = []
+        for page, products_in_page in self.iter_search_pages(search_url, max_pages, workers):
+            all_products.extend(products_in_page)
 
-        for page in range(1, max_pages + 1):
-            self.logger.info(f"\n{'=' * 50}")
-            self.logger.info(f"Парсим страницу {page}")
-            self.logger.info(f"{'=' * 50}")
+        self.logger.info("Парсинг завершен. Итого собрано товаров: %d", len(all_products))
+        return all_products
 
-            if page == 1:
-                url = search_url
-            else:
-                url = f"{search_url}&page={page}"
+    def iter_search_pages(
+            self,
+            search_url: str,
+            max_pages: int = 1,
+            workers: Optional[int] = None,
+            fingerprints: Optional[CrawlFingerprints] = None,
+            checkpoint: Optional[CrawlCheckpoint] = None
+    ) -> Iterator[Tuple[int, List[ProductCreate]]]:
+        """Отдает товары постранично, по мере загрузки, без повторов между страницами.
+        С fingerprints считает отпечатки страниц и в инкрементальном режиме пропускает
+        неизменившиеся карточки и страницы. Страницы, уже записанные по checkpoint, не загружаются,
+        страницы с ошибкой загружаются повторно, пока не исчерпаны попытки"""
+        checkpoint = checkpoint or CrawlCheckpoint()
+        workers = max(1, min(workers or PARSER_WORKERS, max_pages))
+        self.logger.info(f"Начинаем парсинг по URL: {search_url}, страниц: {max_pages}, воркеров: {workers}")
+        if self.backend is None and workers > self.driver_pool.size:
+            self.logger.warning(
+                f"Воркеров ({workers}) больше, чем браузеров в пуле ({self.driver_pool.size}), "
+                f"параллельно будет обрабатываться не больше {self.driver_pool.size} страниц"
+            )
 
-            products_in_page = self._parse_single_page(url)
-            all_products.extend(products_in_page)
+        seen_keys = set()
+        total = 0
+
+        if checkpoint.resumed:
+            self.logger.info(f"Продолжаем обход: уже записано страниц {checkpoint.completed_pages()}")
+
+        for page, products_in_page in self._crawl_pages(search_url, max_pages, workers, checkpoint):
+            found = len(products_in_page)
+            if fingerprints is not None:
+                products_in_page = fingerprints.filter_page(page, products_in_page)
+
+            new_products = []
+            for product in products_in_page:
+                key = self._product_key(product)
+                if key not in seen_keys:
+                    seen_keys.add(key)
+                    new_products.append(product)
+            total += len(new_products)
+
+            # Одна сводная запись на страницу
+            self.logger.info(
+                "Страница %d: получено товаров %d, новых %d, всего собрано %d", page, found, len(new_products), total,
+                extra={"event": "page", "page": page, "found": found, "new": len(new_products), "total": total}
+            )
 
-            self.logger.info(f"С страницы {page} получено товаров: {len(products_in_page)}")
-            self.logger.info(f"Всего собрано товаров: {len(all_products)}")
+            yield page, new_products
+
+            if fingerprints is not None and fingerprints.should_stop:
+                self.logger.info(f"Страниц без изменений подряд: {fingerprints.unchanged_run}, "
+                                 f"дальше не загружаем")
+                return
+
+    def iter_batch_pages(
+            self,
+            search_urls: List[Tuple[str, int]],
+            max_pages: int = 1,
+            workers: Optional[int] = None,
+            checkpoint: Optional[CrawlCheckpoint] = None
+    ) -> Iterator[Tuple[int, int, List[ProductCreate]]]:
+        """Парсит выдачу нескольких запросов ((URL, приоритет), ...) одним пулом воркеров.
+        Отдает (номер запроса, страница, товары) по мере загрузки; товар, уже встреченный
+        под любым запросом пакета, повторно не отдается. Записанные по checkpoint страницы
+        пропускаются, страницы с ошибкой загружаются повторно, пока не исчерпаны попытки"""
+        workers = max(1, workers or PARSER_WORKERS)
+        checkpoint = checkpoint or CrawlCheckpoint()
+        scheduler = BatchScheduler(
+            [priority for _, priority in search_urls],
+            max_pages,
+            # Один запрос в пакете может занять все воркеры, несколько - делят их поровну
+            max_in_flight_per_query=-(-workers // len(search_urls)),
+            last_pages=[checkpoint.last_page(max_pages, index) for index in range(len(search_urls))]
+        )
+        self.logger.info(f"Начинаем пакетный парсинг: запросов {len(search_urls)}, страниц на запрос: {max_pages}, "
+                         f"воркеров: {workers}")
+
+        seen_keys = set()
+        in_flight = {}
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wb-batch")
 
-            if page < max_pages:
-                time.sleep(1)
+        try:
+            while True:
+                while len(in_flight) < workers:
+                    task = scheduler.next_task()
+                    if task is None:
+                        break
+                    index, page = task
+                    if not checkpoint.should_fetch(page, index):
+                        scheduler.complete(index, page, empty=False)
+                        continue
+                    in_flight[executor.submit(self._fetch_page, search_urls[index][0], page)] = task
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, page = in_flight.pop(future)
+                    try:
+                        products = future.result()
+                    except Exception as e:
+                        # Ошибка одного запроса не останавливает пакет
+                        if checkpoint.page_failed(page, str(e), index):
+                            self.logger.warning(f"Запрос {search_urls[index][0]}, страница {page}: {e}, "
+                                                f"попробуем еще раз")
+                            scheduler.retry(index, page)
+                        else:
+                            self.logger.error(f"Запрос {search_urls[index][0]}, страница {page} не загрузилась "
+                                              f"за {checkpoint.max_attempts} попыток, пропускаем: {e}")
+                            scheduler.complete(index, page, empty=False)
+                        continue
+
+                    if not products and scheduler.is_current(index, page):
+                        checkpoint.end_of_results(page - 1, index)
+                    scheduler.complete(index, page, empty=not products)
+                    if not products or not scheduler.is_current(index, page):
+                        continue
+
+                    new_products = []
+                    for product in products:
+                        key = self._product_key(product)
+                        if key not in seen_keys:
+                            seen_keys.add(key)
+                            new_products.append(product)
+                    yield index, page, new_products
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _crawl_pages(
+            self,
+            search_url: str,
+            max_pages: int,
+            workers: int,
+            checkpoint: CrawlCheckpoint
+    ) -> Iterator[Tuple[int, List[ProductCreate]]]:
+        """Раздает страницы воркерам и отдает результаты в порядке номеров страниц.
+        Страница с ошибкой ставится в список повторов и загружается раньше новых страниц;
+        после checkpoint.max_attempts попыток она пропускается, а обход идет дальше"""
+        last_page = checkpoint.last_page(max_pages)
+        order = [page for page in range(1, last_page + 1) if checkpoint.should_fetch(page)]
+        pending = deque(order)
+        retries = deque()
+        next_index = 0
+        # Номер страницы -> товары; None - страница пропущена после всех попыток
+        finished_pages = {}
+        in_flight = {}
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wb-page")
 
-        self.logger.info(f"\nПарсинг завершен. Итого собрано товаров: {len(all_products)}")
-        return all_products
+        try:
+            while next_index < len(order) and order[next_index] <= last_page:
+                page = order[next_index]
+                if page in finished_pages:
+                    products = finished_pages.pop(page)
+                    next_index += 1
+                    if products is not None:
+                        yield page, products
+                    continue
 
-    def _parse_single_page(self, url: str) -> List[ProductCreate]:
-        """Парсит одну страницу с товарами"""
-        driver = self._create_driver()
-        parsed_products = []
+                while len(in_flight) < workers and (retries or (pending and pending[0] <= last_page)):
+                    page = retries.popleft() if retries else pending.popleft()
+                    in_flight[executor.submit(self._fetch_page, search_url, page)] = page
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = in_flight.pop(future)
+                    try:
+                        products = future.result()
+                    except Exception as e:
+                        if checkpoint.page_failed(page, str(e)):
+                            self.logger.warning(f"Страница {page} не загрузилась ({e}), попробуем еще раз")
+                            retries.append(page)
+                        else:
+                            self.logger.error(f"Страница {page} не загрузилась за {checkpoint.max_attempts} "
+                                              f"попыток, пропускаем: {e}")
+                            finished_pages[page] = None
+                        continue
+
+                    if products:
+                        finished_pages[page] = products
+                    elif page <= last_page:
+                        # Пустая страница - дальше результатов поиска нет
+                        self.logger.info(f"Страница {page} пустая, следующие страницы не запрашиваем")
+                        last_page = page - 1
+                        checkpoint.end_of_results(last_page)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _fetch_page(self, search_url: str, page: int) -> List[ProductCreate]:
+        """Загружает одну страницу выдачи с учетом лимита запросов к хосту"""
+        url = search_url if page == 1 else f"{search_url}&page={page}"
+
+        with span("page", page=page):
+            cached = self._cached_page(url)
+            if cached is not None:
+                self.logger.debug("Страница %d взята из кэша", page)
+                return self._count_page("cache", cached)
+            if self.page_cache.replay:
+                self.logger.info(f"Страницы {page} нет в кэше, в режиме replay выдача на ней заканчивается")
+                return []
+
+            self.logger.debug("Парсим страницу %d", page)
+
+            if self.backend is not None:
+                try:
+                    # Лимит считается по хосту, к которому бэкенд обращается на самом деле (API, а не сайт)
+                    with span("rate_limit"):
+                        self.rate_limiter.wait(self.backend.request_url(search_url, page))
+                    with span("http_fetch"):
+                        content = self.backend.fetch_raw(search_url, page)
+                    with span("http_parse"):
+                        products = self.backend.parse_raw(content)
+                    if products:
+                        self.page_cache.put(self.backend.name, url, content)
+                    return self._count_page(self.backend.name, products)
+                except Exception as e:
+                    PAGES.labels(source=self.backend.name, status="error").inc()
+                    self.logger.warning(f"Бэкенд {self.backend.name} не смог загрузить страницу {page}: {e}. "
+                                        f"Переключаемся на Selenium")
+
+            with span("rate_limit"):
+                self.rate_limiter.wait(url)
+            return self._count_page("selenium", self._parse_single_page(url))
+
+    @staticmethod
+    def _count_page(source: str, products: List[ProductCreate]) -> List[ProductCreate]:
+        PAGES.labels(source=source, status="ok" if products else "empty").inc()
+        return products
+
+    def _cached_page(self, url: str) -> Optional[List[ProductCreate]]:
+        """Товары страницы из кэша: ответ текущего бэкенда или HTML, сохраненный браузером"""
+        if not self.page_cache.enabled:
+            return None
+        if self.backend is not None:
+            content = self.page_cache.get(self.backend.name, url)
+            if content is not None:
+                return self.backend.parse_raw(content)
+        content = self.page_cache.get("selenium", url)
+        if content is not None:
+            return self._extract_products(content.decode("utf-8"))
+        return None
+
+    @staticmethod
+    def _product_key(product: ProductCreate) -> Tuple:
+        """Ключ для удаления повторов товара между страницами"""
+        if product.article:
+            return product.article,
+        return product.brand, product.name, product.current_price
 
+    def _parse_single_page(self, url: str) -> List[ProductCreate]:
+        """Парсит одну страницу с товарами. Ошибка загрузки не превращается в пустую страницу
+        (это означало бы конец выдачи), а передается дальше - страницу загрузят повторно"""
+        try:
+            with self.driver_pool.driver() as driver:
+                return self._parse_page_with_driver(driver, url)
+        except Exception:
+            PAGES.labels(source="selenium", status="error").inc()
+            raise
+
+    def _parse_page_with_driver(self, driver, url: str) -> List[ProductCreate]:
+        """Загружает и парсит страницу в уже запущенном браузере"""
         try:
-            self.logger.info("Загружаем страницу...")
-            driver.get(url)
+            load_started = time.perf_counter()
+            with span("page_load"):
+                driver.get(url)
 
-            wait = WebDriverWait(driver, 15)
-            wait.until(EC.presence_of_element_located((By.CLASS_NAME, "product-card")))
+                wait = WebDriverWait(driver, CARDS_WAIT_TIMEOUT)
+                try:
+                    wait.until(EC.any_of(
+                        EC.presence_of_element_located((By.CLASS_NAME, "product-card")),
+                        EC.presence_of_element_located((By.CSS_SELECTOR, NOT_FOUND_SELECTOR))
+                    ))
+                except TimeoutException:
+                    pass
+
+            # Страница без карточек - за последней страницей выдачи: пустой результат останавливает
+            # обход, а ошибка поставила бы страницу в повторы
+            if not driver.find_elements(By.CLASS_NAME, "product-card"):
+                self.logger.info(f"На странице {url} нет карточек товаров, выдача закончилась")
+                return []
 
             # Прокрутка для загрузки всех товаров
-            total_products = self._scroll_to_load_all_products(driver)
-            self.logger.info(f"Итого загружено товаров: {total_products}")
-
-            # Парсим все товары
-            soup = BeautifulSoup(driver.page_source, 'lxml')
-            products = soup.find_all('article', class_='product-card')
+            with span("scroll"):
+                total_products = self._scroll_to_load_all_products(driver)
+            load_time = time.perf_counter() - load_started
+            self.page_load_times[url] = load_time
+            self.logger.info(
+                "Загружено карточек: %d, страница загружена за %.2f с", total_products, load_time,
+                extra={"event": "page_load", "url": url, "cards": total_products, "load_time": round(load_time, 3)}
+            )
 
-            self.logger.info(f"Найдено товаров для парсинга: {len(products)}")
+            # Парсим все товары: HTML забираем из браузера и разбираем один раз
+            with span("page_source"):
+                page_source = driver.page_source
+            parsed_products = self._extract_products(page_source)
+            if parsed_products:
+                self.page_cache.put("selenium", url, page_source.encode("utf-8"))
+            return parsed_products
 
-            if not products:
-                self.logger.warning("Товары не найдены. Сохраняем HTML для отладки...")
-                with open('debug_page.html', 'w', encoding='utf-8') as f:
+        except Exception:
+            try:
+                with open('error_page.html', 'w', encoding='utf-8') as f:
                     f.write(driver.page_source)
-                self.logger.info("HTML страницы сохранен в debug_page.html")
-                return []
+                self.logger.info("HTML страницы сохранен в error_page.html")
+            except Exception:
+                pass
+            raise
+
+    def _extract_products(self, page_source: str) -> List[ProductCreate]:
+        """Разбирает товары из HTML страницы выдачи"""
+        parsed_products = []
+        with span("html_parse"):
+            products = self.extractor.find_cards(page_source)
+        CARDS.inc(len(products))
+
+        if not products:
+            self.logger.warning("Товары не найдены. Сохраняем HTML для отладки...")
+            with open('debug_page.html', 'w', encoding='utf-8') as f:
+                f.write(page_source)
+            self.logger.info("HTML страницы сохранен в debug_page.html")
+            return []
 
+        log_products = self.logger.isEnabledFor(logging.DEBUG)
+        with span("extract", cards=len(products)):
             for i, product in enumerate(products, 1):
                 try:
-                    product_data = self._parse_single_product(product, i)
+                    product_data = self._parse_single_product(product, i, log_products and sampled())
                     if product_data:
                         parsed_products.append(product_data)
                 except Exception as e:
-                    self.logger.warning(f"Ошибка при парсинге товара #{i}: {e}")
+                    self.logger.warning("Ошибка при парсинге товара #%d: %s", i, e)
                     continue
 
-            self.logger.info(f"Успешно спарсено товаров: {len(parsed_products)}")
-            return parsed_products
-
-        except Exception as e:
-            self.logger.error(f"Произошла ошибка: {e}")
-            with open('error_page.html', 'w', encoding='utf-8') as f:
-                f.write(driver.page_source)
-            self.logger.info("HTML страницы сохранен в error_page.html")
-            return []
-
-        finally:
-            driver.quit()
+        PRODUCTS.inc(len(parsed_products))
+        CARD_ERRORS.inc(len(products) - len(parsed_products))
+        self._count_missing_fields(parsed_products)
+
+        self.logger.debug("Найдено карточек: %d, спарсено товаров: %d", len(products), len(parsed_products))
+        return parsed_products
+
+    @staticmethod
+    def _count_missing_fields(products: List[ProductCreate]):
+        """Сколько товаров страницы разобрано без каждого из полей - одно обновление счетчика на поле"""
+        missing = dict.fromkeys(MONITORED_FIELDS, 0)
+        for product in products:
+            for field in MONITORED_FIELDS:
+                if getattr(product, field) in (None, ""):
+                    missing[field] += 1
+            if product.name == "Название не найдено":
+                missing["name"] += 1
+        for field, count in missing.items():
+            if count:
+                FIELD_MISSING.labels(field=field).inc(count)
 
     def _scroll_to_load_all_products(self, driver):
-        """Прокрутка для загрузки всех товаров"""
-        self.logger.info("Начинаем постепенную прокрутку...")
-
-        for i in range(1, 16):
-            scroll_position = i * 700
-            driver.execute_script(f"window.scrollTo(0, {scroll_position});")
-            time.sleep(0.3)
-
-            current_products = driver.find_elements(By.CLASS_NAME, "product-card")
-            self.logger.info(f"Шаг {i}: {len(current_products)} товаров")
-
-            if len(current_products) >= 100:
-                self.logger.info("Все продукты на странице проанализированы")
+        """Прокрутка для загрузки всех товаров: пока после прокрутки появляются новые карточки"""
+        driver.set_script_timeout(SCROLL_IDLE_TIMEOUT + 5)
+
+        count = len(driver.find_elements(By.CLASS_NAME, "product-card"))
+        step = 0
+        while count < MAX_PRODUCTS_PER_PAGE:
+            step += 1
+            new_count = driver.execute_async_script(SCROLL_AND_WAIT_JS, int(SCROLL_IDLE_TIMEOUT * 1000))
+            self.logger.debug("Шаг прокрутки %d: %d товаров", step, new_count)
+            if new_count <= count:
+                # За время ожидания ничего не подгрузилось - выдача на странице закончилась
                 break
+            count = new_count
 
-        final_count = len(driver.find_elements(By.CLASS_NAME, "product-card"))
-        self.logger.info(f"Всего загружено товаров: {final_count}")
-        return final_count
+        return count
 
-    def _parse_single_product(self, product, index: int) -> Optional[ProductCreate]:
+    def _parse_single_product(self, product, index: int, log_details: bool = False) -> Optional[ProductCreate]:
         """Парсит один товар и преобразует в ProductCreate"""
-        self.logger.info(f"\n--- Товар #{index} ---")
-
         try:
-            # Цена
-            current_price_elem = product.find('ins', class_='price__lower-price')
-            current_price_text = current_price_elem.get_text(
-                strip=True) if current_price_elem else "Текущая цена не найдена"
-            current_price = self._price_to_float(current_price_text)
-
-            # Старая цена
-            old_price_elem = product.find('del')
-            old_price_text = old_price_elem.get_text(strip=True) if old_price_elem else "Старая цена не найдена"
-            old_price = self._price_to_float(old_price_text) if old_price_text != "Старая цена не найдена" else None
-
-            # Скидка
-            discount_elem = product.find('span', class_='percentage-sale')
-            discount_text = discount_elem.get_text(strip=True) if discount_elem else ""
-            discount = int(discount_text[1:-1]) if discount_text  else None
-
-            # Бренд
-            brand_elem = product.find('span', class_='product-card__brand')
-            brand = brand_elem.get_text(strip=True) if brand_elem else None
-
-            # Название
-            name_elem = product.find('span', class_='product-card__name')
-            name = name_elem.get_text(strip=True) if name_elem else ""
-            name = name[1:] if name and name.startswith('/') else name
-            if not name:
-                name = "Название не найдено"
-
-            # Рейтинг
-            rating_elem = product.find('span', class_='address-rate-mini')
-            rating_text = rating_elem.get_text(strip=True) if rating_elem else "Рейтинг не найден"
-            rating = self._text_to_float(rating_text) if rating_text != "Рейтинг не найден" else None
-
-            # Количество отзывов
-            reviews_elem = product.find('span', class_='product-card__count')
-            reviews_text = reviews_elem.get_text(strip=True) if reviews_elem else ""
-            reviews = self._text_to_int(reviews_text.split(" ")[0])
-
-            # Остатки товара
-            remaining_elem = product.find('span', class_='product-card__tip--quantity')
-            remaining_text = remaining_elem.get_text(strip=True) if remaining_elem else ""
-            stock = remaining_text.split(" ")[0] if remaining_text else "Остатки не указаны"
-
-            # Логируем
-            self.logger.info(f"Текущая цена: {current_price}")
-            self.logger.info(f"Старая цена: {old_price}" if old_price else "Старая цена: не найдена")
-            self.logger.info(f"Скидка: {discount}" if discount else "Скидка: не найдена")
-            self.logger.info(f"Бренд: {brand}" if brand else "Бренд: не найден")
-            self.logger.info(f"Название: {name}")
-            self.logger.info(f"Рейтинг: {rating}" if rating else "Рейтинг: не найден")
-            self.logger.info(f"Отзывы: {reviews}" if reviews else "Отзывы: не найдены")
-            self.logger.info(f"Остатки: {stock}")
-
-            # Создаем ProductCreate
-            return ProductCreate(
-                current_price=current_price,
-                old_price=old_price,
-                discount=discount,
-                brand=brand,
-                name=name,
-                rating=rating,
-                reviews_count=reviews,
-                stock=stock,
-                currency="RUB"
-            )
+            product_data = self.extractor.extract_product(product)
 
-        except Exception as e:
-            self.logger.error(f"Ошибка при парсинге товара #{index}: {e}")
-            return None
+            if log_details:
+                # Все поля товара одной записью; пишется только для выборки товаров (LOG_SAMPLE_RATE)
+                self.logger.debug("Товар #%d: %s", index, product_data.name,
+                                  extra={"event": "product", "index": index, "product": product_data.model_dump()})
 
-    def _price_to_float(self, price_text: str) -> float:
-        try:
-            cleaned = re.sub(r'[^\d]', '', price_text)
-            return float(cleaned) if cleaned else 0.0
-        except (ValueError, TypeError):
-            return 0.0
+            return product_data
 
-    def _text_to_float(self, text: str) -> Optional[float]:
-        try:
-            cleaned = re.sub(r',', '.', text)
-            cleaned = re.sub(r'[^\d.]', '', cleaned)
-            return float(cleaned) if cleaned else None
-        except (ValueError, TypeError):
+        except Exception as e:
+            self.logger.error("Ошибка при парсинге товара #%d: %s", index, e)
             return None
-
-    def _text_to_int(self, text: str) -> Optional[int]:
-        try:
-            cleaned = re.sub(r'[^\d]', '', text)
-            return int(cleaned) if cleaned else None
-        except (ValueError, TypeError):
-            return None
\ No newline at end of file
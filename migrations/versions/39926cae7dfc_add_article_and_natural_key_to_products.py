@@ -0,0 +1,58 @@
+"""Add article and natural key to products
+
+Revision ID: 39926cae7dfc
+Revises: 501bc5c3575a
+Create Date: 2025-10-25 14:12:40.318502
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '39926cae7dfc'
+down_revision: Union[str, None] = '501bc5c3575a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _hash_key(name, brand) -> str:
+    # Копия crud.product_hash_key на момент миграции
+    normalized = f"{(name or '').strip().lower()}|{(brand or '').strip().lower()}"
+    return "h:" + hashlib.md5(normalized.encode("utf-8")).hexdigest()
+
+
+def upgrade() -> None:
+    op.add_column('products', sa.Column('article', sa.BigInteger(), nullable=True))
+    op.add_column('products', sa.Column('natural_key', sa.String(length=64), nullable=True))
+
+    # Ключ старых записей считается в Python так же, как crud.product_hash_key: SQL trim() и lower()
+    # нормализуют пробелы и регистр иначе, и ключи разошлись бы с ключами новых записей
+    bind = op.get_bind()
+    products = sa.table('products', sa.column('id'), sa.column('name'), sa.column('brand'), sa.column('natural_key'))
+    rows = bind.execute(sa.select(products.c.id, products.c.name, products.c.brand)).all()
+    if rows:
+        bind.execute(
+            products.update().where(products.c.id == sa.bindparam('row_id')).values(natural_key=sa.bindparam('key')),
+            [{'row_id': row_id, 'key': _hash_key(name, brand)} for row_id, name, brand in rows]
+        )
+    # Повторы, которые пропустила проверка через ILIKE, оставляем в одном экземпляре - последнем
+    # записанном, с самой свежей ценой
+    op.execute(
+        "DELETE FROM products p USING products d "
+        "WHERE p.natural_key = d.natural_key AND p.id < d.id"
+    )
+
+    op.alter_column('products', 'natural_key', nullable=False)
+    op.create_index(op.f('ix_products_article'), 'products', ['article'], unique=False)
+    op.create_index(op.f('ix_products_natural_key'), 'products', ['natural_key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_products_natural_key'), table_name='products')
+    op.drop_index(op.f('ix_products_article'), table_name='products')
+    op.drop_column('products', 'natural_key')
+    op.drop_column('products', 'article')
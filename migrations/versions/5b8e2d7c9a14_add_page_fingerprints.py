@@ -0,0 +1,37 @@
+"""Add page fingerprints and incremental parse jobs
+
+Revision ID: 5b8e2d7c9a14
+Revises: c3f1a8d52e47
+Create Date: 2025-10-29 09:15:42.871204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e2d7c9a14'
+down_revision: Union[str, None] = 'c3f1a8d52e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('page_fingerprints',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('query', sa.String(length=500), nullable=False),
+    sa.Column('page', sa.Integer(), nullable=False),
+    sa.Column('fingerprint', sa.String(length=32), nullable=False),
+    sa.Column('card_hashes', sa.JSON(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('query', 'page', name='uq_page_fingerprints_query_page')
+    )
+    op.add_column('parse_jobs', sa.Column('incremental', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('parse_jobs', 'incremental')
+    op.drop_table('page_fingerprints')
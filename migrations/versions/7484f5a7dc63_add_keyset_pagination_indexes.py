@@ -0,0 +1,30 @@
+"""Add keyset pagination indexes
+
+Revision ID: 7484f5a7dc63
+Revises: 79be39e2604f
+Create Date: 2025-10-26 16:40:52.117834
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7484f5a7dc63'
+down_revision: Union[str, None] = '79be39e2604f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_products_price_id', 'products', ['current_price', 'id'], unique=False)
+    op.create_index('ix_products_discount_id', 'products', ['discount', 'id'], unique=False)
+    op.create_index('ix_products_rating_id', 'products', ['rating', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_rating_id', table_name='products')
+    op.drop_index('ix_products_discount_id', table_name='products')
+    op.drop_index('ix_products_price_id', table_name='products')
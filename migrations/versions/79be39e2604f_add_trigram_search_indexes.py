@@ -0,0 +1,35 @@
+"""Add trigram search indexes
+
+Revision ID: 79be39e2604f
+Revises: 39926cae7dfc
+Create Date: 2025-10-26 11:03:17.552190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '79be39e2604f'
+down_revision: Union[str, None] = '39926cae7dfc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        'ix_products_name_trgm', 'products', ['name'], unique=False,
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_products_brand_trgm', 'products', ['brand'], unique=False,
+        postgresql_using='gin', postgresql_ops={'brand': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_brand_trgm', table_name='products')
+    op.drop_index('ix_products_name_trgm', table_name='products')
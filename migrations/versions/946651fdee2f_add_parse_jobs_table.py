@@ -0,0 +1,49 @@
+"""Add parse jobs table
+
+Revision ID: 946651fdee2f
+Revises: 7484f5a7dc63
+Create Date: 2025-10-27 12:21:09.604733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '946651fdee2f'
+down_revision: Union[str, None] = '7484f5a7dc63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('parse_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('query', sa.String(length=500), nullable=False),
+    sa.Column('pages', sa.Integer(), nullable=False),
+    sa.Column('workers', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('progress', sa.String(length=255), nullable=True),
+    sa.Column('pages_done', sa.Integer(), nullable=False),
+    sa.Column('products_parsed', sa.Integer(), nullable=False),
+    sa.Column('products_saved', sa.Integer(), nullable=False),
+    sa.Column('products_updated', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('cancel_requested', sa.Boolean(), nullable=False),
+    sa.Column('worker_id', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_parse_jobs_id'), 'parse_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_parse_jobs_status'), 'parse_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_parse_jobs_status'), table_name='parse_jobs')
+    op.drop_index(op.f('ix_parse_jobs_id'), table_name='parse_jobs')
+    op.drop_table('parse_jobs')
@@ -0,0 +1,26 @@
+"""Add batch queries to parse jobs
+
+Revision ID: a9d4c61f3b28
+Revises: 5b8e2d7c9a14
+Create Date: 2025-10-30 11:03:26.540918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d4c61f3b28'
+down_revision: Union[str, None] = '5b8e2d7c9a14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('parse_jobs', sa.Column('queries', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('parse_jobs', 'queries')
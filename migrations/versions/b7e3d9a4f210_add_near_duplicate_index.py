@@ -0,0 +1,47 @@
+"""Add MinHash/LSH near-duplicate index
+
+Revision ID: b7e3d9a4f210
+Revises: f4a1c8e3b572
+Create Date: 2025-11-10 14:36:05.482917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3d9a4f210'
+down_revision: Union[str, None] = 'f4a1c8e3b572'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'product_minhash',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('text_hash', sa.String(length=32), nullable=False),
+        sa.Column('signature', sa.LargeBinary(), nullable=False),
+        sa.Column('cluster_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_index(op.f('ix_product_minhash_cluster_id'), 'product_minhash', ['cluster_id'], unique=False)
+    op.create_table(
+        'product_lsh_buckets',
+        sa.Column('bucket', sa.BigInteger(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('bucket', 'product_id')
+    )
+    op.create_index(op.f('ix_product_lsh_buckets_product_id'), 'product_lsh_buckets', ['product_id'], unique=False)
+    # Существующие товары попадают в индекс командой python -m app.cli dedup
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_product_lsh_buckets_product_id'), table_name='product_lsh_buckets')
+    op.drop_table('product_lsh_buckets')
+    op.drop_index(op.f('ix_product_minhash_cluster_id'), table_name='product_minhash')
+    op.drop_table('product_minhash')
@@ -0,0 +1,45 @@
+"""Add price snapshots table
+
+Revision ID: c3f1a8d52e47
+Revises: 946651fdee2f
+Create Date: 2025-10-28 10:42:17.215630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f1a8d52e47'
+down_revision: Union[str, None] = '946651fdee2f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('price_snapshots',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('captured_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('current_price', sa.Float(), nullable=True),
+    sa.Column('discount', sa.Integer(), nullable=True),
+    sa.Column('stock', sa.String(length=100), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_price_snapshots_product_captured', 'price_snapshots', ['product_id', 'captured_at'], unique=False)
+    op.create_index('ix_price_snapshots_captured_brin', 'price_snapshots', ['captured_at'], unique=False, postgresql_using='brin')
+
+    # Начальная точка истории - текущее состояние уже сохраненных товаров
+    op.execute(
+        "INSERT INTO price_snapshots (product_id, captured_at, current_price, discount, stock) "
+        "SELECT id, coalesce(updated_at, created_at, now()), current_price, discount, stock FROM products"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_price_snapshots_captured_brin', table_name='price_snapshots', postgresql_using='brin')
+    op.drop_index('ix_price_snapshots_product_captured', table_name='price_snapshots')
+    op.drop_table('price_snapshots')
@@ -0,0 +1,32 @@
+"""Add table versions for API response cache
+
+Revision ID: e2b7f94c1d06
+Revises: a9d4c61f3b28
+Create Date: 2025-11-03 10:12:47.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b7f94c1d06'
+down_revision: Union[str, None] = 'a9d4c61f3b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'table_versions',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.execute("INSERT INTO table_versions (name, version) VALUES ('products', 0)")
+
+
+def downgrade() -> None:
+    op.drop_table('table_versions')
@@ -0,0 +1,26 @@
+"""Add crawl checkpoint to parse jobs
+
+Revision ID: f4a1c8e3b572
+Revises: e2b7f94c1d06
+Create Date: 2025-11-05 15:37:09.826413
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4a1c8e3b572'
+down_revision: Union[str, None] = 'e2b7f94c1d06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('parse_jobs', sa.Column('checkpoint', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('parse_jobs', 'checkpoint')
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Без настроенной БД бенчмарк работает на временном SQLite, который удаляется при выходе
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir.name, 'bench_api_load.db')}")
+
+import httpx
+import uvicorn
+from fastapi import Depends, FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app import crud, crud_async, models
+from app.database import Base, SessionLocal, engine, get_async_db, get_db
+from app.schemas import ProductCreate
+
+bench_app = FastAPI()
+
+
+@bench_app.get("/sync/products/")
+def sync_products(search: str = None, db: Session = Depends(get_db)):
+    return [product.id for product in crud.get_products(db, limit=50, search=search)]
+
+
+@bench_app.get("/async/products/")
+async def async_products(search: str = None, db: AsyncSession = Depends(get_async_db)):
+    return [product.id for product in await crud_async.get_products(db, limit=50, search=search)]
+
+
+def seed(count: int):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        existing = db.query(models.Product).count()
+        if existing < count:
+            crud.upsert_products(db, (
+                ProductCreate(name=f"Термопаста {i}", brand=f"Бренд {i % 50}", current_price=100 + i % 900)
+                for i in range(existing, count)
+            ))
+    finally:
+        db.close()
+
+
+async def load(base_url: str, path: str, requests: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def one(i: int):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path, params={"search": f"Бренд {i % 50}"})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return requests / elapsed, latencies[int(len(latencies) * 0.99) - 1]
+
+
+def bench_api_load(requests: int = 2000, concurrency: int = 64, products: int = 10000):
+    seed(products)
+
+    config = uvicorn.Config(bench_app, host="127.0.0.1", port=8765, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    print(f"БД: {engine.url.render_as_string(hide_password=True)}, товаров: {products}, "
+          f"запросов: {requests}, параллельно: {concurrency}")
+    try:
+        for name in ("sync", "async"):
+            rps, p99 = asyncio.run(load("http://127.0.0.1:8765", f"/{name}/products/", requests, concurrency))
+            print(f"{name:>5}: {rps:8.1f} запросов/с, p99 {p99 * 1000:8.1f} мс")
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    bench_api_load(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,113 @@
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import browser_profile
+from app.driver_pool import DriverPool
+from app.page_cache import PageCache
+from app.rate_limiter import RateLimiter
+from app.wildberries_parser import WildberriesSeleniumParser
+from tests.stub_server import start_stub_server
+
+
+def process_tree_rss(root_pid: int) -> int:
+    """Суммарная память процесса и всех его потомков (Linux, /proc)"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Имя процесса в скобках может содержать пробелы - поля считаем после него
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+# Скрипт "аналитики" тестовый сервер отдает с хоста localhost, а страницу - с 127.0.0.1:
+# в бенчмарке localhost играет роль стороннего хоста трекеров
+browser_profile.PARSER_BLOCKED_HOSTS += ",localhost"
+
+
+def run_mode(mode: str, server, base_url: str, pages: int):
+    parser = WildberriesSeleniumParser(
+        driver_pool=DriverPool(lambda: None),
+        rate_limiter=RateLimiter(0),
+        backend=None,
+        page_cache=PageCache(mode="off"),
+        browser_mode=mode
+    )
+
+    def create_driver():
+        driver = parser._create_driver()
+        # Без кэша каждая страница загружает свои ресурсы заново, как новые товары в реальной выдаче
+        driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": True})
+        return driver
+
+    parser.driver_pool = DriverPool(create_driver, size=1)
+    rows = []
+    try:
+        for page in range(1, pages + 1):
+            url = f"{base_url}/catalog/0/search.aspx?search=термопаста&page={page}"
+            with parser.driver_pool.driver() as driver:
+                bytes_before = server.bytes_sent
+                products = parser._parse_page_with_driver(driver, url)
+                rows.append({
+                    "bytes": server.bytes_sent - bytes_before,
+                    "load_time": parser.page_load_times[url],
+                    "rss": process_tree_rss(driver.service.process.pid),
+                    "products": len(products),
+                })
+    finally:
+        parser.driver_pool.close()
+    return rows
+
+
+def main():
+    args_parser = argparse.ArgumentParser(description="Сравнение режимов браузера full и lean на локальном сервере")
+    args_parser.add_argument("--pages", type=int, default=10, help="Сколько страниц загрузить в каждом режиме")
+    args = args_parser.parse_args()
+
+    server, base_url = start_stub_server()
+    results = {}
+    try:
+        for mode in ("full", "lean"):
+            results[mode] = run_mode(mode, server, base_url, args.pages)
+    finally:
+        server.shutdown()
+
+    print(f"\nНа страницу (медиана по {args.pages} страницам):")
+    print(f"{'режим':6} {'передано, КБ':>13} {'загрузка, мс':>13} {'RSS Chrome, МБ':>15} {'товаров':>8}")
+    for mode, rows in results.items():
+        print(
+            f"{mode:6} {statistics.median(row['bytes'] for row in rows) / 1024:13.1f} "
+            f"{statistics.median(row['load_time'] for row in rows) * 1000:13.0f} "
+            f"{max(row['rss'] for row in rows) / 1024 / 1024:15.1f} "
+            f"{statistics.median(row['products'] for row in rows):8.0f}"
+        )
+
+    full, lean = results["full"], results["lean"]
+    if statistics.median(row["products"] for row in full) != statistics.median(row["products"] for row in lean):
+        print("ВНИМАНИЕ: в режиме lean разобрано другое количество товаров")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import glob
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from app.card_extractor import CardExtractor
+from app.schemas import ProductCreate
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def legacy_parse_page(page_source: str):
+    """Прежний разбор: BeautifulSoup и отдельный find() на каждое поле"""
+    soup = BeautifulSoup(page_source, 'lxml')
+    return [legacy_parse_product(product) for product in soup.find_all('article', class_='product-card')]
+
+
+def legacy_parse_product(product) -> ProductCreate:
+    current_price_elem = product.find('ins', class_='price__lower-price')
+    current_price_text = current_price_elem.get_text(strip=True) if current_price_elem else ""
+    old_price_elem = product.find('del')
+    discount_elem = product.find('span', class_='percentage-sale')
+    discount_text = discount_elem.get_text(strip=True) if discount_elem else ""
+    brand_elem = product.find('span', class_='product-card__brand')
+    name_elem = product.find('span', class_='product-card__name')
+    name = name_elem.get_text(strip=True) if name_elem else ""
+    name = name[1:] if name and name.startswith('/') else name
+    rating_elem = product.find('span', class_='address-rate-mini')
+    reviews_elem = product.find('span', class_='product-card__count')
+    reviews_text = reviews_elem.get_text(strip=True) if reviews_elem else ""
+    remaining_elem = product.find('span', class_='product-card__tip--quantity')
+    remaining_text = remaining_elem.get_text(strip=True) if remaining_elem else ""
+
+    cleaned_price = re.sub(r'[^\d]', '', current_price_text)
+    old_price = re.sub(r'[^\d]', '', old_price_elem.get_text(strip=True)) if old_price_elem else None
+    rating = None
+    if rating_elem:
+        rating = re.sub(r'[^\d.]', '', re.sub(r',', '.', rating_elem.get_text(strip=True))) or None
+    reviews = re.sub(r'[^\d]', '', reviews_text.split(" ")[0])
+
+    return ProductCreate(
+        current_price=float(cleaned_price) if cleaned_price else 0.0,
+        old_price=float(old_price) if old_price else None,
+        discount=int(discount_text[1:-1]) if discount_text else None,
+        brand=brand_elem.get_text(strip=True) if brand_elem else None,
+        name=name.strip() or "Название не найдено",
+        rating=float(rating) if rating else None,
+        reviews_count=int(reviews) if reviews else None,
+        stock=remaining_text.split(" ")[0] if remaining_text else "Остатки не указаны",
+        currency="RUB"
+    )
+
+
+def extractor_parse_page(page_source: str, extractor=CardExtractor()):
+    return [extractor.extract_product(card) for card in extractor.find_cards(page_source)]
+
+
+def measure(parse_page, pages, repeat: int):
+    cards = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page_source in pages:
+            cards += len(parse_page(page_source))
+    elapsed = time.perf_counter() - started
+    return cards / elapsed, elapsed
+
+
+def bench_extractor(repeat: int = 20):
+    paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html")))
+    pages = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            pages.append(f.read())
+
+    print(f"Фикстур: {len(pages)}, повторов: {repeat}")
+
+    # Артикул из data-nm-id старый разбор не извлекал
+    mismatches = sum(
+        legacy != new.model_copy(update={"article": None})
+        for page_source in pages
+        for legacy, new in zip(legacy_parse_page(page_source), extractor_parse_page(page_source))
+    )
+    print(f"Расхождений между старым и новым разбором: {mismatches}")
+
+    legacy_rate, legacy_time = measure(legacy_parse_page, pages, repeat)
+    new_rate, new_time = measure(extractor_parse_page, pages, repeat)
+
+    print(f"BeautifulSoup + find(): {legacy_rate:,.0f} карточек/с ({legacy_time:.2f} с)")
+    print(f"CardExtractor:          {new_rate:,.0f} карточек/с ({new_time:.2f} с)")
+    print(f"Ускорение: x{new_rate / legacy_rate:.1f}")
+
+
+if __name__ == "__main__":
+    bench_extractor(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,98 @@
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.logger as app_logger
+from app.wildberries_parser import WildberriesSeleniumParser
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class LegacyLoggingParser(WildberriesSeleniumParser):
+    """Прежнее логирование: 9 строк на товар, f-строки форматируются всегда"""
+
+    def _parse_single_product(self, product, index, log_details=False):
+        self.logger.info(f"\n--- Товар #{index} ---")
+        product_data = self.extractor.extract_product(product)
+        self.logger.info(f"Текущая цена: {product_data.current_price}")
+        self.logger.info(f"Старая цена: {product_data.old_price}" if product_data.old_price else "Старая цена: не найдена")
+        self.logger.info(f"Скидка: {product_data.discount}" if product_data.discount else "Скидка: не найдена")
+        self.logger.info(f"Бренд: {product_data.brand}" if product_data.brand else "Бренд: не найден")
+        self.logger.info(f"Название: {product_data.name}")
+        self.logger.info(f"Рейтинг: {product_data.rating}" if product_data.rating else "Рейтинг: не найден")
+        self.logger.info(f"Отзывы: {product_data.reviews_count}" if product_data.reviews_count else "Отзывы: не найдены")
+        self.logger.info(f"Остатки: {product_data.stock}")
+        return product_data
+
+
+def legacy_logger(log_dir: str) -> logging.Logger:
+    """Прежняя настройка: синхронная запись в файл и в консоль из потока парсера"""
+    app_logger.shutdown_logger()
+    logger = logging.getLogger(app_logger.LOGGER_NAME)
+    logger.handlers.clear()
+    logger.setLevel(logging.INFO)
+    formatter = logging.Formatter(app_logger.TEXT_FORMAT, datefmt=app_logger.DATE_FORMAT)
+    for handler in (logging.FileHandler(os.path.join(log_dir, "legacy.log"), encoding="utf-8"),
+                    logging.StreamHandler(sys.stdout)):
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    return logger
+
+
+def run(parser: WildberriesSeleniumParser, page_source: str, pages: int) -> float:
+    started = time.perf_counter()
+    for page in range(pages):
+        products = parser._extract_products(page_source)
+        parser.logger.info("Страница %d: получено товаров %d", page, len(products),
+                           extra={"event": "page", "page": page, "found": len(products)})
+    elapsed = time.perf_counter() - started
+    # Дожидаемся записи очереди, чтобы время фоновой записи не терялось из виду
+    app_logger.shutdown_logger()
+    return elapsed
+
+
+def bench_logging(pages: int = 200):
+    with open(os.path.join(FIXTURES_DIR, "search_page.html"), encoding="utf-8") as f:
+        page_source = f.read()
+
+    modes = [
+        # (название, уровень, формат, доля товаров в подробном логе)
+        ("выключено (WARNING)", "WARNING", "text", 0),
+        ("INFO, текст", "INFO", "text", 0),
+        ("INFO, JSON", "INFO", "json", 0),
+        ("DEBUG, JSON, 1% товаров", "DEBUG", "json", 0.01),
+        ("DEBUG, JSON, все товары", "DEBUG", "json", 1),
+    ]
+
+    stdout = sys.stdout
+    results = []
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, "w") as devnull:
+        # Консольный вывод уходит в /dev/null, но форматируется и пишется как обычно
+        sys.stdout = devnull
+        try:
+            for name, level, fmt, sample_rate in modes:
+                app_logger.LOG_SAMPLE_RATE = sample_rate
+                app_logger.setup_logger(level=level, fmt=fmt, log_dir=log_dir, console=True, force=True)
+                parser = WildberriesSeleniumParser(backend=None)
+                results.append((name, run(parser, page_source, pages)))
+
+            legacy = LegacyLoggingParser(backend=None)
+            legacy.logger = legacy_logger(log_dir)
+            results.append(("прежнее (9 строк на товар, синхронно)", run(legacy, page_source, pages)))
+            for handler in legacy.logger.handlers:
+                handler.close()
+        finally:
+            sys.stdout = stdout
+
+    print(f"Страниц: {pages} по 100 карточек")
+    baseline = results[0][1]
+    for name, elapsed in results:
+        print(f"{name:>40}: {pages / elapsed:8.1f} страниц/с, {elapsed / baseline:5.2f}x от выключенного")
+
+
+if __name__ == "__main__":
+    bench_logging(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Индекс почти-дубликатов: запись, поиск и качество по размеру таблицы")
+    parser.add_argument("--db", help="URL базы. ВСЕ ТАБЛИЦЫ В НЕЙ БУДУТ ПЕРЕСОЗДАНЫ. По умолчанию - временный SQLite")
+    parser.add_argument("--sizes", default="10000,50000,100000", help="Размеры таблицы товаров, на которых делать замеры")
+    parser.add_argument("--page", type=int, default=100, help="Товаров в одной записи (как страница выдачи)")
+    parser.add_argument("--lookups", type=int, default=100, help="Запросов дублей на каждый размер")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+_tmp_dir = tempfile.TemporaryDirectory()
+# Приложение берет адрес БД при импорте, поэтому окружение настраивается до импорта app
+os.environ["DATABASE_URL"] = ARGS.db or f"sqlite:///{os.path.join(_tmp_dir.name, 'bench_near_duplicates.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("LOG_CONSOLE", "0")
+
+from sqlalchemy import func, select, text
+import app.models  # noqa: F401 - регистрирует таблицы в Base.metadata
+from app import crud, crud_async, near_duplicates
+from app.database import AsyncSessionLocal, Base, SessionLocal, async_engine, engine
+from app.models import Product, ProductLshBucket, ProductMinHash
+from app.schemas import ProductCreate
+
+TYPES = [
+    ("Термопаста", "для процессора", "г"), ("Термопрокладка", "для видеокарты", "мм"),
+    ("Кулер", "для процессора башенный", "мм"), ("Вентилятор", "корпусный тихий", "мм"),
+    ("Жидкий металл", "для ноутбука", "г"), ("Радиатор", "для SSD M.2", "мм"),
+]
+BRANDS = ["Arctic", "Noctua", "DEEPCOOL", "Thermalright", "GELID", "Cooler Master", "be quiet!", "ID-COOLING",
+          "Zalman", "PCcooler", "Thermal Grizzly", "Halnziye"]
+LETTERS = ["MX", "NT", "AK", "PA", "GC", "TF", "AG", "KX", "HY", "SE", "FC", "DX"]
+
+
+def listing(item: tuple, variant: int) -> tuple:
+    """Карточка товара item в одной из формулировок продавцов"""
+    kind, extra, unit, brand, letters, number, size = item
+    model = f"{letters}-{number}"
+    names = [
+        f"{kind} {brand} {model} {size} {unit}",
+        f"{brand} {letters}{number} {kind.lower()} {extra}, {size}{unit}",
+        f"{kind} {extra} {brand} {model}, {size} {unit}.",
+        f"{brand.upper()} {model} ({size} {unit}) {kind.lower()}",
+    ]
+    return names[variant % len(names)], brand
+
+
+def catalog(seed: int = 7):
+    """Бесконечный поток карточек: у части товаров несколько карточек разных продавцов.
+    Возвращает (товар, карточка); номер товара - эталон для оценки качества кластеров"""
+    rng = random.Random(seed)
+    item_id = 0
+    while True:
+        kind, extra, unit = rng.choice(TYPES)
+        item = (kind, extra, unit, rng.choice(BRANDS), rng.choice(LETTERS), rng.randint(1, 9999),
+                rng.choice([1, 2, 4, 8, 30, 120, 140]))
+        copies = 1
+        while copies < 4 and rng.random() < 0.35:
+            copies += 1
+        for variant in rng.sample(range(4), copies):
+            yield item_id, listing(item, variant)
+        item_id += 1
+
+
+def reset_database():
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+
+async def measure_lookups(product_ids, names):
+    """Поиск дублей через индекс и старый способ - ILIKE по названию, как раньше в ParserService"""
+    lsh, ilike, found = [], [], []
+    async with AsyncSessionLocal() as db:
+        for product_id, name in zip(product_ids, names):
+            started = time.perf_counter()
+            duplicates = await crud_async.get_near_duplicates(db, product_id)
+            lsh.append((time.perf_counter() - started) * 1000)
+            found.append(len(duplicates))
+
+            started = time.perf_counter()
+            (await db.execute(select(Product.id).where(Product.name.ilike(f"%{name}%")))).all()
+            ilike.append((time.perf_counter() - started) * 1000)
+    await async_engine.dispose()
+    return statistics.median(lsh), statistics.median(ilike), statistics.fmean(found)
+
+
+def cluster_quality(db, items: dict) -> tuple:
+    """Точность и полнота кластеров по парам карточек: пара верна, если это один и тот же товар"""
+    rows = db.execute(select(ProductMinHash.cluster_id, Product.article)
+                      .join(Product, Product.id == ProductMinHash.product_id)).all()
+    pairs = lambda counts: sum(n * (n - 1) // 2 for n in counts.values())
+    in_clusters = pairs(Counter(cluster_id for cluster_id, _ in rows))
+    correct = pairs(Counter((cluster_id, items[article]) for cluster_id, article in rows))
+    expected = pairs(Counter(items[article] for _, article in rows))
+    return correct / in_clusters if in_clusters else 1.0, correct / expected if expected else 1.0
+
+
+def main():
+    sizes = sorted(int(size) for size in ARGS.sizes.split(","))
+    reset_database()
+    cards = catalog()
+    items = {}
+    page_times, index_times = [], []
+    db = SessionLocal()
+
+    print(f"Сигнатуры: {'numpy' if near_duplicates.numpy is not None else 'python'}")
+    print(f"{'товаров':>9} {'запись стр., мс':>16} {'индекс стр., мс':>16} {'поиск LSH, мс':>14} {'ILIKE, мс':>10} "
+          f"{'дублей':>7} {'корзина ср./макс.':>18} {'точность':>9} {'полнота':>8}")
+    try:
+        total = 0
+        for size in sizes:
+            page_times.clear()
+            index_times.clear()
+            while total < size:
+                page = []
+                for _ in range(min(ARGS.page, size - total)):
+                    item_id, (name, brand) = next(cards)
+                    article = 100_000_000 + total + len(page)
+                    items[article] = item_id
+                    page.append(ProductCreate(article=article, name=name, brand=brand, current_price=1000))
+                # Запись и индекс - как в upsert_products: индекс отдельной транзакцией после коммита
+                started = time.perf_counter()
+                crud.upsert_products(db, page, index=False)
+                page_times.append((time.perf_counter() - started) * 1000)
+                rows = db.execute(select(Product.id, Product.name, Product.brand)
+                                  .where(Product.article.in_([product.article for product in page]))).all()
+                started = time.perf_counter()
+                crud.index_committed(db, [tuple(row) for row in rows])
+                index_times.append((time.perf_counter() - started) * 1000)
+                total += len(page)
+
+            sample = db.execute(select(Product.id, Product.name).order_by(func.random()).limit(ARGS.lookups)).all()
+            lsh_ms, ilike_ms, found = asyncio.run(measure_lookups(
+                [product_id for product_id, _ in sample], [name for _, name in sample]
+            ))
+            bucket_sizes = db.execute(
+                select(func.count()).select_from(ProductLshBucket).group_by(ProductLshBucket.bucket)
+            ).scalars().all()
+            precision, recall = cluster_quality(db, items)
+            print(f"{total:9d} {statistics.median(page_times[-50:]):16.1f} {statistics.median(index_times[-50:]):16.1f} "
+                  f"{lsh_ms:14.2f} {ilike_ms:10.2f} "
+                  f"{found:7.2f} {statistics.fmean(bucket_sizes):9.2f}/{max(bucket_sizes):<8d} "
+                  f"{precision:9.3f} {recall:8.3f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Что загружает процесс в каждом варианте
+SCENARIOS = {
+    # Процесс только с API: так работают реплики с PARSE_WORKER_ENABLED=0
+    "api": ["app.main"],
+    # API вместе со стеком парсера - столько раньше платил каждый процесс API
+    "api+parser": ["app.main", "app.parser_service"],
+    # Отдельный воркер задач (python -m app.cli worker) после первой задачи
+    "worker": ["app.jobs", "app.parser_service"],
+}
+
+HEAVY_MODULES = ("selenium", "webdriver_manager", "lxml", "bs4", "httpx", "app.wildberries_parser")
+
+CHILD_CODE = """
+import json, sys, time
+started = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+elapsed = time.perf_counter() - started
+rss = 0
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith("VmRSS:"):
+            rss = int(line.split()[1]) * 1024
+print(json.dumps({{
+    "import_seconds": elapsed,
+    "rss_bytes": rss,
+    "modules": len(sys.modules),
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def run_child(modules, env, importtime: bool = False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", CHILD_CODE.format(modules=modules, heavy=HEAVY_MODULES)]
+    result = subprocess.run(command, cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr: str, top: int):
+    """Модули с наибольшим суммарным временем импорта из вывода -X importtime"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            rows.append((int(cumulative_us), int(self_us), module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного старта и память процессов API и воркера")
+    parser.add_argument("--repeat", type=int, default=5, help="Запусков каждого варианта")
+    parser.add_argument("--top", type=int, default=15, help="Сколько самых медленных импортов показать")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(os.environ)
+        env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp_dir, 'bench_startup.db')}")
+        env["PYTHONPATH"] = ROOT_DIR + os.pathsep + env.get("PYTHONPATH", "")
+        env["LOG_DIR"] = os.path.join(tmp_dir, "logs")
+
+        print(f"{'вариант':12} {'импорт, мс':>11} {'RSS, МБ':>9} {'модулей':>8}  тяжелые модули")
+        for name, modules in SCENARIOS.items():
+            runs = [run_child(modules, env)[0] for _ in range(args.repeat)]
+            print(
+                f"{name:12} {statistics.median(run['import_seconds'] for run in runs) * 1000:11.0f} "
+                f"{statistics.median(run['rss_bytes'] for run in runs) / 1024 / 1024:9.1f} "
+                f"{runs[0]['modules']:8d}  {', '.join(runs[0]['heavy']) or '-'}"
+            )
+
+        _, stderr = run_child(SCENARIOS["api"], env, importtime=True)
+        print("\nСамые долгие импорты процесса API (python -X importtime), мс:")
+        for cumulative_us, self_us, module in slowest_imports(stderr, args.top):
+            print(f"  {cumulative_us / 1000:8.1f} {self_us / 1000:8.1f}  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT_DIR, "tests", "fixtures")
+RESULTS_DIR = os.path.join(ROOT_DIR, "tests", "bench_results")
+
+sys.path.append(ROOT_DIR)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарки парсера, записи в БД и API")
+    parser.add_argument("--db", help="URL базы для замеров записи и API. ВСЕ ТАБЛИЦЫ В НЕЙ БУДУТ ПЕРЕСОЗДАНЫ. "
+                                     "По умолчанию - временный SQLite")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Размеры таблицы товаров через запятую")
+    parser.add_argument("--only", default="extraction,ingest,api", help="Какие группы запускать")
+    parser.add_argument("--repeat", type=int, default=20, help="Повторов разбора каждой фикстуры")
+    parser.add_argument("--requests", type=int, default=50, help="Запросов на каждый сценарий API")
+    parser.add_argument("--output", help="Файл результатов (по умолчанию tests/bench_results/bench_<время>.json)")
+    parser.add_argument("--compare", help="Файл прошлого запуска: вывести изменение каждого показателя")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+_tmp_dir = tempfile.TemporaryDirectory()
+# Приложение берет адрес БД при импорте, поэтому окружение настраивается до импорта app
+os.environ["DATABASE_URL"] = ARGS.db or f"sqlite:///{os.path.join(_tmp_dir.name, 'bench_suite.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["PARSE_WORKER_ENABLED"] = "0"
+os.environ.setdefault("LOG_CONSOLE", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["LOG_DIR"] = os.path.join(_tmp_dir.name, "logs")
+# Сценарии API замеряют запросы к БД; ответы из кэша запросов замеряются отдельно (cached_*)
+os.environ["QUERY_CACHE_BACKEND"] = "off"
+
+import httpx
+from sqlalchemy import text
+from app import crud, near_duplicates
+from app import main as app_main
+from app.card_extractor import CardExtractor
+from app.database import Base, SessionLocal, async_engine, engine
+from app.main import app
+from app.query_cache import QueryCache
+from app.schemas import ProductCreate
+from app.wildberries_parser import WildberriesSeleniumParser
+
+BRANDS = [f"Бренд {i}" for i in range(200)]
+WORDS = ["Термопаста", "Кулер", "Вентилятор", "Процессорный", "Серебряная", "Жидкий", "металл", "для",
+         "ноутбука", "видеокарты", "теплопроводная", "паста", "радиатор", "башенный", "тихий"]
+
+
+def bench_extraction(repeat: int) -> dict:
+    """Скорость разбора сохраненных страниц выдачи: отдельно извлечение полей и весь путь парсера"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+
+    extractor = CardExtractor()
+    parser = WildberriesSeleniumParser(backend=None)
+
+    def extractor_only(page_source: str) -> int:
+        return len([extractor.extract_product(card) for card in extractor.find_cards(page_source)])
+
+    def parser_path(page_source: str) -> int:
+        return len(parser._extract_products(page_source))
+
+    results = {"fixtures": len(pages), "repeat": repeat}
+    for name, parse_page in (("card_extractor", extractor_only), ("parser_extract_products", parser_path)):
+        timings = []
+        cards = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cards = sum(parse_page(page_source) for page_source in pages)
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        results[name] = {
+            "cards_per_page_set": cards,
+            "best_seconds": round(best, 6),
+            "median_seconds": round(statistics.median(timings), 6),
+            "cards_per_second": round(cards / best, 1),
+        }
+    return results
+
+
+def synthetic_products(count: int, seed: int = 42, price_shift: float = 0.0):
+    """Детерминированный набор товаров; price_shift - доля товаров с новой ценой"""
+    rng = random.Random(seed)
+    changed = random.Random(seed + 1)
+    for i in range(count):
+        price = float(rng.randint(100, 20000))
+        if price_shift and changed.random() < price_shift:
+            price += 10
+        yield ProductCreate(
+            article=10_000_000 + i,
+            name=" ".join(rng.sample(WORDS, 4)) + f" {i}",
+            brand=rng.choice(BRANDS),
+            current_price=price,
+            old_price=price * 1.3,
+            discount=rng.randint(5, 60),
+            rating=round(rng.uniform(3, 5), 1),
+            reviews_count=rng.randint(0, 5000),
+            stock=str(rng.randint(0, 500)),
+        )
+
+
+def reset_database():
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+
+def bench_ingest(size: int) -> dict:
+    """Первичная запись size товаров и повторная, в которой у 10% товаров изменилась цена.
+    Индекс почти-дубликатов строится отдельно после записи, как командой dedup"""
+    reset_database()
+    db = SessionLocal()
+    try:
+        results = {"size": size}
+        for name, products in (("insert", synthetic_products(size)),
+                               ("reingest", synthetic_products(size, price_shift=0.1))):
+            started = time.perf_counter()
+            counts = crud.upsert_products(db, products, index=False)
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                "seconds": round(elapsed, 4),
+                "rows_per_second": round(size / elapsed, 1),
+                "counts": counts,
+            }
+
+        started = time.perf_counter()
+        for _, matched in crud.backfill_near_duplicates(db, crud.UPSERT_BATCH_SIZE):
+            pass
+        elapsed = time.perf_counter() - started
+        results["near_dup_index"] = {
+            "seconds": round(elapsed, 4),
+            "rows_per_second": round(size / elapsed, 1),
+            "signature": "numpy" if near_duplicates.numpy is not None else "python",
+            "counts": {"near_duplicates": matched},
+        }
+        return results
+    finally:
+        db.close()
+
+
+async def measure_requests(client: httpx.AsyncClient, make_request, requests: int) -> dict:
+    await make_request()  # прогрев
+    latencies = []
+    for i in range(requests):
+        started = time.perf_counter()
+        await make_request(i)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "requests": requests,
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+    }
+
+
+async def bench_api(size: int, requests: int) -> dict:
+    """Задержка /products/ на таблице из size товаров: первая и глубокая страница, курсор, поиск.
+    Сценарии cached_* повторяют один и тот же запрос с включенным кэшем запросов в памяти"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def get(params):
+            response = await client.get("/products/", params=params)
+            response.raise_for_status()
+            return response
+
+        first_cursor = (await get({"sort": "price", "limit": 50})).headers.get("x-next-cursor")
+        deep_cursor = first_cursor
+        for _ in range(min(20, size // 50 - 1)):
+            next_cursor = (await get({"sort": "price", "limit": 50, "cursor": deep_cursor})).headers.get("x-next-cursor")
+            if not next_cursor:
+                break
+            deep_cursor = next_cursor
+
+        scenarios = {
+            "first_page": lambda i=0: get({"limit": 50}),
+            "deep_offset": lambda i=0: get({"limit": 50, "skip": max(0, size - 100)}),
+            "sorted_first_page": lambda i=0: get({"sort": "price", "limit": 50}),
+            "sorted_cursor_page": lambda i=0: get({"sort": "price", "limit": 50, "cursor": deep_cursor}),
+            "search_brand": lambda i=0: get({"search": BRANDS[i % len(BRANDS)], "limit": 50}),
+            "search_word": lambda i=0: get({"search": WORDS[i % len(WORDS)].lower(), "limit": 50}),
+            "search_rare": lambda i=0: get({"search": f"паста {size - 1 - i}", "limit": 50}),
+        }
+        results = {"size": size}
+        for name, make_request in scenarios.items():
+            results[name] = await measure_requests(client, make_request, requests)
+
+        cached_scenarios = {
+            "cached_first_page": lambda i=0: get({"limit": 50}),
+            "cached_sorted_cursor_page": lambda i=0: get({"sort": "price", "limit": 50, "cursor": deep_cursor}),
+            "cached_search_word": lambda i=0: get({"search": WORDS[0].lower(), "limit": 50}),
+        }
+        app_main.query_cache = QueryCache("memory")
+        try:
+            for name, make_request in cached_scenarios.items():
+                results[name] = await measure_requests(client, make_request, requests)
+        finally:
+            app_main.query_cache = QueryCache("off")
+    await async_engine.dispose()
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def flatten(data, prefix: str = "") -> dict:
+    """Числовые показатели результата в виде {"путь.к.показателю": значение}"""
+    values = {}
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list):
+        items = ((str(item.get("size", index) if isinstance(item, dict) else index), item)
+                 for index, item in enumerate(data))
+    else:
+        return {prefix: data} if isinstance(data, (int, float)) and not isinstance(data, bool) else {}
+    for key, value in items:
+        values.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    return values
+
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = flatten(json.load(f))
+    print(f"\nСравнение с {baseline_path} (>1 - больше, чем в прошлый раз):")
+    for key, value in flatten(current).items():
+        if key.startswith("meta.") or ".counts." in key or key not in baseline or not baseline[key]:
+            continue
+        if key.endswith(("_ms", "seconds", "per_second")):
+            print(f"  {key:60} {baseline[key]:>12} -> {value:>12}  x{value / baseline[key]:.2f}")
+
+
+def main():
+    groups = set(ARGS.only.split(","))
+    sizes = [int(size) for size in ARGS.sizes.split(",") if size]
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "sizes": sizes,
+        }
+    }
+
+    if "extraction" in groups:
+        results["extraction"] = bench_extraction(ARGS.repeat)
+        print(f"Разбор: {results['extraction']['parser_extract_products']['cards_per_second']:,} карточек/с")
+
+    if groups & {"ingest", "api"}:
+        results["ingest"] = []
+        results["api"] = []
+        for size in sizes:
+            ingest = bench_ingest(size)
+            results["ingest"].append(ingest)
+            print(f"Запись {size}: {ingest['insert']['rows_per_second']:,} строк/с, "
+                  f"повторная: {ingest['reingest']['rows_per_second']:,} строк/с, "
+                  f"индекс дублей ({ingest['near_dup_index']['signature']}): "
+                  f"{ingest['near_dup_index']['rows_per_second']:,} строк/с")
+            if "api" in groups:
+                api = asyncio.run(bench_api(size, ARGS.requests))
+                results["api"].append(api)
+                print(f"API на {size}: " + ", ".join(
+                    f"{name} p50 {value['p50_ms']} мс" for name, value in api.items() if name != "size"
+                ))
+        if "ingest" not in groups:
+            del results["ingest"]
+
+    output = ARGS.output or os.path.join(
+        RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {output}")
+
+    if ARGS.compare:
+        compare(results, ARGS.compare)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        _tmp_dir.cleanup()
@@ -0,0 +1,74 @@
+import gc
+import os
+import sys
+import weakref
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import wildberries_parser
+from app.driver_pool import get_driver_pool
+from app.page_cache import PageCache
+from app.rate_limiter import RateLimiter
+from app.wildberries_parser import WildberriesSeleniumParser
+
+
+class FakeChrome:
+    """Chrome без браузера: запоминает параметры запуска и команды DevTools"""
+
+    def __init__(self, options=None):
+        self.arguments = list(options.arguments)
+        self.page_load_strategy = options.page_load_strategy
+        self.cdp_commands = []
+
+    def execute_script(self, script, *args):
+        return 1
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp_commands.append(command)
+
+    def quit(self):
+        pass
+
+
+def make_parser(mode: str) -> WildberriesSeleniumParser:
+    return WildberriesSeleniumParser(
+        rate_limiter=RateLimiter(0),
+        backend=None,
+        page_cache=PageCache(mode="off"),
+        browser_mode=mode
+    )
+
+
+def test_driver_pool_modes():
+    wildberries_parser.webdriver.Chrome = FakeChrome
+
+    full_parser = make_parser("full")
+    lean_parser = make_parser("lean")
+    print(f"Пулы: full - {id(full_parser.driver_pool):#x}, lean - {id(lean_parser.driver_pool):#x}")
+    assert full_parser.driver_pool is not lean_parser.driver_pool
+    # Парсеры одного режима делят один пул
+    assert make_parser("lean").driver_pool is lean_parser.driver_pool
+
+    for parser, expected in ((full_parser, "full"), (lean_parser, "lean")):
+        with parser.driver_pool.driver() as driver:
+            lean = "--blink-settings=imagesEnabled=false" in driver.arguments
+            print(f"{expected}: окно {[a for a in driver.arguments if a.startswith('--window-size')]}, "
+                  f"стратегия загрузки {driver.page_load_strategy}, команды DevTools {driver.cdp_commands}")
+            assert lean == (expected == "lean")
+            assert ("Network.setBlockedURLs" in driver.cdp_commands) == (expected == "lean")
+
+    # Общий пул не держит первый парсер: после него пул продолжает работать, а парсер удаляется
+    pool = full_parser.driver_pool
+    parser_ref = weakref.ref(full_parser)
+    del full_parser
+    gc.collect()
+    assert parser_ref() is None, "общий пул держит ссылку на парсер"
+    assert get_driver_pool(lambda: None, "full") is pool
+
+    for mode in ("full", "lean"):
+        get_driver_pool(lambda: None, mode).close()
+    print("Браузеры каждого режима создаются со своим профилем")
+
+
+if __name__ == "__main__":
+    test_driver_pool_modes()
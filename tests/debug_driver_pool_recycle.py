@@ -0,0 +1,48 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.driver_pool import DriverPool
+
+
+class FakeDriver:
+    """Браузер без Chrome: всегда отвечает и закрывается мгновенно"""
+
+    def execute_script(self, script, *args):
+        return 1
+
+    def quit(self):
+        pass
+
+
+def test_waiters_wake_on_recycle():
+    # Каждый браузер закрывается после одной страницы: ожидающий поток должен сразу запустить новый,
+    # а не ждать checkout_timeout
+    pool = DriverPool(FakeDriver, size=1, max_pages=1, checkout_timeout=5)
+    waits = []
+
+    def work():
+        started = time.monotonic()
+        with pool.driver():
+            waits.append(time.monotonic() - started)
+            time.sleep(0.2)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        pool.close()
+
+    print(f"Ожидание браузера, с: {[round(wait, 2) for wait in sorted(waits)]}")
+    assert max(waits) < 2, "поток ждал браузер до таймаута пула"
+    print("Потоки получают браузер сразу после закрытия предыдущего")
+
+
+if __name__ == "__main__":
+    test_waiters_wake_on_recycle()
@@ -0,0 +1,107 @@
+import os
+import sys
+from urllib.parse import parse_qs, urlparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+
+from app import wildberries_parser
+from app.checkpoints import CrawlCheckpoint
+from app.driver_pool import DriverPool
+from app.page_cache import PageCache
+from app.rate_limiter import RateLimiter
+from app.wildberries_parser import NOT_FOUND_SELECTOR, WildberriesSeleniumParser
+from tests.stub_server import FIXTURES_DIR
+
+LAST_PAGE = 2
+
+with open(os.path.join(FIXTURES_DIR, "search_page.html"), encoding="utf-8") as f:
+    SEARCH_PAGE = f.read()
+NOT_FOUND_PAGE = ('<html><body><div class="not-found-search">'
+                  '<h1 class="not-found-search__title">По запросу ничего не найдено</h1></div></body></html>')
+BLANK_PAGE = "<html><body></body></html>"
+
+
+class FakeDriver:
+    """Браузер без Chrome: на страницах до LAST_PAGE - сохраненная выдача, дальше - страница без карточек"""
+
+    def __init__(self, end_page: str):
+        self.end_page = end_page
+        self.loaded = []
+        self.page = 1
+
+    def get(self, url: str):
+        self.page = int(parse_qs(urlparse(url).query).get("page", ["1"])[0])
+        self.loaded.append(self.page)
+
+    @property
+    def page_source(self) -> str:
+        if self.page <= LAST_PAGE:
+            return SEARCH_PAGE
+        return NOT_FOUND_PAGE if self.end_page == "not_found" else BLANK_PAGE
+
+    def find_elements(self, by, value):
+        if by == By.CLASS_NAME and value == "product-card" and self.page <= LAST_PAGE:
+            return [object()] * 100
+        if by == By.CSS_SELECTOR and value == NOT_FOUND_SELECTOR and self.page > LAST_PAGE \
+                and self.end_page == "not_found":
+            return [object()]
+        return []
+
+    def find_element(self, by, value):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(value)
+        return elements[0]
+
+    def set_script_timeout(self, timeout):
+        pass
+
+    def execute_async_script(self, script, *args):
+        return len(self.find_elements(By.CLASS_NAME, "product-card"))
+
+    def execute_script(self, script, *args):
+        return 1
+
+    def quit(self):
+        pass
+
+
+def check_end_of_results(end_page: str):
+    driver = FakeDriver(end_page)
+    parser = WildberriesSeleniumParser(
+        driver_pool=DriverPool(lambda: driver, size=1),
+        rate_limiter=RateLimiter(0),
+        backend=None,
+        page_cache=PageCache(mode="off")
+    )
+    checkpoint = CrawlCheckpoint()
+    test_url = "https://www.wildberries.ru/catalog/0/search.aspx?search=термопаста"
+
+    try:
+        pages = [page for page, _ in parser.iter_search_pages(test_url, max_pages=5, workers=1,
+                                                              checkpoint=checkpoint)]
+    finally:
+        parser.driver_pool.close()
+
+    print(f"{end_page}: записаны страницы {pages}, загружены {driver.loaded}, "
+          f"пропущены после ошибок {checkpoint.failed_pages}")
+    assert pages == list(range(1, LAST_PAGE + 1)), pages
+    # Страница за концом выдачи загружается один раз, без повторов, и обход на ней останавливается
+    assert driver.loaded == list(range(1, LAST_PAGE + 2)), driver.loaded
+    assert checkpoint.failed_pages == [], checkpoint.failed_pages
+    assert checkpoint.last_page(5) == LAST_PAGE
+
+
+def test_end_of_results():
+    # Страница без карточек и без блока "ничего не найдено" ждет весь таймаут, в проверке он короткий
+    wildberries_parser.CARDS_WAIT_TIMEOUT = 0.5
+    for end_page in ("not_found", "blank"):
+        check_end_of_results(end_page)
+    print("Конец выдачи в Selenium определяется без повторов страницы")
+
+
+if __name__ == "__main__":
+    test_end_of_results()
@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.fetch_backends import HttpFetchBackend
+from app.rate_limiter import RateLimiter
+from app.wildberries_parser import WildberriesSeleniumParser
+from tests.stub_server import start_stub_server
+
+
+def test_http_backend_offline():
+    server, base_url = start_stub_server()
+    backend = HttpFetchBackend(api_url=f"{base_url}/search")
+    parser = WildberriesSeleniumParser(backend=backend, rate_limiter=RateLimiter(0))
+
+    test_url = "https://www.wildberries.ru/catalog/0/search.aspx?search=термопаста"
+
+    try:
+        started = time.perf_counter()
+        products = parser.parse_search_page(test_url, max_pages=10, workers=4)
+        elapsed = time.perf_counter() - started
+
+        print(f"\nРезультаты:")
+        print(f"Успешно спарсено товаров: {len(products)}")
+        print(f"Время: {elapsed:.3f} с")
+
+    except Exception as e:
+        print(f"Критическая ошибка: {e}")
+        import traceback
+        traceback.print_exc()
+
+    finally:
+        backend.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_http_backend_offline()
@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp_dir = tempfile.TemporaryDirectory()
+# Приложение берет адрес БД при импорте, поэтому окружение настраивается до импорта app
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir.name, 'rekey.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("LOG_CONSOLE", "0")
+
+from sqlalchemy import select
+import app.models  # noqa: F401 - регистрирует таблицы в Base.metadata
+from app import crud
+from app.database import Base, SessionLocal, engine
+from app.models import Product
+from app.schemas import ProductCreate
+
+
+def test_rekey_by_article():
+    """Товар, записанный без артикула (как старые записи после миграции), при повторном парсинге
+    с артикулом обновляется, а не добавляется вторым экземпляром"""
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        crud.upsert_products(db, [ProductCreate(name="Термопаста Arctic MX-4", brand="Arctic", current_price=500)])
+        old_id = db.scalar(select(Product.id))
+
+        counts = crud.upsert_products(db, [
+            ProductCreate(article=123456, name="Термопаста Arctic MX-4 ", brand="ARCTIC", current_price=450),
+            # Другой артикул с тем же названием - другой товар того же продавца
+            ProductCreate(article=654321, name="Термопаста Arctic MX-4", brand="Arctic", current_price=470),
+        ])
+        rows = db.execute(select(Product.id, Product.natural_key, Product.current_price).order_by(Product.id)).all()
+    finally:
+        db.close()
+
+    print(f"Итоги записи: {counts}")
+    print(f"Товары: {rows}")
+    assert counts["inserted"] == 1 and counts["updated"] == 1, counts
+    assert rows[0] == (old_id, "wb:123456", 450), rows
+    assert [row.natural_key for row in rows] == ["wb:123456", "wb:654321"], rows
+    print("Старая запись переведена на ключ артикула без дубля")
+
+
+if __name__ == "__main__":
+    try:
+        test_rekey_by_article()
+    finally:
+        engine.dispose()
+        _tmp_dir.cleanup()
@@ -0,0 +1,115 @@
+import gzip
+import os
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+EMPTY_SEARCH_RESPONSE = b'{"data": {"products": []}}'
+IMAGE_HOST = "https://basket-01.wbbasket.ru/"
+
+# Ресурсы страницы выдачи для проверки браузера: размеры примерно как у настоящих
+ASSET_SIZES = {"image": 30_000, "font": 80_000, "tracker": 60_000}
+STYLESHEET = (b"@font-face{font-family:WB;src:url(/static/font.woff2) format('woff2')}"
+              b"body{font-family:WB,sans-serif}.j-thumbnail{width:258px;height:344px}")
+_assets = {}
+
+
+def _asset(kind: str) -> bytes:
+    # Несжимаемые данные, чтобы gzip не искажал объем переданных байт
+    if kind not in _assets:
+        _assets[kind] = random.Random(kind).randbytes(ASSET_SIZES[kind])
+    return _assets[kind]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Отдает записанные ответы Wildberries из tests/fixtures"""
+
+    # keep-alive, как у настоящего сервера
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+
+        if parsed.path == "/search":
+            page = parse_qs(parsed.query).get("page", ["1"])[0]
+            body = self._read_fixture(f"search_api_page_{page}.json") or EMPTY_SEARCH_RESPONSE
+            self._send(200, body, "application/json; charset=utf-8")
+            return
+
+        if parsed.path == "/catalog/0/search.aspx":
+            self._send(200, self._search_page(), "text/html; charset=utf-8")
+            return
+        if parsed.path.startswith("/basket/"):
+            self._send(200, _asset("image"), "image/webp")
+            return
+        if parsed.path == "/static/main.css":
+            self._send(200, STYLESHEET, "text/css")
+            return
+        if parsed.path == "/static/font.woff2":
+            self._send(200, _asset("font"), "font/woff2")
+            return
+        if parsed.path == "/analytics/tag.js":
+            # Тело - комментарий: скрипт "трекера" ничего не делает, важен только объем
+            self._send(200, b"/*" + _asset("tracker").hex().encode("ascii")[:ASSET_SIZES["tracker"]] + b"*/",
+                       "application/javascript")
+            return
+
+        body = self._read_fixture(parsed.path.lstrip("/"))
+        if body is None:
+            self._send(404, b"Not found", "text/plain")
+        else:
+            self._send(200, body, self._content_type(parsed.path))
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            encoding = "gzip"
+        else:
+            encoding = None
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.bytes_sent += len(body)
+
+    def _search_page(self) -> bytes:
+        """HTML выдачи из фикстуры: картинки - с этого сервера, скрипт аналитики - со "стороннего"
+        хоста (localhost вместо 127.0.0.1)"""
+        html = self._read_fixture("search_page.html").decode("utf-8")
+        tracker = f'<script async src="http://localhost:{self.server.server_address[1]}/analytics/tag.js"></script>'
+        html = html.replace(IMAGE_HOST, "/basket/").replace("</head>", tracker + "</head>", 1)
+        return html.encode("utf-8")
+
+    @staticmethod
+    def _read_fixture(name: str):
+        path = os.path.normpath(os.path.join(FIXTURES_DIR, name))
+        if not path.startswith(FIXTURES_DIR) or not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def _content_type(path: str) -> str:
+        if path.endswith(".html"):
+            return "text/html; charset=utf-8"
+        if path.endswith(".json"):
+            return "application/json; charset=utf-8"
+        return "application/octet-stream"
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port: int = 0):
+    """Запускает сервер в фоновом потоке, возвращает сервер и его базовый URL"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.bytes_sent = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"